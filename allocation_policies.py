@@ -0,0 +1,187 @@
+import bisect
+
+class AllocationPolicy:
+    """
+    Base class for block allocation policies.
+    StorageManager owns the shared engine (bitmap + FreeExtentIndex) and asks
+    the policy where to place each allocation. Policies that need an extra
+    index keep it up to date through the on_allocate/on_release hooks.
+    """
+    name = None
+    
+    def __init__(self):
+        self.storage = None
+        
+    def attach(self, storage):
+        """Bind the policy to a StorageManager and build its index"""
+        self.storage = storage
+        self.rebuild()
+        
+    def rebuild(self):
+        """Rebuild any private index from the storage state"""
+        pass
+        
+    def choose(self, num_blocks):
+        """Return the start block for num_blocks contiguous blocks, or None"""
+        raise NotImplementedError
+        
+    def on_allocate(self, start_block, num_blocks):
+        """Called after the engine marked a range as used"""
+        pass
+        
+    def on_release(self, start_block, num_blocks):
+        """Called after the engine marked a range as free"""
+        pass
+        
+    def on_resize(self):
+        """Called after a file's allocation grew or shrank in place"""
+        pass
+        
+        
+class FirstFitPolicy(AllocationPolicy):
+    """Lowest-addressed free run that is large enough"""
+    name = 'first-fit'
+    
+    def choose(self, num_blocks):
+        return self.storage.free_extents.first_fit(num_blocks)
+        
+        
+class NextFitPolicy(AllocationPolicy):
+    """First-fit starting from a roving pointer, wrapping around the disk"""
+    name = 'next-fit'
+    
+    def __init__(self):
+        super().__init__()
+        self.cursor = 0  # Block after the last allocation
+        
+    def rebuild(self):
+        self.cursor = 0
+        
+    def choose(self, num_blocks):
+        start_block = self.storage.free_extents.first_fit(num_blocks, self.cursor)
+        if start_block is None and self.cursor > 0:
+            start_block = self.storage.free_extents.first_fit(num_blocks)
+        return start_block
+        
+    def on_allocate(self, start_block, num_blocks):
+        self.cursor = start_block + num_blocks
+        
+        
+class BestFitPolicy(AllocationPolicy):
+    """Smallest free run that is large enough (lowest address on ties)"""
+    name = 'best-fit'
+    
+    def rebuild(self):
+        self.storage.free_extents.track_sizes(True)
+        
+    def choose(self, num_blocks):
+        return self.storage.free_extents.best_fit(num_blocks)
+        
+        
+class WorstFitPolicy(AllocationPolicy):
+    """Largest free run, so the leftover piece stays as big as possible"""
+    name = 'worst-fit'
+    
+    def rebuild(self):
+        self.storage.free_extents.track_sizes(True)
+        
+    def choose(self, num_blocks):
+        return self.storage.free_extents.worst_fit(num_blocks)
+        
+        
+class BuddyPolicy(AllocationPolicy):
+    """
+    Binary buddy allocator. Requests are rounded up to a power of two and
+    placed on a block aligned to that size. Only the requested blocks are
+    marked in the bitmap; the rounded-up tail stays reserved in the buddy
+    free lists until the allocation is released.
+    """
+    name = 'buddy'
+    
+    def __init__(self):
+        super().__init__()
+        self.free_lists = {}  # {order: sorted start blocks of free 2^order blocks}
+        self.allocated = {}  # {start_block: order} for allocations made by this policy
+        
+    def rebuild(self):
+        self.free_lists = {}
+        self.allocated = {}
+        for start_block, length in self.storage.free_extents.runs():
+            self._release_range(start_block, length)
+            
+    def _order_for(self, num_blocks):
+        """Smallest order whose block holds num_blocks"""
+        return (num_blocks - 1).bit_length()
+        
+    def _has_free(self, start_block, order):
+        starts = self.free_lists.get(order, [])
+        i = bisect.bisect_left(starts, start_block)
+        return i < len(starts) and starts[i] == start_block
+        
+    def _remove_free(self, start_block, order):
+        starts = self.free_lists[order]
+        del starts[bisect.bisect_left(starts, start_block)]
+        if not starts:
+            del self.free_lists[order]
+            
+    def _insert_free(self, start_block, order):
+        """Add a free block, merging with its buddy as far as possible"""
+        while True:
+            buddy = start_block ^ (1 << order)
+            if not self._has_free(buddy, order):
+                break
+            self._remove_free(buddy, order)
+            start_block = min(start_block, buddy)
+            order += 1
+        bisect.insort(self.free_lists.setdefault(order, []), start_block)
+        
+    def _release_range(self, start_block, num_blocks):
+        """Split an arbitrary range into aligned power-of-two blocks and free them"""
+        while num_blocks > 0:
+            order = num_blocks.bit_length() - 1
+            if start_block:
+                order = min(order, (start_block & -start_block).bit_length() - 1)
+            self._insert_free(start_block, order)
+            start_block += 1 << order
+            num_blocks -= 1 << order
+            
+    def choose(self, num_blocks):
+        order = self._order_for(num_blocks)
+        candidates = [o for o in self.free_lists if o >= order]
+        if not candidates:
+            return None
+            
+        # Take the lowest block of the smallest order that fits, then split it down
+        found = min(candidates)
+        start_block = self.free_lists[found][0]
+        self._remove_free(start_block, found)
+        while found > order:
+            found -= 1
+            bisect.insort(self.free_lists.setdefault(found, []), start_block + (1 << found))
+        self.allocated[start_block] = order
+        return start_block
+        
+    def on_resize(self):
+        # Blocks were taken or given back outside the buddy blocks; resync from the free runs
+        self.rebuild()
+        
+    def on_release(self, start_block, num_blocks):
+        order = self.allocated.pop(start_block, None)
+        if order is not None and num_blocks <= (1 << order):
+            self._insert_free(start_block, order)
+        else:
+            # Allocation made before a restart or by another policy
+            self._release_range(start_block, num_blocks)
+            
+            
+ALLOCATION_POLICIES = {
+    policy.name: policy
+    for policy in (FirstFitPolicy, NextFitPolicy, BestFitPolicy, WorstFitPolicy, BuddyPolicy)
+}
+
+
+def make_policy(name):
+    """Create an allocation policy by name"""
+    if name not in ALLOCATION_POLICIES:
+        raise ValueError(f"Unknown allocation policy: {name}")
+    return ALLOCATION_POLICIES[name]()
\ No newline at end of file
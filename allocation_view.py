@@ -0,0 +1,267 @@
+import tkinter as tk
+from tkinter import ttk
+
+class AllocationView:
+    """
+    Block map of the disk on a canvas, drawn as a grid of cells that wraps
+    to the canvas width. Only the cells in the viewport exist as canvas
+    items, and they are reused when scrolling. When zoomed out one cell
+    stands for several blocks and is colored by how many of them are used.
+    Each refresh redraws only the cells whose blocks changed, using the
+    ranges the bitmap recorded since the last refresh.
+    
+    Mouse wheel scrolls, Ctrl+wheel (or the +/- buttons) zooms around the
+    pointer.
+    """
+    CELL = 12  # Cell size in pixels
+    FREE = (0x00, 0x80, 0x00)  # Green
+    USED = (0xFF, 0x00, 0x00)  # Red
+    
+    def __init__(self, parent, storage):
+        self.storage = storage
+        self.blocks_per_cell = None  # Zoom level; None fits the whole disk on first layout
+        self.top_row = 0  # First grid row in the viewport
+        self.columns = 0
+        self.rows = 0
+        self.items = []  # Canvas rectangle of each viewport slot
+        self.fills = []  # Current fill of each slot, so unchanged cells are not reconfigured
+        self.outlined = set()  # Slots drawn highlighted
+        self.highlight = []  # (start_block, num_blocks) runs of the selected file
+        self.used = {}  # {cell: used blocks} for the current zoom, dropped when blocks change
+        self._bitmap = None  # Bitmap whose changes self.used reflects
+        self._retry_timer = None
+        
+        self.frame = tk.Frame(parent)
+        toolbar = tk.Frame(self.frame)
+        toolbar.pack(fill=tk.X)
+        tk.Button(toolbar, text="-", width=2, command=lambda: self.zoom(2)).pack(side=tk.LEFT)
+        tk.Button(toolbar, text="+", width=2, command=lambda: self.zoom(0.5)).pack(side=tk.LEFT)
+        self.status = tk.Label(toolbar, anchor=tk.W)
+        self.status.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        self.canvas = tk.Canvas(self.frame, bg="white", highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        # Bound once; a resize only rebuilds the slot grid
+        self.canvas.bind("<Configure>", self.on_resize)
+        self.canvas.bind("<Motion>", self.on_motion)
+        self.canvas.bind("<MouseWheel>", lambda e: self.on_wheel(e, -1 if e.delta > 0 else 1))
+        self.canvas.bind("<Button-4>", lambda e: self.on_wheel(e, -1))
+        self.canvas.bind("<Button-5>", lambda e: self.on_wheel(e, 1))
+        
+    def pack(self, **options):
+        self.frame.pack(**options)
+        
+    @property
+    def total_blocks(self):
+        return self.storage.total_blocks
+        
+    def total_rows(self):
+        cells = -(-self.total_blocks // self.blocks_per_cell)
+        return max(-(-cells // self.columns), 1)
+        
+    def refresh(self, highlight=None):
+        """Redraw changed cells; highlight is the selected file's runs (None keeps the current one)"""
+        if highlight is not None:
+            self.highlight = list(highlight)
+        self._paint()
+        
+    def _retry(self):
+        self._retry_timer = None
+        self._paint()
+        
+    def _take_changes(self):
+        """Forget cached counts of cells whose blocks changed since the last refresh"""
+        bitmap = self.storage.bitmap
+        if bitmap is not self._bitmap:
+            # Replaced (reload, reset); everything may have changed
+            self._bitmap = bitmap
+            bitmap.track_changes()
+            bitmap.take_changes()
+            self.used.clear()
+            return
+        changes = bitmap.take_changes()
+        if not self.blocks_per_cell:
+            return
+        for start_block, end_block in changes:
+            first, last = start_block // self.blocks_per_cell, (end_block - 1) // self.blocks_per_cell
+            if last - first >= len(self.used):
+                self.used.clear()
+                return
+            for cell in range(first, last + 1):
+                self.used.pop(cell, None)
+                
+    def _layout(self):
+        """Create one rectangle per slot that fits in the canvas"""
+        width = max(self.canvas.winfo_width(), self.CELL)
+        height = max(self.canvas.winfo_height(), self.CELL)
+        columns, rows = width // self.CELL, height // self.CELL
+        if (columns, rows) == (self.columns, self.rows) and self.items:
+            return
+        self.columns, self.rows = columns, rows
+        if self.blocks_per_cell is None:
+            # Start zoomed out just far enough to show the whole disk
+            self.blocks_per_cell = 1
+            while self.total_blocks > self.blocks_per_cell * columns * rows:
+                self.blocks_per_cell *= 2
+        self.canvas.delete("cell")
+        self.items = []
+        for slot in range(columns * rows):
+            row, column = divmod(slot, columns)
+            x, y = column * self.CELL, row * self.CELL
+            self.items.append(self.canvas.create_rectangle(
+                x, y, x + self.CELL - 1, y + self.CELL - 1, fill="", outline="", tags="cell"
+            ))
+        self.fills = [None] * len(self.items)
+        self.outlined = set()
+        self._clamp()
+        
+    def _clamp(self):
+        self.top_row = max(0, min(self.top_row, self.total_rows() - self.rows))
+        
+    def _palette(self):
+        """Fill for 0..8 eighths of a cell used; partly used cells never get the free or full color"""
+        colors = []
+        for level in range(9):
+            mix = level / 8
+            colors.append("#%02x%02x%02x" % tuple(round(f + (u - f) * mix) for f, u in zip(self.FREE, self.USED)))
+        return colors
+        
+    def _color(self, used, palette):
+        if used == 0 or used == self.blocks_per_cell:
+            return palette[0 if used == 0 else 8]
+        return palette[min(max(round(used * 8 / self.blocks_per_cell), 1), 7)]
+        
+    def _paint(self):
+        if not self.items:
+            return
+        # Never block the Tk thread on the allocator lock; a background operation may hold it
+        if not self.storage.lock.acquire(blocking=False):
+            if self._retry_timer is None:
+                self._retry_timer = self.canvas.after(30, self._retry)
+            return
+        try:
+            self._take_changes()
+            self._paint_cells()
+        finally:
+            self.storage.lock.release()
+            
+    def _paint_cells(self):
+        if len(self.used) > 16 * len(self.items):
+            self.used.clear()  # Counts for cells scrolled far away
+        bitmap = self._bitmap
+        bits = bitmap.bits
+        total_blocks = self.total_blocks
+        blocks_per_cell = self.blocks_per_cell
+        palette = self._palette()
+        first_cell = self.top_row * self.columns
+        highlighted = self._highlighted_slots(first_cell)
+        for slot, item in enumerate(self.items):
+            cell = first_cell + slot
+            start_block = cell * blocks_per_cell
+            if start_block >= total_blocks:
+                fill = ""
+            else:
+                used = self.used.get(cell)
+                if used is None:
+                    if blocks_per_cell == 1:
+                        used = (bits[start_block >> 3] >> (start_block & 7)) & 1
+                    else:
+                        end_block = min(start_block + blocks_per_cell, total_blocks)
+                        used = bitmap.count(start_block, end_block)
+                        used += blocks_per_cell - (end_block - start_block)  # Past the disk end counts as used
+                    self.used[cell] = used
+                fill = self._color(used, palette)
+            if fill != self.fills[slot]:
+                self.fills[slot] = fill
+                if slot in self.outlined:
+                    self.canvas.itemconfigure(item, fill=fill)
+                else:
+                    self.canvas.itemconfigure(item, fill=fill, outline="black" if fill else "")
+        for slot in self.outlined - highlighted:
+            self.canvas.itemconfigure(self.items[slot], outline="black" if self.fills[slot] else "", width=1)
+        for slot in highlighted - self.outlined:
+            self.canvas.itemconfigure(self.items[slot], outline="yellow", width=2)
+            self.canvas.tag_raise(self.items[slot])
+        self.outlined = highlighted
+        total_rows = self.total_rows()
+        self.scrollbar.set(self.top_row / total_rows, min((self.top_row + self.rows) / total_rows, 1.0))
+        self._show_status()
+        
+    def _highlighted_slots(self, first_cell):
+        """Viewport slots holding blocks of the selected file"""
+        slots = set()
+        last_cell = first_cell + len(self.items)
+        for start_block, num_blocks in self.highlight:
+            first = max(start_block // self.blocks_per_cell, first_cell)
+            last = min((start_block + num_blocks - 1) // self.blocks_per_cell + 1, last_cell)
+            slots.update(range(first - first_cell, last - first_cell))
+        return slots
+        
+    def _show_status(self, text=""):
+        self.status.config(text=f"1 cell = {self.blocks_per_cell} block{'s' if self.blocks_per_cell > 1 else ''}" + text)
+        
+    def _scroll_to(self, top_row):
+        self.top_row = top_row
+        self._clamp()
+        self._paint()
+        
+    def on_scroll(self, action, amount, unit=None):
+        if not self.items:
+            return
+        if action == "moveto":
+            self._scroll_to(int(float(amount) * self.total_rows()))
+        else:
+            step = self.rows if unit == "pages" else 1
+            self._scroll_to(self.top_row + int(amount) * step)
+            
+    def on_wheel(self, event, direction):
+        if event.state & 0x4:  # Ctrl held
+            self.zoom(2 if direction > 0 else 0.5, event)
+        else:
+            self._scroll_to(self.top_row + direction * 3)
+            
+    def zoom(self, factor, event=None):
+        """Change the blocks per cell, keeping the cell under the pointer (or the top left) in place"""
+        if not self.items:
+            return
+        new = int(min(max(self.blocks_per_cell * factor, 1), max(self.total_blocks // self.columns, 1)))
+        if new == self.blocks_per_cell:
+            return
+        slot = self._slot_at(event.x, event.y) if event is not None else 0
+        if slot is None:
+            slot = 0
+        anchor_block = (self.top_row * self.columns + slot) * self.blocks_per_cell
+        self.blocks_per_cell = new
+        self.used.clear()
+        self.top_row = (anchor_block // new) // self.columns - slot // self.columns
+        self._clamp()
+        self._paint()
+        
+    def _slot_at(self, x, y):
+        column, row = x // self.CELL, y // self.CELL
+        if 0 <= column < self.columns and 0 <= row < self.rows:
+            return row * self.columns + column
+        return None
+        
+    def on_motion(self, event):
+        slot = self._slot_at(event.x, event.y)
+        if slot is None or not self.items:
+            return
+        cell = self.top_row * self.columns + slot
+        start_block = cell * self.blocks_per_cell
+        if start_block >= self.total_blocks:
+            self._show_status()
+            return
+        end_block = min(start_block + self.blocks_per_cell, self.total_blocks) - 1
+        used = self.used.get(cell, 0)
+        if start_block == end_block:
+            self._show_status(f" | block #{start_block}: {'used' if used else 'free'}")
+        else:
+            self._show_status(f" | blocks #{start_block}-#{end_block}: {used * 100 // self.blocks_per_cell}% used")
+            
+    def on_resize(self, event):
+        self._layout()
+        self.refresh()
\ No newline at end of file
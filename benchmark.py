@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import tempfile
+from filesystem import FileSystem
+from storage_manager import StorageManager
+
+def _timed(function, iterations):
+    """Average seconds per call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations
+    
+def _scratch_filesystem(**options):
+    """FileSystem in a fresh temporary directory"""
+    os.chdir(tempfile.mkdtemp(prefix="fs-bench-"))
+    fs = FileSystem(**options)
+    fs.journal.durable = False
+    return fs
+    
+def bench_path_lookup(depth=64, iterations=20000):
+    """get_node_at_path on a deep directory, with and without the path cache"""
+    results = {}
+    for label, cache_size in (("uncached", 0), ("cached", 4096)):
+        fs = _scratch_filesystem(path_cache_size=cache_size)
+        path = ""
+        with fs.batch():
+            for level in range(depth):
+                fs.create_directory(f"level{level}", path or "/")
+                path += f"/level{level}"
+        results[label] = _timed(lambda: fs.get_node_at_path(path), iterations)
+        fs.close()
+    return results
+    
+def bench_bulk_free(files=500):
+    """Seconds per file to free files with autosave on: deallocate_file each vs one deallocate_files"""
+    results = {}
+    for label in ("per_file", "bulk"):
+        os.chdir(tempfile.mkdtemp(prefix="fs-bench-"))
+        storage = StorageManager()
+        storage.autosave = False
+        file_ids = [file_id for file_id in range(files) if storage.allocate_file(file_id, 1000)]
+        storage.autosave = True
+        start = time.perf_counter()
+        if label == "per_file":
+            for file_id in file_ids:
+                storage.deallocate_file(file_id)
+        else:
+            storage.deallocate_files(file_ids)
+        results[label] = (time.perf_counter() - start) / len(file_ids)
+        storage.close()
+    return results
+    
+BENCHMARKS = {
+    'path_lookup': bench_path_lookup,
+    'bulk_free': bench_bulk_free,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        results = BENCHMARKS[name]()
+        print(name)
+        for label, seconds in results.items():
+            print(f"  {label:<12} {seconds * 1e6:10.2f} us/op")
\ No newline at end of file
@@ -0,0 +1,253 @@
+import os
+import json
+import mmap
+import struct
+import threading
+from bitmap import Bitmap
+from extent_index import allocation_runs
+
+# Directory tree file: header, fixed-size inode records, string table.
+# Inodes are laid out breadth-first so the children of a directory are the
+# contiguous records [first_child, first_child + child_count).
+TREE_MAGIC = b'SFMT'
+TREE_HEADER = struct.Struct('<4sHxxqIqIIQQ')  # magic, version, checkpoint_seq, inode count, next inode ID, cwd string, inode offset, string offset
+INODE = struct.Struct('<BxxxIIIIIIIIqqqIIIIq')  # see _pack_inode
+# Version 1 files had no inode IDs; they are still read so they can be migrated
+TREE_HEADER_V1 = struct.Struct('<4sHxxqIIIQQ')
+INODE_V1 = struct.Struct('<BxxxIIIIIIIIqqqIIII')
+VERSION = struct.Struct('<4sH')
+
+# Storage file: header, packed bitmap bytes, FAT records, string table.
+STORAGE_MAGIC = b'SFMS'
+STORAGE_HEADER = struct.Struct('<4sHxxqIIIIQQQ')  # magic, version, checkpoint_seq, blocks, FAT entries, policy string, bitmap/FAT/string offsets
+FAT_ENTRY = struct.Struct('<qqq')  # inode ID, start_block, num_blocks; one record per run, in file order
+FAT_ENTRY_V1 = struct.Struct('<IIqq')  # path string, start_block, num_blocks
+
+FORMAT_VERSION = 2
+FILE_TYPE = 0
+DIRECTORY_TYPE = 1
+# Node keys stored in fixed inode fields; anything else goes to the JSON "extra" string
+INODE_KEYS = {"inode", "name", "type", "content", "created", "modified", "size", "allocation"}
+
+
+class StringTable:
+    """Collects UTF-8 strings for a file, storing each distinct value once"""
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = {}
+        
+    def add(self, text):
+        """Return (offset, length) of text in the table"""
+        if text is None:
+            return 0, 0
+        if text not in self.offsets:
+            raw = text.encode('utf-8')
+            self.offsets[text] = (len(self.data), len(raw))
+            self.data += raw
+        return self.offsets[text]
+        
+        
+def _write_atomic(path, chunks):
+    """Write chunks to a temp file and swap it in"""
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp_file, path)
+    
+    
+def _pack_inode(node, strings, first_child, child_count):
+    """Pack one tree node into a fixed-size inode record"""
+    is_dir = node["type"] == "directory"
+    allocation = node.get("allocation")
+    extra = {key: value for key, value in node.items() if key not in INODE_KEYS}
+    if allocation and len(allocation_runs(allocation)) > 1:
+        extra["allocation"] = allocation  # Run lists of extent-mode files do not fit the fixed fields
+        allocation = None
+    return INODE.pack(
+        DIRECTORY_TYPE if is_dir else FILE_TYPE,
+        *strings.add(node["name"]),
+        *strings.add(node["created"]),
+        *strings.add(node["modified"]),
+        *strings.add(None if is_dir else node.get("content")),
+        node.get("size", 0),
+        allocation[0] if allocation else -1,
+        allocation[1] if allocation else 0,
+        first_child,
+        child_count,
+        *strings.add(json.dumps(extra) if extra else None),
+        node["inode"]
+    )
+    
+    
+def write_tree(path, root, current_dir, checkpoint_seq, next_inode):
+    """Write the directory tree as an inode table plus string table"""
+    strings = StringTable()
+    records = []
+    order = [root]
+    i = 0
+    while i < len(order):
+        node = order[i]
+        if node["type"] == "directory":
+            children = list(node["content"].values())
+            records.append(_pack_inode(node, strings, len(order), len(children)))
+            order.extend(children)
+        else:
+            records.append(_pack_inode(node, strings, 0, 0))
+        i += 1
+        
+    cwd = strings.add(current_dir)
+    inode_offset = TREE_HEADER.size
+    string_offset = inode_offset + INODE.size * len(records)
+    header = TREE_HEADER.pack(
+        TREE_MAGIC, FORMAT_VERSION, checkpoint_seq, len(records), next_inode,
+        cwd[0], cwd[1], inode_offset, string_offset
+    )
+    _write_atomic(path, [header, b''.join(records), bytes(strings.data)])
+    
+    
+class LazyDirectory(dict):
+    """
+    Directory node read from a binary tree file. Its "content" dict is only
+    decoded from the memory map the first time node["content"] is used.
+    """
+    _decode_lock = threading.Lock()  # Two threads must not decode the same directory twice
+    
+    def __init__(self, reader, first_child, child_count, fields):
+        super().__init__(fields)
+        self._reader = reader
+        self._children = (first_child, child_count)
+        
+    def __missing__(self, key):
+        if key != "content":
+            raise KeyError(key)
+        with self._decode_lock:
+            if dict.__contains__(self, "content"):
+                return dict.__getitem__(self, "content")  # Decoded by another thread meanwhile
+            first_child, child_count = self._children
+            content = {}
+            for inode in range(first_child, first_child + child_count):
+                node = self._reader.decode(inode)
+                content[node["name"]] = node
+            self["content"] = content
+            return content
+        
+        
+class TreeReader:
+    """Memory-maps a binary tree file and decodes inodes on demand"""
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version = VERSION.unpack_from(self._map, 0)
+        if magic != TREE_MAGIC or self.version not in (1, FORMAT_VERSION):
+            raise ValueError(f"{path} is not a filesystem tree file")
+        if self.version == 1:
+            (magic, version, self.checkpoint_seq, self.inode_count,
+             cwd_offset, cwd_length, self._inode_offset, self._string_offset) = TREE_HEADER_V1.unpack_from(self._map, 0)
+            self.next_inode = None
+            self._inode = INODE_V1
+        else:
+            (magic, version, self.checkpoint_seq, self.inode_count, self.next_inode,
+             cwd_offset, cwd_length, self._inode_offset, self._string_offset) = TREE_HEADER.unpack_from(self._map, 0)
+            self._inode = INODE
+        self.current_dir = self._string(cwd_offset, cwd_length)
+        self.root = self.decode(0)
+        
+    def _string(self, offset, length):
+        if not length:
+            return None
+        start = self._string_offset + offset
+        return self._map[start:start + length].decode('utf-8')
+        
+    def decode(self, inode):
+        """Build the node dict for one inode (directories stay undecoded)"""
+        (node_type, name_off, name_len, created_off, created_len,
+         modified_off, modified_len, content_off, content_len,
+         size, alloc_start, alloc_blocks, first_child, child_count,
+         extra_off, extra_len, *inode_id) = self._inode.unpack_from(self._map, self._inode_offset + inode * self._inode.size)
+         
+        fields = {
+            "name": self._string(name_off, name_len),
+            "type": "directory" if node_type == DIRECTORY_TYPE else "file"
+        }
+        fields["size"] = size  # For directories, the total size of everything below
+        if node_type == FILE_TYPE:
+            if content_len:
+                fields["content"] = self._string(content_off, content_len)  # Inline text of older files
+        fields["created"] = self._string(created_off, created_len)
+        fields["modified"] = self._string(modified_off, modified_len)
+        if alloc_start >= 0:
+            fields["allocation"] = [alloc_start, alloc_blocks]
+        if extra_len:
+            fields.update(json.loads(self._string(extra_off, extra_len)))
+        if inode_id:
+            fields["inode"] = inode_id[0]
+            
+        if node_type == DIRECTORY_TYPE:
+            return LazyDirectory(self, first_child, child_count, fields)
+        return fields
+        
+    def close(self):
+        self._map.close()
+        self._file.close()
+        
+        
+def materialize(node):
+    """Decode every lazy directory below node so it can be serialized"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node["type"] == "directory":
+            stack.extend(node["content"].values())
+            
+            
+def write_storage(path, bitmap, file_allocation_table, allocation_policy, checkpoint_seq):
+    """Write the bitmap and FAT as packed binary records"""
+    strings = StringTable()
+    fat_records = [
+        FAT_ENTRY.pack(inode, start_block, num_blocks)
+        for inode, allocation in file_allocation_table.items()
+        for start_block, num_blocks in allocation_runs(allocation)
+    ]
+    policy = strings.add(allocation_policy)
+    bitmap_offset = STORAGE_HEADER.size
+    fat_offset = bitmap_offset + len(bitmap.bits)
+    string_offset = fat_offset + FAT_ENTRY.size * len(fat_records)
+    header = STORAGE_HEADER.pack(
+        STORAGE_MAGIC, FORMAT_VERSION, checkpoint_seq, len(bitmap), len(fat_records),
+        policy[0], policy[1], bitmap_offset, fat_offset, string_offset
+    )
+    _write_atomic(path, [header, bytes(bitmap.bits), b''.join(fat_records), bytes(strings.data)])
+    
+    
+def read_storage(path):
+    """Read a binary storage file into the same dict shape as storage.json"""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        (magic, version, checkpoint_seq, num_blocks, fat_count, policy_offset, policy_length,
+         bitmap_offset, fat_offset, string_offset) = STORAGE_HEADER.unpack_from(data, 0)
+        if magic != STORAGE_MAGIC or version not in (1, FORMAT_VERSION):
+            raise ValueError(f"{path} is not a storage file")
+            
+        def string(offset, length):
+            start = string_offset + offset
+            return data[start:start + length].decode('utf-8')
+            
+        bitmap = Bitmap(num_blocks, data[bitmap_offset:fat_offset])
+        fat = {}
+        if version == 1:
+            # Path-keyed FAT of older files; FileSystem rebuilds it by inode
+            for path_offset, path_length, start_block, num_blocks in FAT_ENTRY_V1.iter_unpack(data[fat_offset:string_offset]):
+                fat[string(path_offset, path_length)] = [start_block, num_blocks]
+        else:
+            for inode, start_block, num_blocks in FAT_ENTRY.iter_unpack(data[fat_offset:string_offset]):
+                if inode in fat:
+                    # Further runs of an extent-mode file
+                    fat[inode] = allocation_runs(fat[inode]) + [(start_block, num_blocks)]
+                else:
+                    fat[inode] = [start_block, num_blocks]
+        return {
+            'bitmap': bitmap,
+            'file_allocation_table': fat,
+            'allocation_policy': string(policy_offset, policy_length),
+            'checkpoint_seq': checkpoint_seq
+        }
\ No newline at end of file
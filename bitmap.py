@@ -0,0 +1,191 @@
+import base64
+import re
+
+_HAS_ZERO_BIT = re.compile(b'[^\xff]')  # Byte with at least one free block
+_HAS_ONE_BIT = re.compile(b'[^\x00]')  # Byte with at least one used block
+
+class Bitmap:
+    """
+    Bit-packed block bitmap (0=free, 1=used), one bit per block.
+    Behaves like the old list of ints for indexing, len() and iteration,
+    while range updates, counting and run scans work on whole bytes.
+    """
+    def __init__(self, num_blocks, data=None):
+        self.num_blocks = num_blocks
+        self.bits = bytearray(data) if data is not None else bytearray((num_blocks + 7) // 8)
+        self.changes = None  # [start_block, end_block) ranges written since take_changes(), once tracked
+        
+    def track_changes(self):
+        """Start recording which ranges are written (for views that redraw only what changed)"""
+        if self.changes is None:
+            self.changes = []
+            
+    def take_changes(self):
+        """Ranges written since the last call, and start a new list"""
+        changes, self.changes = self.changes or [], []
+        return changes
+        
+    def _changed(self, start_block, end_block):
+        changes = self.changes
+        if changes is None:
+            return
+        if changes and changes[-1][1] == start_block:
+            changes[-1] = (changes[-1][0], end_block)
+        elif len(changes) >= 1024:
+            # Too many to list; one range covering them all
+            changes[:] = [(min(start_block, *(start for start, end in changes)),
+                           max(end_block, *(end for start, end in changes)))]
+        else:
+            changes.append((start_block, end_block))
+            
+    @classmethod
+    def from_list(cls, values):
+        """Build a bitmap from a list of 0/1 values (old storage.json format)"""
+        bitmap = cls(len(values))
+        for i, value in enumerate(values):
+            if value:
+                bitmap.bits[i >> 3] |= 1 << (i & 7)
+        return bitmap
+        
+    @classmethod
+    def from_json(cls, data):
+        """Load from the value stored under 'bitmap' in storage.json"""
+        if isinstance(data, list):
+            return cls.from_list(data)
+        return cls(data['blocks'], base64.b64decode(data['packed']))
+        
+    def to_json(self):
+        """Compact JSON form: block count plus base64 of the packed bits"""
+        return {
+            'blocks': self.num_blocks,
+            'packed': base64.b64encode(bytes(self.bits)).decode('ascii')
+        }
+        
+    def tolist(self):
+        return list(self)
+        
+    def __len__(self):
+        return self.num_blocks
+        
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.num_blocks))]
+        if index < 0:
+            index += self.num_blocks
+        if not 0 <= index < self.num_blocks:
+            raise IndexError("bitmap index out of range")
+        return (self.bits[index >> 3] >> (index & 7)) & 1
+        
+    def __setitem__(self, index, value):
+        if index < 0:
+            index += self.num_blocks
+        if not 0 <= index < self.num_blocks:
+            raise IndexError("bitmap index out of range")
+        if value:
+            self.bits[index >> 3] |= 1 << (index & 7)
+        else:
+            self.bits[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+        self._changed(index, index + 1)
+            
+    def __iter__(self):
+        for byte_index, byte in enumerate(self.bits):
+            base = byte_index << 3
+            for bit in range(min(8, self.num_blocks - base)):
+                yield (byte >> bit) & 1
+                
+    def __eq__(self, other):
+        if isinstance(other, Bitmap):
+            return self.num_blocks == other.num_blocks and self.bits == other.bits
+        return list(self) == list(other)
+        
+    def set_range(self, start_block, num_blocks, value):
+        """Set num_blocks bits starting at start_block to value (0 or 1)"""
+        end_block = min(start_block + num_blocks, self.num_blocks)
+        if start_block >= end_block:
+            return
+        self._changed(start_block, end_block)
+            
+        first_byte = start_block >> 3
+        last_byte = (end_block - 1) >> 3
+        head_mask = (0xFF << (start_block & 7)) & 0xFF
+        tail_mask = 0xFF >> (7 - ((end_block - 1) & 7))
+        
+        if first_byte == last_byte:
+            mask = head_mask & tail_mask
+            if value:
+                self.bits[first_byte] |= mask
+            else:
+                self.bits[first_byte] &= ~mask & 0xFF
+            return
+            
+        # Partial bytes at both ends, whole bytes in between
+        if value:
+            self.bits[first_byte] |= head_mask
+            self.bits[last_byte] |= tail_mask
+        else:
+            self.bits[first_byte] &= ~head_mask & 0xFF
+            self.bits[last_byte] &= ~tail_mask & 0xFF
+        fill = b'\xff' if value else b'\x00'
+        self.bits[first_byte + 1:last_byte] = fill * (last_byte - first_byte - 1)
+        
+    def count(self, start_block=0, end_block=None):
+        """Number of used blocks (population count) in [start_block, end_block)"""
+        if end_block is None:
+            end_block = self.num_blocks
+        if start_block >= end_block:
+            return 0
+        first_byte = start_block >> 3
+        last_byte = (end_block - 1) >> 3
+        value = int.from_bytes(self.bits[first_byte:last_byte + 1], 'little')
+        value >>= start_block & 7
+        value &= (1 << (end_block - start_block)) - 1
+        return bin(value).count('1')
+        
+    def _find(self, pattern, want, start_block, end_block):
+        """Index of the first bit equal to want in [start_block, end_block)"""
+        if end_block is None:
+            end_block = self.num_blocks
+        i = start_block
+        while i < end_block:
+            # Finish the current partial byte bit by bit
+            if i & 7:
+                if self[i] == want:
+                    return i
+                i += 1
+                continue
+            match = pattern.search(self.bits, i >> 3, ((end_block - 1) >> 3) + 1)
+            if match is None:
+                return end_block
+            i = match.start() << 3
+            byte = match.group()[0] if want else ~match.group()[0] & 0xFF
+            i += (byte & -byte).bit_length() - 1
+            return min(i, end_block)
+        return end_block
+        
+    def find_zero(self, start_block=0, end_block=None):
+        """First free block at or after start_block (end_block if none)"""
+        return self._find(_HAS_ZERO_BIT, 0, start_block, end_block)
+        
+    def find_one(self, start_block=0, end_block=None):
+        """First used block at or after start_block (end_block if none)"""
+        return self._find(_HAS_ONE_BIT, 1, start_block, end_block)
+        
+    def zero_runs(self, start_block=0, end_block=None):
+        """Iterate (start_block, length) of free runs in address order"""
+        if end_block is None:
+            end_block = self.num_blocks
+        i = self.find_zero(start_block, end_block)
+        while i < end_block:
+            j = self.find_one(i, end_block)
+            yield i, j - i
+            i = self.find_zero(j, end_block)
+            
+    def one_runs(self, start_block=0, end_block=None):
+        """Iterate (start_block, length) of used runs in address order"""
+        if end_block is None:
+            end_block = self.num_blocks
+        i = self.find_one(start_block, end_block)
+        while i < end_block:
+            j = self.find_zero(i, end_block)
+            yield i, j - i
+            i = self.find_one(j, end_block)
\ No newline at end of file
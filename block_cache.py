@@ -0,0 +1,217 @@
+import threading
+from collections import OrderedDict
+from locking import synchronized
+
+class BlockCache:
+    """
+    Write-back cache of disk image blocks with a fixed memory budget.
+    Reads and writes of file data go through it, so hot blocks are served
+    from memory; written blocks stay dirty until sync() or until they are
+    evicted. Evicts the least recently used block; see ClockBlockCache for
+    the cheaper CLOCK approximation.
+    """
+    name = 'lru'
+    
+    def __init__(self, disk_image, block_size, capacity_bytes):
+        self.lock = threading.Lock()  # Reads change the eviction order too, so every access takes it
+        self.disk_image = disk_image
+        self.block_size = block_size
+        self.capacity = max(capacity_bytes // block_size, 1)  # Blocks held at once
+        self.blocks = OrderedDict()  # {block number: bytearray}, least recently used first
+        self.dirty = set()  # Blocks changed since they were loaded
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+        self.readaheads = 0  # Blocks loaded ahead of a sequential reader
+        
+    def _touch(self, block):
+        """Note a hit on a cached block"""
+        self.blocks.move_to_end(block)
+        
+    def _victim(self):
+        """Block to evict to make room"""
+        return next(iter(self.blocks))
+        
+    def _insert(self, block, data):
+        if len(self.blocks) >= self.capacity:
+            self._evict(self._victim())
+        self.blocks[block] = data
+        
+    def _forget(self, block):
+        """Drop a block from the cache without writing it back"""
+        del self.blocks[block]
+        self.dirty.discard(block)
+        
+    def _evict(self, block):
+        if block in self.dirty:
+            self._write_back(block)
+        self._forget(block)
+        self.evictions += 1
+        
+    def _write_back(self, block):
+        self.disk_image.write(block * self.block_size, self.blocks[block])
+        self.dirty.discard(block)
+        self.writebacks += 1
+        
+    def _load(self, block):
+        """Cached bytes of a block, reading it from the image on a miss"""
+        data = self.blocks.get(block)
+        if data is not None:
+            self.hits += 1
+            self._touch(block)
+            return data
+        self.misses += 1
+        data = bytearray(self.disk_image.read(block * self.block_size, self.block_size))
+        self._insert(block, data)
+        return data
+        
+    def _pieces(self, offset, length):
+        """Yield (block, start, end) byte slices of the blocks covering a range"""
+        end = offset + length
+        while offset < end:
+            block, start = divmod(offset, self.block_size)
+            count = min(self.block_size - start, end - offset)
+            yield block, start, start + count
+            offset += count
+            
+    @synchronized
+    def read(self, offset, length):
+        """Bytes of the image at offset; a view of the cached block when the range is inside one"""
+        pieces = list(self._pieces(offset, length))
+        if len(pieces) == 1:
+            block, start, end = pieces[0]
+            return memoryview(self._load(block))[start:end]
+        data = bytearray()
+        for block, start, end in pieces:
+            data += memoryview(self._load(block))[start:end]
+        return memoryview(data)
+        
+    @synchronized
+    def write(self, offset, data):
+        """Write bytes into the cached blocks and mark them dirty"""
+        data = memoryview(data).cast('B')
+        written = 0
+        for block, start, end in self._pieces(offset, len(data)):
+            if end - start == self.block_size and block not in self.blocks:
+                # Whole block overwritten; no need to read the old bytes
+                self.misses += 1
+                self._insert(block, bytearray(data[written:written + self.block_size]))
+            else:
+                self._load(block)[start:end] = data[written:written + end - start]
+            self.dirty.add(block)
+            written += end - start
+            
+    @synchronized
+    def prefetch(self, offset, length):
+        """Load the blocks of a range that are not cached yet (readahead)"""
+        for block in self._blocks(offset, min(length, self.capacity * self.block_size)):
+            if block not in self.blocks:
+                self._insert(block, bytearray(self.disk_image.read(block * self.block_size, self.block_size)))
+                self.readaheads += 1
+                
+    def _blocks(self, offset, length):
+        """Block numbers touched by a byte range"""
+        if length <= 0:
+            return range(0)
+        return range(offset // self.block_size, (offset + length - 1) // self.block_size + 1)
+        
+    @synchronized
+    def write_back(self, offset, length):
+        """Write the dirty cached blocks of a range to the image (they stay cached)"""
+        for block in self._blocks(offset, length):
+            if block in self.dirty:
+                self._write_back(block)
+                
+    @synchronized
+    def drop(self, offset, length):
+        """
+        Write back and forget the cached blocks of a range, before the image
+        is changed under them (moves and zeroing bypass the cache)
+        """
+        for block in self._blocks(offset, length):
+            if block in self.blocks:
+                if block in self.dirty:
+                    self._write_back(block)
+                self._forget(block)
+                
+    @synchronized
+    def sync(self):
+        """Write every dirty block to the image"""
+        for block in sorted(self.dirty):
+            self._write_back(block)
+            
+    @synchronized
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'policy': self.name,
+            'capacity_blocks': self.capacity,
+            'cached_blocks': len(self.blocks),
+            'dirty_blocks': len(self.dirty),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'writebacks': self.writebacks,
+            'readahead_blocks': self.readaheads
+        }
+        
+        
+class ClockBlockCache(BlockCache):
+    """
+    CLOCK (second chance) eviction: a hit only sets a reference bit, and
+    the hand sweeps the slots clearing bits until it finds a block that
+    was not used since the last sweep.
+    """
+    name = 'clock'
+    
+    def __init__(self, disk_image, block_size, capacity_bytes):
+        super().__init__(disk_image, block_size, capacity_bytes)
+        self.blocks = {}
+        self.slots = []  # Block number in each clock slot (None when free)
+        self.slot_of = {}  # {block number: slot}
+        self.free_slots = []  # Slots emptied by eviction or invalidation
+        self.referenced = []  # Reference bit of each slot
+        self.hand = 0
+        
+    def _touch(self, block):
+        self.referenced[self.slot_of[block]] = True
+        
+    def _victim(self):
+        while True:
+            block = self.slots[self.hand]
+            if block is not None and not self.referenced[self.hand]:
+                return block
+            self.referenced[self.hand] = False
+            self.hand = (self.hand + 1) % len(self.slots)
+            
+    def _insert(self, block, data):
+        if len(self.blocks) >= self.capacity:
+            self._evict(self._victim())
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.slots[slot] = block
+            self.referenced[slot] = True
+        else:
+            slot = len(self.slots)
+            self.slots.append(block)
+            self.referenced.append(True)
+        self.slot_of[block] = slot
+        self.blocks[block] = data
+        
+    def _forget(self, block):
+        super()._forget(block)
+        slot = self.slot_of.pop(block)
+        self.slots[slot] = None
+        self.free_slots.append(slot)
+        
+        
+BLOCK_CACHES = {cache.name: cache for cache in (BlockCache, ClockBlockCache)}
+
+
+def make_block_cache(name, disk_image, block_size, capacity_bytes):
+    """Create a block cache by eviction policy name ('lru' or 'clock')"""
+    if name not in BLOCK_CACHES:
+        raise ValueError(f"Unknown cache policy: {name}")
+    return BLOCK_CACHES[name](disk_image, block_size, capacity_bytes)
\ No newline at end of file
@@ -0,0 +1,74 @@
+import sys
+from commands import CommandInterpreter
+
+def split_commands(text):
+    """Command lines in a script: one per line or separated by ';', '#' starts a comment"""
+    for line in text.splitlines():
+        line = line.split('#', 1)[0]
+        for command in line.split(';'):
+            if command.strip():
+                yield command.strip()
+                
+def _output(text, color="white"):
+    """Errors (red in the GUI) go to stderr"""
+    (sys.stderr if color == "red" else sys.stdout).write(text)
+    
+def _clear():
+    if sys.stdout.isatty():
+        sys.stdout.write("\033[2J\033[H")
+        
+def run_script(fs, commands, echo=False):
+    """
+    Run command lines without a prompt; returns the number that failed.
+    Journal records are not fsynced one by one while the script runs; the
+    checkpoint when the filesystem is closed makes the result durable.
+    """
+    interpreter = CommandInterpreter(fs, _output, on_clear=_clear)
+    durable = fs.journal.durable
+    fs.journal.durable = False
+    failed = 0
+    try:
+        for command in commands:
+            if echo:
+                sys.stdout.write(f"$ {command}\n")
+            if not interpreter.execute(command):
+                failed += 1
+    finally:
+        fs.journal.durable = durable
+    return failed
+    
+def _completer(interpreter, readline):
+    """readline completer for command names and paths"""
+    matches = []
+    
+    def complete(text, state):
+        if state == 0:
+            line = readline.get_line_buffer()[:readline.get_endidx()]
+            matches[:] = interpreter.complete(line)[1]
+        return matches[state] if state < len(matches) else None
+    return complete
+    
+def repl(fs):
+    """Interactive prompt; exit with 'exit', 'quit' or Ctrl+D"""
+    interpreter = CommandInterpreter(fs, _output, on_clear=_clear)
+    try:
+        import readline  # Line editing, history and Tab completion where available
+    except ImportError:
+        pass
+    else:
+        readline.set_completer(_completer(interpreter, readline))
+        readline.set_completer_delims(" \t")
+        readline.parse_and_bind("tab: complete")
+    print("File System Terminal\nType 'help' for available commands, 'exit' to quit")
+    while True:
+        try:
+            command = input(f"{fs.current_dir}$ ")
+        except EOFError:
+            print()
+            break
+        except KeyboardInterrupt:
+            print()
+            continue
+        if command.strip() in ("exit", "quit"):
+            break
+        interpreter.execute(command)
\ No newline at end of file
@@ -0,0 +1,100 @@
+import asyncio
+import itertools
+from protocol import MAX_LINE, to_wire, from_wire, encode_message, decode_message
+
+class RemoteError(Exception):
+    """An operation raised on the server"""
+    
+    
+class FileSystemClient:
+    """
+    Async client for FileSystemServer. Calls return as soon as the server
+    answers them, and many calls can be in flight at once on the one
+    connection:
+
+        client = await FileSystemClient.connect()
+        await client.create_file("a.txt", 100, "/")
+        results = await asyncio.gather(*(client.get_file_content(f"f{i}", "/") for i in range(100)))
+        await client.close()
+
+    Methods mirror FileSystem's, e.g. client.create_file(...) sends
+    'create_file'. (success, message) results come back as tuples and file
+    contents as bytes.
+    """
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count(1)
+        self._pending = {}  # {request id: future}
+        self._receiver = asyncio.create_task(self._receive())
+        
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=8765):
+        reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+        return cls(reader, writer)
+        
+    async def call(self, op, *args, **kwargs):
+        """Send one request and wait for its result"""
+        if self._receiver.done():
+            raise ConnectionError("Connection to the filesystem server is closed")
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(encode_message({
+            'id': request_id,
+            'op': op,
+            'args': to_wire(args),
+            'kwargs': to_wire(kwargs)
+        }))
+        await self._writer.drain()
+        return await future
+        
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+            
+        async def remote(*args, **kwargs):
+            return await self.call(name, *args, **kwargs)
+        return remote
+        
+    async def _receive(self):
+        """Resolve pending calls as their responses arrive, in any order"""
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                response = decode_message(line)
+                future = self._pending.pop(response.get('id'), None)
+                if future is None or future.done():
+                    continue
+                if response['ok']:
+                    result = from_wire(response['result'])
+                    future.set_result(tuple(result) if isinstance(result, list) else result)
+                else:
+                    future.set_exception(RemoteError(response['error']))
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection to the filesystem server was lost"))
+            self._pending.clear()
+            
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        self._receiver.cancel()
+        try:
+            await self._receiver
+        except asyncio.CancelledError:
+            pass
+            
+    async def __aenter__(self):
+        return self
+        
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
\ No newline at end of file
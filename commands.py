@@ -0,0 +1,385 @@
+import codecs
+from filesystem import has_wildcards
+
+HELP = (
+    "Available commands:\n"
+    "  ls [-S|-t] [-r] [path] - List directory contents (by name, size or time)\n"
+    "  find [path] [-name <pattern>] [-type f|d] [-size <min bytes>] [-after <date>] - Search below a directory\n"
+    "  cd [path]      - Change directory\n"
+    "  mkdir <dir>    - Create directory\n"
+    "  touch <file>   - Create file\n"
+    "  rm [-r] <path>... - Remove files (-r: also directories and their contents)\n"
+    "  cp <src>... <dest> - Copy files or directories\n"
+    "  mv <src>... <dest> - Move files or directories\n"
+    "  cat <file>...  - Show file content\n"
+    "  truncate <file> <size> - Shrink or extend a file\n"
+    "  df [-v]        - Show disk usage (-v: fragmentation and allocator stats)\n"
+    "  defrag         - Compact files to join free space\n"
+    "  clear          - Clear terminal\n"
+    "  help           - Show this help\n"
+    "Paths may use the wildcards * ? [...], e.g. rm *.log\n"
+)
+
+COMMANDS = ("ls", "find", "cd", "mkdir", "touch", "rm", "cp", "mv", "cat", "truncate", "df", "defrag", "clear", "help")
+
+class CommandInterpreter:
+    """
+    The terminal commands (ls, cd, mkdir, ...) on top of a FileSystem,
+    independent of any UI. Output goes to write(text, color); messages in
+    red are errors. The GUI terminal and the headless CLI (cli.py) both
+    drive one of these.
+    """
+    LS_PAGE = 500  # Entries per chunk of ls output
+    
+    def __init__(self, fs, write, on_change=None, on_clear=None, schedule=None):
+        self.fs = fs
+        self._write = write
+        self.on_change = on_change or (lambda: None)  # Called after the tree or current directory changes
+        self.on_clear = on_clear or (lambda: None)
+        self.schedule = schedule  # schedule(callback) runs callback later, e.g. Tk's after()
+        self.errors = 0  # Commands that reported an error
+        
+    def write(self, text, color="white"):
+        if color == "red":
+            self.errors += 1
+        self._write(text, color)
+        
+    def execute(self, command):
+        """Run one command line; returns False if it reported an error"""
+        errors = self.errors
+        command = command.strip()
+        if not command:
+            return True
+            
+        parts = command.split()
+        cmd = parts[0]
+        args = parts[1:]
+        if cmd != "find":
+            args = self.expand(args)  # find takes its -name pattern as is
+            
+        if cmd == "help":
+            self.write(HELP)
+        elif cmd == "clear":
+            self.on_clear()
+        elif cmd == "ls":
+            # -S sorts by size, -t by modification time, -r reverses
+            flags = "".join(arg[1:] for arg in args if arg.startswith("-"))
+            args = [arg for arg in args if not arg.startswith("-")]
+            sort = 'size' if 'S' in flags else 'modified' if 't' in flags else 'name'
+            
+            # Get path from arguments or use current directory
+            path = self.absolute(args[0]) if args else self.fs.current_dir
+            
+            # Largest and newest first, like ls
+            reverse = (sort != 'name') != ('r' in flags)
+            entries, cursor = self.fs.list_directory(path, sort, reverse, limit=self.LS_PAGE)
+            if entries is None:
+                self.write(f"ls: cannot access '{path}': No such file or directory\n", "red")
+            else:
+                self.write(f"Contents of {path}:\n")
+                # Stream page by page instead of building the whole listing first
+                while entries:
+                    self.write("".join(f"{name}/\n" if item['type'] == 'directory' else f"{name}\n" for name, item in entries))
+                    if cursor is None:
+                        break
+                    entries, cursor = self.fs.list_directory(path, sort, reverse, cursor, self.LS_PAGE)
+        elif cmd == "find":
+            self.find(args)
+        elif cmd == "cd":
+            path = args[0] if args else "/"
+            
+            # Special case for ".." to go up one directory
+            if path == "..":
+                if self.fs.current_dir == "/":
+                    # Already at root, do nothing
+                    self.write("Already at root directory\n")
+                    return True
+                # Get parent directory by removing the last segment
+                path_parts = self.fs.current_dir.rstrip('/').split('/')
+                if len(path_parts) > 1:
+                    parent_dir = '/'.join(path_parts[:-1])
+                    if not parent_dir:
+                        parent_dir = "/"
+                else:
+                    parent_dir = "/"
+                success, message = self.fs.change_directory(parent_dir)
+            else:
+                success, message = self.fs.change_directory(path)
+                
+            if success:
+                self.write(f"Changed directory to {self.fs.current_dir}\n")
+                self.on_change()
+            else:
+                self.write(f"cd: {message}\n", "red")
+        elif cmd == "mkdir":
+            if not args:
+                self.write("mkdir: missing operand\n", "red")
+            else:
+                name, parent = self.split(args[0])
+                success, message = self.fs.create_directory(name, parent)
+                if success:
+                    self.write(f"Directory '{args[0]}' created\n")
+                    self.on_change()
+                else:
+                    self.write(f"mkdir: {message}\n", "red")
+        elif cmd == "touch":
+            if not args:
+                self.write("touch: missing operand\n", "red")
+            else:
+                size = 1024  # Default size
+                if len(args) > 1 and args[1].isdigit():
+                    size = int(args[1])
+                name, parent = self.split(args[0])
+                success, message = self.fs.create_file(name, size, parent)
+                if success:
+                    self.write(f"File '{args[0]}' created ({size} bytes)\n")
+                    self.on_change()
+                else:
+                    self.write(f"touch: {message}\n", "red")
+        elif cmd == "rm":
+            # -r also removes directories, with everything in them
+            recursive = any(arg in ("-r", "-R", "-rf") for arg in args)
+            args = [arg for arg in args if not arg.startswith("-")]
+            if not args:
+                self.write("rm: missing operand\n", "red")
+            else:
+                removed = False
+                for path in args:
+                    name, parent = self.split(path)
+                    node = self.fs.get_node_at_path(self.absolute(path))
+                    if node and node["type"] == "directory":
+                        if not recursive:
+                            self.write(f"rm: {path}: Is a directory (use rm -r)\n", "red")
+                            continue
+                        success, message = self.fs.delete_directory(name, parent)
+                    else:
+                        success, message = self.fs.delete_file(name, parent)
+                    if success:
+                        self.write(f"Removed '{path}'\n")
+                        removed = True
+                    else:
+                        self.write(f"rm: {path}: {message}\n", "red")
+                if removed:
+                    self.on_change()
+        elif cmd == "cp":
+            if len(args) < 2:
+                self.write("cp: missing file operand\n", "red")
+            else:
+                # Several sources go into the last argument, a directory
+                changed = False
+                for source in args[:-1]:
+                    success, message = self.fs.copy_item(source, args[-1])
+                    if success:
+                        self.write(f"Copied '{source}' to '{args[-1]}'\n")
+                        changed = True
+                    else:
+                        self.write(f"cp: {message}\n", "red")
+                if changed:
+                    self.on_change()
+        elif cmd == "mv":
+            if len(args) < 2:
+                self.write("mv: missing file operand\n", "red")
+            else:
+                # Several sources go into the last argument, a directory
+                changed = False
+                for source in args[:-1]:
+                    success, message = self.fs.move_item(source, args[-1])
+                    if success:
+                        self.write(f"Moved '{source}' to '{args[-1]}'\n")
+                        changed = True
+                    else:
+                        self.write(f"mv: {message}\n", "red")
+                if changed:
+                    self.on_change()
+        elif cmd == "truncate":
+            if len(args) < 2 or not args[1].isdigit():
+                self.write("truncate: usage: truncate <file> <size>\n", "red")
+            else:
+                success, message = self.fs.resize_file(args[0], int(args[1]))
+                if success:
+                    self.write(f"'{args[0]}' is now {args[1]} bytes\n")
+                    self.on_change()
+                else:
+                    self.write(f"truncate: {message}\n", "red")
+        elif cmd == "cat":
+            if not args:
+                self.write("cat: missing file operand\n", "red")
+            else:
+                for path in args:
+                    try:
+                        # Stream the file chunk by chunk instead of loading it whole
+                        with self.fs.open(path) as f:
+                            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+                            for chunk in f:
+                                text = decoder.decode(chunk).rstrip('\x00')
+                                if text:
+                                    self.write(text)
+                            self.write(decoder.decode(b'', final=True) + "\n")
+                    except (FileNotFoundError, IsADirectoryError):
+                        self.write(f"cat: {path}: No such file or directory\n", "red")
+        elif cmd == "df":
+            disk_info = self.fs.get_disk_info()
+            usage = (disk_info['used_bytes'] / disk_info['total_bytes']) * 100 if disk_info['total_bytes'] > 0 else 0
+            self.write(
+                f"Filesystem      Size  Used  Avail Use%\n"
+                f"VirtualDisk   {self.fs.format_size(disk_info['total_bytes'])} "
+                f"{self.fs.format_size(disk_info['used_bytes'])} "
+                f"{self.fs.format_size(disk_info['free_bytes'])} "
+                f"{int(usage)}%\n"
+            )
+            if "-v" in args:
+                metrics = self.fs.get_metrics()
+                block_size = metrics['block_size']
+                lines = [
+                    f"Free extents: {metrics['free_extent_count']}, "
+                    f"largest {self.fs.format_size(metrics['largest_free_extent'] * block_size)}",
+                    f"External fragmentation: {metrics['external_fragmentation'] * 100:.1f}%",
+                    f"Internal slack: {self.fs.format_size(metrics['internal_slack_bytes'])}",
+                    "Extent sizes (blocks): " + ", ".join(
+                        f"{min_blocks}+: {count}" for min_blocks, count in metrics['free_extent_histogram'].items()
+                    )
+                ]
+                for op, stats in metrics['operations'].items():
+                    lines.append(
+                        f"{op}: {stats['calls']} calls, {stats['failures']} failed, "
+                        f"avg {stats['mean_seconds'] * 1e6:.1f} us, max {stats['max_seconds'] * 1e6:.1f} us, "
+                        f"{stats['blocks_scanned']} blocks scanned"
+                    )
+                cache = metrics['block_cache']
+                if cache:
+                    lines.append(
+                        f"Block cache ({cache['policy']}): {cache['cached_blocks']}/{cache['capacity_blocks']} blocks, "
+                        f"{cache['dirty_blocks']} dirty, hit ratio {cache['hit_ratio'] * 100:.1f}% "
+                        f"({cache['hits']} hits, {cache['misses']} misses), "
+                        f"{cache['evictions']} evictions, {cache['readahead_blocks']} read ahead"
+                    )
+                self.write("\n".join(lines) + "\n")
+        elif cmd == "defrag":
+            self.write("Defragmenting...\n")
+            self.run_defrag()
+        else:
+            self.write(f"{cmd}: command not found\n", "red")
+        return self.errors == errors
+        
+    def absolute(self, path):
+        """A path typed at the prompt made absolute against the current directory"""
+        # Normalize the path for consistency
+        path = path.replace("\\", "/")
+        
+        # Handle relative paths properly
+        if not path.startswith("/"):
+            # If path is relative, join it with current directory
+            if self.fs.current_dir.endswith("/"):
+                path = self.fs.current_dir + path
+            else:
+                path = self.fs.current_dir + "/" + path
+                
+        # Clean path from double slashes
+        while "//" in path:
+            path = path.replace("//", "/")
+        return path
+        
+    def split(self, path):
+        """(name, parent directory) of a path; the parent is None for the current directory"""
+        path = path.replace("\\", "/").rstrip("/")
+        if "/" not in path:
+            return path, None
+        parent, name = self.absolute(path).rsplit("/", 1)
+        return name, parent or "/"
+        
+    def expand(self, args):
+        """Replace arguments with wildcards by the paths they match, like a shell; unmatched ones stay"""
+        expanded = []
+        for arg in args:
+            matches = self.fs.glob(arg) if has_wildcards(arg) else None
+            expanded.extend(matches or [arg])
+        return expanded
+        
+    def find(self, args):
+        """find [path] [-name pattern] [-type f|d] [-size min_bytes] [-after date]"""
+        options = {}
+        root = None
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            if arg in ("-name", "-type", "-size", "-after"):
+                if i + 1 == len(args):
+                    self.write(f"find: missing argument to '{arg}'\n", "red")
+                    return
+                options[arg] = args[i + 1]
+                i += 2
+            elif arg.startswith("-") or root is not None:
+                self.write(f"find: unknown argument '{arg}'\n", "red")
+                return
+            else:
+                root = arg
+                i += 1
+                
+        root = self.absolute(root) if root else self.fs.current_dir
+        node = self.fs.get_node_at_path(root)
+        if not node or node["type"] != "directory":
+            self.write(f"find: '{root}': No such directory\n", "red")
+            return
+        if options.get("-type", "f") not in ("f", "d"):
+            self.write(f"find: unknown type '{options['-type']}' (use f or d)\n", "red")
+            return
+        min_size = options.get("-size", "0").lstrip("+")
+        if not min_size.isdigit():
+            self.write(f"find: invalid size '{options['-size']}'\n", "red")
+            return
+            
+        results = self.fs.find(
+            root,
+            name_glob=options.get("-name"),
+            type=options.get("-type"),
+            min_size=int(min_size) if "-size" in options else None,
+            modified_after=options.get("-after")
+        )
+        # Stream results in chunks, like ls
+        lines = []
+        for path, item in results:
+            lines.append(f"{path}/\n" if item['type'] == 'directory' else f"{path}\n")
+            if len(lines) == self.LS_PAGE:
+                self.write("".join(lines))
+                lines = []
+        if lines:
+            self.write("".join(lines))
+            
+    def complete(self, line):
+        """
+        Completions for the last word of line (a command name or a path);
+        returns (start, candidates) where the word is line[start:]
+        """
+        start = line.rfind(" ") + 1
+        word = line[start:]
+        if not line[:start].strip():
+            return start, [command + " " for command in COMMANDS if command.startswith(word)]
+        return start, self.fs.complete(word)
+        
+    def run_defrag(self, totals=None):
+        """
+        Compact the disk in short slices. With a scheduler each slice is
+        queued separately so a GUI stays responsive; without one the slices
+        run back to back.
+        """
+        if totals is None:
+            totals = {'blocks_moved': 0, 'files_moved': set(), 'largest_free_before': None}
+        while True:
+            report = self.fs.compact(time_budget=0.02)
+            if totals['largest_free_before'] is None:
+                totals['largest_free_before'] = report['largest_free_before']
+            totals['blocks_moved'] += report['blocks_moved']
+            totals['files_moved'].update(file_id for file_id, old, new in report['moves'])
+            if report['done']:
+                break
+            if self.schedule:
+                self.schedule(lambda: self.run_defrag(totals))
+                return
+                
+        block_size = self.fs.storage.block_size
+        self.write(
+            f"Moved {totals['blocks_moved']} blocks in {len(totals['files_moved'])} files\n"
+            f"Largest free extent: {self.fs.format_size(totals['largest_free_before'] * block_size)} -> "
+            f"{self.fs.format_size(report['largest_free_after'] * block_size)}\n"
+        )
+        self.on_change()
\ No newline at end of file
@@ -0,0 +1,56 @@
+import os
+import mmap
+
+class DiskImage:
+    """
+    Preallocated image file of disk_size bytes that holds the data of every
+    block. The file is memory-mapped, so reads hand out memoryview slices of
+    the map without copying.
+    """
+    def __init__(self, image_file, disk_size):
+        self.image_file = image_file
+        self.disk_size = disk_size
+        
+        # Create or grow the image; truncate() leaves the new space sparse
+        mode = 'r+b' if os.path.exists(image_file) else 'w+b'
+        self._file = open(image_file, mode)
+        # Bytes from here on were never written, so they read as zeros
+        self.zero_from = min(os.path.getsize(image_file), disk_size)
+        if os.path.getsize(image_file) < disk_size:
+            self._file.truncate(disk_size)
+        self._map = mmap.mmap(self._file.fileno(), disk_size)
+        self._view = memoryview(self._map)
+        
+    def read(self, offset, length):
+        """Zero-copy view of length bytes at offset"""
+        return self._view[offset:offset + length]
+        
+    def write(self, offset, data):
+        """Write bytes-like data at offset"""
+        self._view[offset:offset + len(data)] = data
+        
+    def move(self, dest, src, length):
+        """Copy length bytes from src to dest inside the image (ranges may overlap)"""
+        self._map.move(dest, src, length)
+        
+    def zero(self, offset, length):
+        """Fill a byte range with zeros"""
+        chunk = bytes(min(length, 1024 * 1024))
+        end = offset + length
+        while offset < end:
+            count = min(len(chunk), end - offset)
+            self._view[offset:offset + count] = chunk[:count]
+            offset += count
+            
+    def flush(self):
+        """Push dirty pages of the map to the image file"""
+        self._map.flush()
+        
+    def close(self):
+        self._map.flush()
+        try:
+            self._view.release()
+            self._map.close()
+        except BufferError:
+            pass  # Callers still hold views; the map is unmapped once they are gone
+        self._file.close()
\ No newline at end of file
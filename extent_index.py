@@ -0,0 +1,204 @@
+import bisect
+
+class FreeExtentIndex:
+    """
+    Index of free block runs (extents) on the disk.
+    Runs are kept sorted by start block and grouped into power-of-two
+    size buckets, so first-fit only looks at the head of each bucket
+    that is big enough instead of scanning the whole bitmap.
+    Best-fit and worst-fit need runs ordered by size; that ordering is only
+    maintained after track_sizes(True).
+    """
+    def __init__(self):
+        self.starts = []  # Sorted start blocks of all free runs
+        self.lengths = {}  # {start_block: run_length}
+        self.buckets = {}  # {size_class: sorted start blocks of runs in that class}
+        self.by_size = None  # Sorted (run_length, start_block), None when not tracked
+        
+    def build(self, bitmap):
+        """Rebuild the index from a Bitmap (0=free, 1=used)"""
+        self.starts = []
+        self.lengths = {}
+        self.buckets = {}
+        if self.by_size is not None:
+            self.by_size = []
+        
+        for start, length in bitmap.zero_runs():
+            self._add_run(start, length)
+            
+    def track_sizes(self, enabled):
+        """Turn the size-ordered view used by best-fit/worst-fit on or off"""
+        if not enabled:
+            self.by_size = None
+        elif self.by_size is None:
+            self.by_size = sorted((length, start) for start, length in self.lengths.items())
+            
+    def _size_class(self, length):
+        """Bucket number for a run length (floor of log2)"""
+        return length.bit_length() - 1
+        
+    def _add_run(self, start, length):
+        """Insert a free run without merging"""
+        bisect.insort(self.starts, start)
+        self.lengths[start] = length
+        bisect.insort(self.buckets.setdefault(self._size_class(length), []), start)
+        if self.by_size is not None:
+            bisect.insort(self.by_size, (length, start))
+        
+    def _remove_run(self, start):
+        """Remove a free run by its start block"""
+        length = self.lengths.pop(start)
+        del self.starts[bisect.bisect_left(self.starts, start)]
+        
+        size_class = self._size_class(length)
+        bucket = self.buckets[size_class]
+        del bucket[bisect.bisect_left(bucket, start)]
+        if not bucket:
+            del self.buckets[size_class]
+        if self.by_size is not None:
+            del self.by_size[bisect.bisect_left(self.by_size, (length, start))]
+        return length
+        
+    def find_run(self, block):
+        """Return the start of the free run containing block, or None"""
+        i = bisect.bisect_right(self.starts, block) - 1
+        if i >= 0:
+            start = self.starts[i]
+            if block < start + self.lengths[start]:
+                return start
+        return None
+        
+    def first_free(self):
+        """Lowest free block, or None if the disk is full"""
+        return self.starts[0] if self.starts else None
+        
+    def first_fit(self, num_blocks, from_block=0):
+        """
+        Lowest-addressed free run starting at or after from_block that can
+        hold num_blocks. Returns the run start or None.
+        """
+        size_class = self._size_class(num_blocks)
+        best = None
+        
+        # Every run in a larger bucket fits, so only each bucket head matters
+        for bucket_class, bucket in self.buckets.items():
+            if bucket_class > size_class:
+                i = bisect.bisect_left(bucket, from_block)
+                if i < len(bucket) and (best is None or bucket[i] < best):
+                    best = bucket[i]
+                    
+        # Runs in the request's own bucket may be too short; stop once past best
+        bucket = self.buckets.get(size_class, [])
+        i = bisect.bisect_left(bucket, from_block)
+        while i < len(bucket):
+            start = bucket[i]
+            if best is not None and start > best:
+                break
+            if self.lengths[start] >= num_blocks:
+                best = start
+                break
+            i += 1
+            
+        return best
+        
+    def best_fit(self, num_blocks):
+        """Start of the smallest run that can hold num_blocks, or None"""
+        i = bisect.bisect_left(self.by_size, (num_blocks, -1))
+        if i < len(self.by_size):
+            return self.by_size[i][1]
+        return None
+        
+    def worst_fit(self, num_blocks):
+        """Start of the largest run if it can hold num_blocks, or None"""
+        if self.by_size and self.by_size[-1][0] >= num_blocks:
+            # Lowest address among the largest runs
+            largest = self.by_size[-1][0]
+            return self.by_size[bisect.bisect_left(self.by_size, (largest, -1))][1]
+        return None
+        
+    def reserve(self, start_block, num_blocks):
+        """Carve an allocated range out of the free run that contains it"""
+        if num_blocks <= 0:
+            return
+        run_start = self.find_run(start_block)
+        if run_start is None:
+            raise ValueError(f"Block {start_block} is not free")
+        run_end = run_start + self.lengths[run_start]
+        end_block = start_block + num_blocks
+        if end_block > run_end:
+            raise ValueError(f"Blocks {start_block}-{end_block - 1} are not free")
+        self._remove_run(run_start)
+            
+        if start_block > run_start:
+            self._add_run(run_start, start_block - run_start)
+        if end_block < run_end:
+            self._add_run(end_block, run_end - end_block)
+            
+    def release(self, start_block, num_blocks):
+        """Return a range to the index, merging it with adjacent free runs"""
+        if num_blocks <= 0:
+            return
+        start = start_block
+        end = start_block + num_blocks
+        
+        # Merge with the run that ends right where this one starts
+        i = bisect.bisect_left(self.starts, start) - 1
+        if i >= 0:
+            prev_start = self.starts[i]
+            if prev_start + self.lengths[prev_start] == start:
+                self._remove_run(prev_start)
+                start = prev_start
+                
+        # Merge with the run that starts right where this one ends
+        if end in self.lengths:
+            end += self._remove_run(end)
+            
+        self._add_run(start, end - start)
+        
+    def next_run(self, from_block=0):
+        """(start_block, length) of the first free run starting at or after from_block, or None"""
+        i = bisect.bisect_left(self.starts, from_block)
+        if i < len(self.starts):
+            return self.starts[i], self.lengths[self.starts[i]]
+        return None
+        
+    def largest_run(self):
+        """Length of the largest free run (0 when the disk is full)"""
+        if self.by_size:
+            return self.by_size[-1][0]
+        if not self.buckets:
+            return 0
+        # The largest run is in the highest size class
+        return max(self.lengths[start] for start in self.buckets[max(self.buckets)])
+        
+    def free_block_count(self):
+        """Total number of free blocks in the index"""
+        return sum(self.lengths.values())
+        
+    def runs(self):
+        """Iterate (start_block, length) of free runs in address order"""
+        for start in self.starts:
+            yield start, self.lengths[start]            
+            
+def allocation_runs(allocation):
+    """
+    (start_block, num_blocks) runs of a file allocation. Contiguous files
+    store one [start, n] pair; files grown in extent mode store a list of
+    pairs, in file order.
+    """
+    if allocation and isinstance(allocation[0], (list, tuple)):
+        return [(run[0], run[1]) for run in allocation]
+    return [(allocation[0], allocation[1])]
+    
+    
+def make_allocation(runs):
+    """Inverse of allocation_runs: a single pair for one run, otherwise a list of pairs"""
+    runs = [run for run in runs if run[1] > 0] or runs[:1]
+    if len(runs) == 1:
+        return (runs[0][0], runs[0][1])
+    return [[start, length] for start, length in runs]
+    
+    
+def allocation_blocks(allocation):
+    """Total number of blocks in an allocation"""
+    return sum(length for start, length in allocation_runs(allocation))
\ No newline at end of file
@@ -0,0 +1,202 @@
+import os
+from extent_index import allocation_blocks
+
+class FileHandle:
+    """
+    File-like object returned by FileSystem.open(). Reads and writes go
+    straight to the file's blocks in the disk image, so only the requested
+    range is ever copied into memory. Writing past the allocation grows it.
+    Sequential reads prefetch the next chunk into the block cache. I/O
+    holds the file system's namespace lock shared, so it never overlaps
+    compaction or a batch, and writes also hold off checkpoints until
+    their allocation changes are journaled; concurrent writers of one file
+    are not ordered.
+    Every call finds the file again by inode ID, so the handle follows
+    renames and moves, and I/O on a deleted file raises OSError.
+    Iterating yields chunks of chunk_size bytes. The new size is journaled
+    when the handle is flushed or closed.
+    """
+    def __init__(self, fs, node, mode, chunk_size=None):
+        self.fs = fs
+        self.node = node
+        self.inode = node["inode"]
+        self.name = node["name"]
+        self.mode = mode
+        self.block_size = fs.storage.block_size
+        self.chunk_size = chunk_size or self.block_size * 16
+        self.size = node["size"]
+        self.pos = 0
+        self._next_read = 0  # Where a sequential read would start
+        self.closed = False
+        self._dirty = False
+        
+        if self.writable() and "content" in node:
+            # Move text kept in the metadata by older versions into the blocks
+            self._make_exclusive()
+            legacy = node["content"].encode('utf-8')[:self.capacity]
+            fs.storage.clear_data(self.allocation)
+            fs.storage.write_data(self.allocation, legacy)
+            self.size = len(legacy)
+            self._dirty = True
+        if 'w' in mode:
+            self.size = 0
+            self._dirty = True
+        if 'a' in mode:
+            self.pos = self.size
+            
+    @property
+    def allocation(self):
+        # Read from the node each time; compaction may move the file while it is open
+        return self.node["allocation"]
+        
+    @property
+    def capacity(self):
+        """Bytes the allocation can hold"""
+        return allocation_blocks(self.node["allocation"]) * self.block_size
+        
+    def readable(self):
+        return 'r' in self.mode or '+' in self.mode
+        
+    def writable(self):
+        return 'w' in self.mode or 'a' in self.mode or '+' in self.mode
+        
+    def seekable(self):
+        return True
+        
+    def _check_open(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+            
+    def _refresh(self):
+        """
+        Find the file again by inode ID before I/O, so a rename or move is
+        followed and a deleted file (whose blocks may belong to another
+        file by now) raises OSError. Call with the storage lock held: a
+        delete frees the FAT entry under it before the node goes away.
+        """
+        node = self.fs.get_node_by_inode(self.inode)
+        if node is None or self.inode not in self.fs.storage.file_allocation_table:
+            raise OSError(f"File was deleted: '{self.name}'")
+        self.node = node
+        self.name = node["name"]
+            
+    def _view(self, n):
+        """View of up to n bytes at the position (all remaining bytes if n is negative)"""
+        if "content" in self.node and not self._dirty:
+            data = memoryview(self.node["content"].encode('utf-8'))
+            size = len(data)
+        else:
+            data = None
+            size = self.size
+        end = size if n is None or n < 0 else min(size, self.pos + n)
+        if end <= self.pos:
+            return memoryview(b'')
+        if data is not None:
+            return data[self.pos:end]
+        return self.fs.storage.read_range(self.allocation, self.pos, end - self.pos)
+        
+    def _make_exclusive(self):
+        """Copy shared (copy-on-write) blocks before they are first written"""
+        if not self.fs._make_exclusive(self.node):
+            raise OSError("Not enough space to copy shared blocks")
+            
+    def read(self, n=-1):
+        """Read up to n bytes (all remaining bytes if n is negative)"""
+        with self.fs._namespace.read_locked(), self.fs.storage.lock:
+            self._check_open()
+            if not self.readable():
+                raise OSError("File not open for reading")
+            self._refresh()
+            sequential = self.pos == self._next_read
+            chunk = bytes(self._view(n))
+            self.pos += len(chunk)
+            self._readahead(sequential)
+            return chunk
+        
+    def readinto(self, buffer):
+        """Read into a writable buffer; returns the number of bytes read"""
+        with self.fs._namespace.read_locked(), self.fs.storage.lock:
+            self._check_open()
+            if not self.readable():
+                raise OSError("File not open for reading")
+            self._refresh()
+            target = memoryview(buffer).cast('B')
+            data = self._view(len(target))
+            count = len(data)
+            sequential = self.pos == self._next_read
+            target[:count] = data
+            self.pos += count
+            self._readahead(sequential)
+            return count
+        
+    def _readahead(self, sequential):
+        """After a sequential read, have the next chunk of the file loaded into the block cache"""
+        self._next_read = self.pos
+        if sequential and self.pos < self.size:
+            self.fs.storage.readahead(self.allocation, self.pos, min(self.chunk_size, self.size - self.pos))
+        
+    def write(self, data):
+        """Write bytes at the current position; returns the number written"""
+        with self.fs._mutating(), self.fs._namespace.read_locked(), self.fs.storage.lock:
+            self._check_open()
+            if not self.writable():
+                raise OSError("File not open for writing")
+            self._refresh()
+            if 'a' in self.mode:
+                self.pos = self.size
+            self._make_exclusive()
+            if self.pos + len(data) > self.capacity and not self.fs._grow_allocation(self.node, self.pos + len(data)):
+                raise OSError("Not enough space in file allocation")
+            if self.pos > self.size:
+                # Writing past the end leaves a hole; make sure it reads as zeros
+                self.fs.storage.write_data(self.allocation, bytes(self.pos - self.size), self.size)
+            self.fs.storage.write_data(self.allocation, data, self.pos)
+            self.pos += len(data)
+            self.size = max(self.size, self.pos)
+            self._dirty = True
+            return len(data)
+        
+    def seek(self, offset, whence=os.SEEK_SET):
+        """Move the position like io.IOBase.seek and return it"""
+        self._check_open()
+        if whence == os.SEEK_SET:
+            pos = offset
+        elif whence == os.SEEK_CUR:
+            pos = self.pos + offset
+        elif whence == os.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}")
+        self.pos = pos
+        return self.pos
+        
+    def tell(self):
+        return self.pos
+        
+    def flush(self):
+        """Journal the new size of the file if it was written"""
+        with self.fs._mutating(), self.fs._namespace.read_locked():
+            if self._dirty and not self.closed:
+                self.fs._commit_file_size(self.inode, self.size)
+                self._dirty = False
+            
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self.closed = True
+            
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+            
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
\ No newline at end of file
@@ -1,44 +1,654 @@
 import os
+import re
 import json
+import heapq
+import fnmatch
+import threading
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
 from storage_manager import StorageManager
+from journal import Journal
+from file_handle import FileHandle
+from path_cache import PathCache
+from inode_table import InodeTable
+from locking import RWLock, DirectoryLocks
+from name_index import NameIndex, TreeNames
+from extent_index import allocation_runs, allocation_blocks
+import binary_format
 
+# Sort orders for list_directory; ties are broken by name so every entry has a unique key
+SORT_KEYS = {
+    'name': lambda name, node: name,
+    'size': lambda name, node: (node.get("size", 0), name),
+    'modified': lambda name, node: (node.get("modified", ""), name)
+}
+
+def compile_glob(pattern):
+    """
+    Compile a shell-style name pattern ('*.log', 'report_??', 'a[0-9]*')
+    once for matching many names. Returns (literal, regex): literal is the
+    part before the first wildcard, which the name index can look up
+    directly, and regex is None when the pattern has no wildcards at all.
+    """
+    wildcard = re.search(r"[*?[]", pattern)
+    if wildcard is None:
+        return pattern, None
+    return pattern[:wildcard.start()], re.compile(fnmatch.translate(pattern))
+    
+def has_wildcards(pattern):
+    """Whether a name or path has any of the glob characters * ? ["""
+    return re.search(r"[*?[]", pattern) is not None
+    
+class BatchError(Exception):
+    """An operation inside a batch failed; the whole batch was rolled back"""
+    pass
+    
+class Batch:
+    """
+    Context manager returned by FileSystem.batch().
+    Operations called through it raise BatchError when they report failure,
+    which rolls back everything done in the batch.
+    """
+    def __init__(self, fs):
+        self.fs = fs
+        
+    def __enter__(self):
+        self.fs._begin_batch()
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.fs._end_batch(failed=exc_type is not None)
+        return False
+        
+    def __getattr__(self, name):
+        attr = getattr(self.fs, name)
+        if not callable(attr):
+            return attr
+            
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if isinstance(result, tuple) and len(result) == 2 and result[0] is False:
+                raise BatchError(f"{name}: {result[1]}")
+            return result
+        return call
+        
 class FileSystem:
-    def __init__(self, storage_file='filesystem.json'):
+    def __init__(self, storage_file='filesystem.json', journal_file='filesystem.journal', checkpoint_interval=1000, metadata_format=None, path_cache_size=4096, verify_aggregates=False, allocation_mode='contiguous', max_extents=8, cache_size=256*1024, cache_policy='lru', sorted_index=True):
         self.storage_file = storage_file
-        self.storage = StorageManager()
+        self.binary_file = os.path.splitext(storage_file)[0] + '.bin'
+        # 'json' or 'binary'; by default use binary only if a binary file already exists
+        self.metadata_format = metadata_format or ('binary' if os.path.exists(self.binary_file) else 'json')
+        # allocation_mode='extents' lets files grow into up to max_extents separate runs
+        # cache_size bytes of file blocks are kept in a write-back cache ('lru' or 'clock' eviction)
+        self.storage = StorageManager(
+            metadata_format=self.metadata_format, allocation_mode=allocation_mode, max_extents=max_extents,
+            cache_size=cache_size, cache_policy=cache_policy
+        )
+        self.storage.autosave = False  # Changes go through the journal instead
+        self.journal = Journal(journal_file)
+        self.checkpoint_interval = checkpoint_interval  # Records between full snapshots
+        self.checkpoint_seq = 0
+        self._batch_depth = 0
+        self._batch_records = None  # Records held back until the batch commits
+        self._undo = None  # Tree undo actions while a batch is open
+        self._tree_reader = None  # Memory map behind lazily decoded directories
+        self.path_cache = PathCache(path_cache_size)  # Resolved paths for get_node_at_path
+        self.inodes = InodeTable()  # Inode ID -> node; the FAT is keyed by the same IDs
+        self.name_index = NameIndex() if sorted_index else None  # Sorted child names for listings and completion
+        self.tree_names = TreeNames() if sorted_index else None  # Every name in the tree -> inode IDs, for find
+        self.verify_aggregates = verify_aggregates  # Cross-check directory sizes after every change
+        # Operations inside one directory hold the namespace lock shared plus that directory's lock;
+        # ones that move or remove whole subtrees (and batches) hold the namespace lock exclusively
+        self._namespace = RWLock()
+        self._dir_locks = DirectoryLocks()
+        self._commit_lock = threading.RLock()  # Keeps journal order and tree changes in step
+        # Held shared by an operation from its first allocator call until its record is journaled,
+        # and exclusively by checkpoints, so a snapshot never holds half an operation. Always taken
+        # before the namespace lock
+        self._checkpoint_gate = RWLock()
         self.load_filesystem()
         
     def load_filesystem(self):
-        """Load filesystem metadata"""
-        if os.path.exists(self.storage_file):
+        """Load filesystem metadata and replay the journal on top of it"""
+        if self.metadata_format == 'binary' and os.path.exists(self.binary_file):
+            # Only the root is decoded now; directories decode on first access
+            self._tree_reader = binary_format.TreeReader(self.binary_file)
+            self.root = self._tree_reader.root
+            self.current_dir = self._tree_reader.current_dir
+            self.checkpoint_seq = self._tree_reader.checkpoint_seq
+            if "inode" in self.root:
+                # Other nodes are indexed as they are needed, see get_node_by_inode
+                self.inodes.next_id = self._tree_reader.next_inode
+                self.inodes.add(self.root)
+            if "file_count" not in self.root:
+                self.rebuild_aggregates()  # Tree from before directory aggregates
+            self._replay_journal()
+        elif os.path.exists(self.storage_file):
+            # JSON file, also the import path when switching to binary
             with open(self.storage_file, 'r') as f:
                 data = json.load(f)
                 self.root = data['root']
                 self.current_dir = data.get('current_dir', '/')
+                self.checkpoint_seq = data.get('checkpoint_seq', 0)
+            if "inode" in self.root:
+                self.inodes.index_tree(self.root)
+                self.inodes.next_id = max(self.inodes.next_id, data.get('next_inode', 0))
+            if "file_count" not in self.root:
+                self.rebuild_aggregates()  # Tree from before directory aggregates
+            self._replay_journal()
         else:
             self._initialize_filesystem()
             
+        if "inode" not in self.root or any(isinstance(key, str) for key in self.storage.file_allocation_table):
+            self._migrate_to_inodes()  # Also writes both snapshots
+        elif self.metadata_format == 'binary' and not os.path.exists(self.binary_file):
+            self.checkpoint()  # Migrate filesystem.json to the binary format
+            
+    def _migrate_to_inodes(self):
+        """Give nodes of an older filesystem inode IDs and rebuild the path-keyed FAT from the tree"""
+        self._materialize_tree()
+        self.root.setdefault("inode", InodeTable.ROOT_ID)
+        allocations = {}
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if "inode" not in node:
+                node["inode"] = self.inodes.new_id()
+            if node["type"] == "directory":
+                stack.extend(node["content"].values())
+            elif node.get("allocation"):
+                allocations[node["inode"]] = node["allocation"]
+        self.inodes.index_tree(self.root)
+        # Allocations are rebuilt from the tree, which also frees blocks
+        # leaked by renaming directories under the old path-keyed FAT
+        self.storage.reset_allocations(allocations)
+        self.checkpoint()
+        
+    def _replay_journal(self):
+        """Redo committed journal records newer than the saved snapshots"""
+        records = [
+            record for record in self.journal.read()
+            if record['seq'] > min(self.checkpoint_seq, self.storage.checkpoint_seq)
+        ]
+        for record in records:
+            # Each snapshot may be at a different seq if a checkpoint was interrupted
+            self._replay_record(
+                record,
+                record['seq'] > self.storage.checkpoint_seq,
+                record['seq'] > self.checkpoint_seq
+            )
+        if records:
+            self.storage.rebuild_indexes()
+        self.journal.open(max(self.checkpoint_seq, self.storage.checkpoint_seq), records)
+        
+    def _replay_record(self, record, redo_storage, redo_tree):
+        """Redo the storage and/or tree part of one record"""
+        if record['op'] == 'batch':
+            for sub_record in record['records']:
+                self._replay_record(sub_record, redo_storage, redo_tree)
+            return
+        if redo_storage and record.get('fat'):
+            self.storage.restore_allocations(record['fat'])
+        if redo_tree:
+            if record['op'] in ('mkdir', 'create') and 'inode' not in record:
+                record['inode'] = self.inodes.new_id()  # Record from before inode IDs
+            self._apply(record)
+            
+    def _commit(self, record):
+        """Journal a mutation and apply its metadata change to the tree"""
+        with self._commit_lock:
+            if self._batch_records is not None:
+                self._batch_records.append(record)
+                self._apply(record)
+                return
+            self.journal.append(record)
+            self._apply(record)
+        self._checkpoint_if_due()
+        
+    def _checkpoint_if_due(self):
+        """Checkpoint once enough records are pending, unless this thread is inside an operation (it checks again when done)"""
+        if self.journal.pending >= self.checkpoint_interval and not self._checkpoint_gate.held():
+            self.checkpoint()
+            
+    @contextmanager
+    def _mutating(self):
+        """Hold off checkpoints while an operation changes storage and journals it"""
+        with self._checkpoint_gate.read_locked():
+            yield
+        self._checkpoint_if_due()
+            
+    def batch(self):
+        """
+        Group operations so they are journaled as a single record at the end.
+        If the block raises (including BatchError from a failed operation
+        called through the batch object), the tree, bitmap and FAT are rolled
+        back. Nested batches join the outermost one.
+        
+            with fs.batch() as tx:
+                tx.create_directory("logs")
+                tx.create_file("a.log", 4096, "/logs")
+        """
+        return Batch(self)
+        
+    def _begin_batch(self):
+        self._checkpoint_gate.acquire_read()
+        self._namespace.acquire_write()  # Other threads wait until the batch commits or rolls back
+        self._batch_depth += 1
+        if self._batch_depth == 1:
+            self._batch_records = []
+            self._undo = []
+            self.storage.begin_undo()
+            
+    def _end_batch(self, failed):
+        try:
+            self._batch_depth -= 1
+            if self._batch_depth:
+                return
+            records, undo = self._batch_records, self._undo
+            self._batch_records = None
+            self._undo = None
+            
+            if failed:
+                for action in reversed(undo):
+                    action()
+                self.storage.rollback()
+                self.path_cache.clear()
+                if self.name_index is not None:
+                    self.name_index.clear()  # Rebuilt on demand
+                    self.tree_names.clear()
+                return
+                
+            self.storage.end_undo()
+            if records:
+                self.journal.append({'op': 'batch', 'records': records})
+        finally:
+            self._namespace.release_write()
+            self._checkpoint_gate.release_read()
+        self._checkpoint_if_due()
+            
+            
+    def _apply(self, record):
+        """Apply the tree part of a journal record (shared by live ops and replay)"""
+        op = record['op']
+        undo = self._undo
+        if op == 'cd':
+            if undo is not None:
+                old_dir = self.current_dir
+                undo.append(lambda: setattr(self, 'current_dir', old_dir))
+            self.current_dir = record['path']
+            return
+        if op == 'relocate':
+            # Files moved by compaction or copy-on-write, or grown by a FileHandle; later entries for the same inode win
+            for inode, allocation in record['fat']:
+                node = self.get_node_by_inode(inode)
+                if node is not None:
+                    if undo is not None:
+                        undo.append(lambda node=node, old=node["allocation"]: node.__setitem__("allocation", old))
+                    node["allocation"] = allocation
+            return
+            
+        parent = self.get_node_at_path(record['parent'])
+        now = record['time']
+        content = parent["content"]
+        index = self.name_index
+        tree_names = self.tree_names
+        
+        # Cache only holds existing paths, so only removals and renames invalidate
+        parent_key = PathCache.normalize(record['parent'])
+        if op == 'unlink':
+            self.path_cache.invalidate(PathCache.normalize(parent_key + "/" + record['name']))
+        elif op == 'rmdir':
+            self.path_cache.invalidate_tree(PathCache.normalize(parent_key + "/" + record['name']))
+        elif op == 'rename':
+            self.path_cache.invalidate_tree(PathCache.normalize(parent_key + "/" + record['old']))
+        elif op == 'move':
+            self.path_cache.invalidate_tree(PathCache.normalize(parent_key + "/" + record['name']))
+        if undo is not None:
+            old_modified = parent["modified"]
+            undo.append(lambda: parent.__setitem__("modified", old_modified))
+            
+        if op == 'mkdir':
+            content[record['name']] = {
+                "inode": record['inode'],
+                "name": record['name'],
+                "type": "directory",
+                "content": {},
+                "created": now,
+                "modified": now,
+                "size": 0,  # Total bytes of all files below, kept up to date incrementally
+                "file_count": 0
+            }
+            self.inodes.add(content[record['name']], parent)
+            if index is not None:
+                index.add(parent, record['name'], content[record['name']])
+                tree_names.add(record['name'], record['inode'])
+        elif op == 'create':
+            content[record['name']] = {
+                "inode": record['inode'],
+                "name": record['name'],
+                "type": "file",
+                "size": record['size'],
+                "created": now,
+                "modified": now,
+                "allocation": record['allocation']
+            }
+            self.inodes.add(content[record['name']], parent)
+            if index is not None:
+                index.add(parent, record['name'], content[record['name']])
+                tree_names.add(record['name'], record['inode'])
+            self._update_aggregates(parent_key, record['size'], 1)
+        elif op in ('write', 'resize'):
+            node = content[record['name']]
+            old_size, old_node_modified, old_allocation = node["size"], node["modified"], node["allocation"]
+            node["size"] = record['size']
+            node["modified"] = now
+            if op == 'resize':
+                node["allocation"] = record['allocation']
+            node.pop("content", None)  # Data now lives in the disk image
+            self._update_aggregates(parent_key, record['size'] - old_size, 0)
+            if undo is not None:
+                undo.append(lambda: node.update(size=old_size, modified=old_node_modified, allocation=old_allocation))
+        elif op in ('unlink', 'rmdir'):
+            node = content.pop(record['name'])
+            self.inodes.remove_tree(node)
+            if index is not None:
+                index.remove(parent, record['name'])
+                index.drop_tree(node)
+                tree_names.remove_tree(node)
+            if op == 'unlink':
+                self._update_aggregates(parent_key, -node["size"], -1)
+            else:
+                self._update_aggregates(parent_key, -node["size"], -node["file_count"])
+            if undo is not None:
+                def undo_remove():
+                    content[record['name']] = node
+                    self.inodes.add_tree(node, parent)
+                undo.append(undo_remove)
+        elif op == 'rename':
+            node = content.pop(record['old'])
+            node_modified = node["modified"]
+            node["name"] = record['new']
+            node["modified"] = now
+            content[record['new']] = node
+            if index is not None:
+                index.remove(parent, record['old'])
+                index.add(parent, record['new'], node)
+                tree_names.remove(record['old'], node.get("inode"))
+                tree_names.add(record['new'], node.get("inode"))
+            if undo is not None:
+                def undo_rename():
+                    content[record['old']] = content.pop(record['new'])
+                    node["name"] = record['old']
+                    node["modified"] = node_modified
+                undo.append(undo_rename)
+        elif op in ('move', 'copy'):
+            dest = self.get_node_at_path(record['dest'])
+            dest_modified = dest["modified"]
+            if op == 'move':
+                node = content.pop(record['name'])
+                if index is not None:
+                    index.remove(parent, record['name'])
+                    tree_names.remove(record['name'], node.get("inode"))
+                node["name"] = record['new']
+                self.inodes.add(node, dest)
+                self._update_aggregates(parent_key, -node["size"], -node.get("file_count", 1))
+            else:
+                node = self._clone_tree(content[record['name']], dict(record['inodes']), record['new'], now)
+                self.inodes.add_tree(node, dest)
+            dest["content"][record['new']] = node
+            if index is not None:
+                index.add(dest, record['new'], node)
+                if op == 'move':
+                    tree_names.add(record['new'], node.get("inode"))
+                else:
+                    tree_names.add_tree(node)
+            dest["modified"] = now
+            self._update_aggregates(PathCache.normalize(record['dest']), node["size"], node.get("file_count", 1))
+            if undo is not None:
+                def undo_link():
+                    dest["content"].pop(record['new'])
+                    dest["modified"] = dest_modified
+                    if op == 'move':
+                        node["name"] = record['name']
+                        content[record['name']] = node
+                        self.inodes.add(node, parent)
+                    else:
+                        self.inodes.remove_tree(node)
+                undo.append(undo_link)
+                
+        if op in ('mkdir', 'create') and undo is not None:
+            undo.append(lambda: self.inodes.remove(content.pop(record['name'])["inode"]))
+        if op != 'copy':
+            parent["modified"] = now
+        if self.verify_aggregates:
+            mismatches = self.check_aggregates()
+            if mismatches:
+                raise RuntimeError(f"Directory aggregates out of date after '{op}': {mismatches}")
+                
+    def _clone_tree(self, source, inode_map, name, now):
+        """
+        Copy of a node and everything below it, with new inode IDs from
+        inode_map. Files keep the same allocation, which the storage shares
+        copy-on-write; only the metadata is copied.
+        """
+        def clone(node):
+            is_dir = node["type"] == "directory"
+            copy = {key: value for key, value in node.items() if not (is_dir and key == "content")}
+            copy["inode"] = inode_map[node["inode"]]
+            copy["created"] = copy["modified"] = now
+            if copy.get("allocation"):
+                copy["allocation"] = list(copy["allocation"])
+            if is_dir:
+                copy["content"] = {}
+            return copy
+            
+        root_copy = clone(source)
+        root_copy["name"] = name
+        stack = [(source, root_copy)]
+        while stack:
+            original, copy = stack.pop()
+            if original["type"] == "directory":
+                for child_name, child in original["content"].items():
+                    child_copy = clone(child)
+                    copy["content"][child_name] = child_copy
+                    stack.append((child, child_copy))
+        return root_copy
+        
+    def _update_aggregates(self, dir_path, size_delta, count_delta):
+        """Add to the size and file count of a directory and each of its ancestors"""
+        node = self.root
+        ancestors = [node]
+        for part in dir_path.split('/'):
+            if part:
+                node = node["content"][part]
+                ancestors.append(node)
+        for node in ancestors:
+            node["size"] += size_delta
+            node["file_count"] += count_delta
+        if self._undo is not None:
+            self._undo.append(lambda: self._update_aggregates(dir_path, -size_delta, -count_delta))
+            
+    def _walk_aggregates(self, visit):
+        """
+        Compute the size and file count of every directory bottom-up and call
+        visit(path, node, size, file_count) for each. Iterative, so deep
+        trees do not hit the recursion limit.
+        """
+        totals = {}
+        stack = [("/", self.root, False)]
+        while stack:
+            path, node, children_done = stack.pop()
+            if not children_done:
+                stack.append((path, node, True))
+                for name, child in node["content"].items():
+                    if child["type"] == "directory":
+                        stack.append((path.rstrip("/") + "/" + name, child, False))
+                continue
+            size = file_count = 0
+            for child in node["content"].values():
+                if child["type"] == "directory":
+                    child_size, child_count = totals.pop(id(child))
+                else:
+                    child_size, child_count = child.get("size", 0), 1
+                size += child_size
+                file_count += child_count
+            totals[id(node)] = (size, file_count)
+            visit(path, node, size, file_count)
+            
+    def rebuild_aggregates(self):
+        """Recompute the cached size and file count of every directory"""
+        def store(path, node, size, file_count):
+            node["size"] = size
+            node["file_count"] = file_count
+        self._walk_aggregates(store)
+        
+    def check_aggregates(self):
+        """
+        Verify the cached directory aggregates against a full recompute.
+        Returns a list of (path, (cached size, cached count), (size, count))
+        for every directory that disagrees; empty when all are correct.
+        """
+        mismatches = []
+        def compare(path, node, size, file_count):
+            cached = (node.get("size"), node.get("file_count"))
+            if cached != (size, file_count):
+                mismatches.append((path, cached, (size, file_count)))
+        self._walk_aggregates(compare)
+        return mismatches
+        
+    def get_directory_size(self, path=None):
+        """(total bytes, file count) of everything below a directory, or None"""
+        node = self.get_node_at_path(path)
+        if not node or node["type"] != "directory":
+            return None
+        return node["size"], node["file_count"]
+        
+    def compact(self, time_budget=None, max_blocks=None):
+        """
+        Defragment the disk (see StorageManager.compact) and journal the new
+        allocations of the moved files. Pass time_budget (seconds) to run in
+        slices; returns the storage report, whose 'done' says if more remains.
+        """
+        with self._mutating(), self._namespace.write_locked():
+            if self._batch_records is not None:
+                raise RuntimeError("Cannot compact inside a batch: moved data cannot be rolled back")
+            report = self.storage.compact(time_budget, max_blocks)
+            if report['moves']:
+                self._commit({
+                    'op': 'relocate',
+                    'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    'fat': [[file_id, list(new)] for file_id, old, new in report['moves']]
+                })
+            return report
+        
+    def checkpoint(self):
+        """Write full snapshots of both metadata files and truncate the journal"""
+        with self._checkpoint_gate.write_locked(), self._commit_lock:
+            self.storage.sync()
+            seq = self.journal.last_seq
+            self.storage.checkpoint_seq = seq
+            self.storage.save_storage()
+            self.checkpoint_seq = seq
+            self.save_filesystem()
+            self.journal.reset()
+        
+    def close(self):
+        """Compact the journal into the snapshots and release the journal file"""
+        self.checkpoint()
+        self.journal.close()
+        self.storage.close()
+        
     def _initialize_filesystem(self):
         """Initialize a new filesystem"""
         self.root = {
+            "inode": InodeTable.ROOT_ID,
             "name": "/",
             "type": "directory",
             "content": {},
             "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "modified": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "modified": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "size": 0,
+            "file_count": 0
         }
         self.current_dir = "/"
+        self.inodes.index_tree(self.root)
+        self.checkpoint_seq = self.storage.checkpoint_seq
         self.save_filesystem()
+        self.journal.open(self.checkpoint_seq)  # Discards a journal left from an older filesystem
         
     def save_filesystem(self):
         """Save filesystem metadata"""
+        self._materialize_tree()
+        if self.metadata_format == 'binary':
+            binary_format.write_tree(self.binary_file, self.root, self.current_dir, self.checkpoint_seq, self.inodes.next_id)
+        else:
+            self._write_json(self.storage_file, self.checkpoint_seq)
+            
+    def _write_json(self, json_file, checkpoint_seq):
         data = {
             'root': self.root,
-            'current_dir': self.current_dir
+            'current_dir': self.current_dir,
+            'checkpoint_seq': checkpoint_seq,
+            'next_inode': self.inodes.next_id
         }
-        with open(self.storage_file, 'w') as f:
+        # Write a temp file and swap it in so a crash never leaves a torn file
+        tmp_file = json_file + '.tmp'
+        with open(tmp_file, 'w') as f:
             json.dump(data, f, indent=2)
+        os.replace(tmp_file, json_file)
+        
+    def _materialize_tree(self):
+        """Decode all lazy directories and release the memory-mapped tree file"""
+        if self._tree_reader:
+            binary_format.materialize(self.root)
+            self._tree_reader.close()
+            self._tree_reader = None
+            
+    @contextmanager
+    def _locked(self, path, write=False):
+        """
+        Locks for an operation inside the directory at path (None for the
+        current one): the namespace lock shared, so the directory cannot be
+        removed or moved meanwhile, and the directory's own lock, exclusive
+        for changes and shared for reads. Changes also hold off checkpoints.
+        """
+        with (self._mutating() if write else nullcontext()), self._namespace.read_locked():
+            node = self.get_node_at_path(path)
+            if node is None or node["type"] != "directory":
+                yield  # The operation reports the missing directory itself
+                return
+            lock = self._dir_locks.get(node["inode"])
+            with (lock.write_locked() if write else lock.read_locked()):
+                yield
+                
+    def get_node_by_inode(self, inode):
+        """Node with the given inode ID, or None if it no longer exists"""
+        node = self.inodes.get(inode)
+        if node is None and not self.inodes.complete:
+            self._index_all()
+            node = self.inodes.get(inode)
+        return node
+        
+    def get_path_by_inode(self, inode):
+        """Current absolute path of the node with the given inode ID, or None if it no longer exists"""
+        path = self.inodes.path(inode)
+        if path is None and not self.inodes.complete:
+            self._index_all()
+            path = self.inodes.path(inode)
+        return path
+        
+    def _index_all(self):
+        # Lazily loaded tree: index everything once, then lookups are direct
+        self._materialize_tree()
+        self.inodes.index_tree(self.root)
+        
+    def export_json(self, filesystem_json='filesystem.json', storage_json='storage.json'):
+        """Export the current state of both metadata files as JSON"""
+        with self._checkpoint_gate.write_locked(), self._commit_lock:
+            self._materialize_tree()
+            self._write_json(filesystem_json, self.journal.last_seq)
+            self.storage.checkpoint_seq = self.journal.last_seq
+            self.storage.export_json(storage_json)
             
     def get_node_at_path(self, path=None):
         """Get node at specified path (default to current directory)"""
@@ -51,6 +661,14 @@ class FileSystem:
         if path == "/":
             return self.root
             
+        # Hot paths (like the current directory) come straight from the cache
+        cacheable = path.startswith("/")
+        if cacheable:
+            cached = self.path_cache.get(path)
+            if cached is not None:
+                return cached
+            generation = self.path_cache.generation  # A removal during the walk must not be cached
+            
         parts = path.split('/')[1:]  # Remove empty first element
         current = self.root
         
@@ -58,219 +676,709 @@ class FileSystem:
             if not part:  # Skip empty parts (happens with '//' in path)
                 continue
                 
-            if part not in current["content"]:
+            if current["type"] != "directory":
                 return None
-            current = current["content"][part]
-            
+            current = current["content"].get(part)  # One lookup, in case another thread removes the entry
+            if current is None:
+                return None
+                
+        if cacheable:
+            self.path_cache.put(PathCache.normalize(path), current, generation)
         return current
         
     def create_directory(self, dir_name, parent_path=None):
         """Create a new directory"""
-        parent = self.get_node_at_path(parent_path) if parent_path else self.get_node_at_path()
-        if not parent:
-            return False, "Parent directory not found"
+        if not self.is_valid_name(dir_name):
+            return False, "Invalid name"
+        with self._locked(parent_path, write=True):
+            parent = self.get_node_at_path(parent_path) if parent_path else self.get_node_at_path()
+            if not parent:
+                return False, "Parent directory not found"
+                
+            if dir_name in parent["content"]:
+                return False, "Directory already exists"
+                
+            self._commit({
+                'op': 'mkdir',
+                'parent': parent_path or self.current_dir,
+                'name': dir_name,
+                'inode': self.inodes.new_id(),
+                'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+            return True, "Directory created"
+        
+    def create_file(self, file_name, size=1024, parent_path=None, data=None):
+        """
+        Create a new file with contiguous allocation (data sets the size and
+        initial bytes). In extent mode a file that fits in no single free
+        run is split over several.
+        """
+        if not self.is_valid_name(file_name):
+            return False, "Invalid name"
+        with self._locked(parent_path, write=True):
+            if data is not None:
+                size = len(data)
+            parent = self.get_node_at_path(parent_path) if parent_path else self.get_node_at_path()
+            if not parent:
+                return False, "Parent directory not found"
+                
+            if file_name in parent["content"]:
+                return False, "File already exists"
             
-        if dir_name in parent["content"]:
-            return False, "Directory already exists"
+            if parent_path:
+                # Normalize path with forward slashes
+                parent_path = parent_path.replace("\\", "/")
+                
+            # Allocate storage space under a new inode ID
+            inode = self.inodes.new_id()
+            allocation = self.storage.allocate_file(inode, size)
+            if not allocation:
+                if self.storage.allocation_mode == 'extents':
+                    return False, "Not enough space"
+                return False, "Not enough contiguous space"
+                
+            # Write the initial bytes into the blocks; the rest of the allocation is zeroed
+            # (free, unless its blocks were written since they were last zeroed)
+            if data is None:
+                data = f"Content of {file_name}".encode('utf-8')[:size]
+            self.storage.write_data(allocation, data)
+            self.storage.clear_data(allocation, len(data))
             
-        parent["content"][dir_name] = {
-            "name": dir_name,
-            "type": "directory",
-            "content": {},
-            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "modified": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        parent["modified"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.save_filesystem()
-        return True, "Directory created"
-        
-    def create_file(self, file_name, size=1024, parent_path=None):
-        """Create a new file with contiguous allocation"""
-        parent = self.get_node_at_path(parent_path) if parent_path else self.get_node_at_path()
-        if not parent:
-            return False, "Parent directory not found"
-            
-        if file_name in parent["content"]:
-            return False, "File already exists"
-        
-        # Construct the file path with forward slashes
-        if parent_path:
-            parent_path = parent_path.replace("\\", "/")
-            file_path = parent_path
-            if not file_path.endswith("/"):
-                file_path += "/"
-            file_path += file_name
-        else:
-            file_path = self.current_dir
-            if not file_path.endswith("/"):
-                file_path += "/"
-            file_path += file_name
-            
-        # Allocate storage space
-        allocation = self.storage.allocate_file(file_path, size)
-        if not allocation:
-            return False, "Not enough contiguous space"
-            
-        parent["content"][file_name] = {
-            "name": file_name,
-            "type": "file",
-            "size": size,
-            "content": f"Content of {file_name}",
-            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "modified": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "allocation": allocation
-        }
-        parent["modified"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.save_filesystem()
-        return True, "File created"
+            self._commit({
+                'op': 'create',
+                'parent': parent_path or self.current_dir,
+                'name': file_name,
+                'inode': inode,
+                'size': size,
+                'allocation': allocation,
+                'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'fat': [[inode, allocation]]
+            })
+            return True, "File created"
         
     def delete_file(self, file_name, parent_path=None):
         """Delete a file and deallocate its space"""
-        parent = self.get_node_at_path(parent_path) if parent_path else self.get_node_at_path()
-        if not parent or file_name not in parent["content"]:
-            return False, "File not found"
-            
-        if parent["content"][file_name]["type"] != "file":
-            return False, "Not a file"
-        
-        # Construct the file path with forward slashes
-        if parent_path:
-            parent_path = parent_path.replace("\\", "/")
-            file_path = parent_path
-            if not file_path.endswith("/"):
-                file_path += "/"
-            file_path += file_name
-        else:
-            file_path = self.current_dir
-            if not file_path.endswith("/"):
-                file_path += "/"
-            file_path += file_name
-            
-        self.storage.deallocate_file(file_path)
-        del parent["content"][file_name]
-        parent["modified"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.save_filesystem()
-        return True, "File deleted"
+        with self._locked(parent_path, write=True):
+            parent = self.get_node_at_path(parent_path) if parent_path else self.get_node_at_path()
+            if not parent or file_name not in parent["content"]:
+                return False, "File not found"
+                
+            if parent["content"][file_name]["type"] != "file":
+                return False, "Not a file"
+            
+            if parent_path:
+                # Normalize path with forward slashes
+                parent_path = parent_path.replace("\\", "/")
+                
+            inode = parent["content"][file_name]["inode"]
+            self.storage.deallocate_file(inode)
+            self._commit({
+                'op': 'unlink',
+                'parent': parent_path or self.current_dir,
+                'name': file_name,
+                'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'fat': [[inode, None]]
+            })
+            return True, "File deleted"
         
     def show_allocation_info(self, file_name, parent_path=None):
         """Show allocation information for a file"""
-        parent = self.get_node_at_path(parent_path) if parent_path else self.get_node_at_path()
-        if not parent or file_name not in parent["content"]:
-            return None
-            
-        file_node = parent["content"][file_name]
-        if file_node["type"] != "file":
-            return None
-            
-        allocation = file_node.get("allocation")
-        if not allocation:
-            return None
-            
-        start_block, num_blocks = allocation
-        block_size = self.storage.block_size
-        return {
-            'file_name': file_name,
-            'start_block': start_block,
-            'num_blocks': num_blocks,
-            'start_byte': start_block * block_size,
-            'end_byte': (start_block + num_blocks) * block_size - 1,
-            'size_bytes': file_node["size"],
-            'block_size': block_size
-        }
+        with self._locked(parent_path):
+            parent = self.get_node_at_path(parent_path) if parent_path else self.get_node_at_path()
+            if not parent or file_name not in parent["content"]:
+                return None
+                
+            file_node = parent["content"][file_name]
+            if file_node["type"] != "file":
+                return None
+                
+            allocation = file_node.get("allocation")
+            if not allocation:
+                return None
+                
+            runs = allocation_runs(allocation)
+            start_block = runs[0][0]
+            last_start, last_length = runs[-1]
+            block_size = self.storage.block_size
+            return {
+                'file_name': file_name,
+                'start_block': start_block,
+                'num_blocks': allocation_blocks(allocation),
+                'extents': runs,  # (start_block, num_blocks) of each run, in file order
+                'start_byte': start_block * block_size,
+                'end_byte': (last_start + last_length) * block_size - 1,
+                'size_bytes': file_node["size"],
+                'block_size': block_size
+            }
         
     def change_directory(self, path):
         """Change current directory"""
         # Normalize path with forward slashes
-        path = path.replace("\\", "/")
-        
-        if path.startswith("/"):
-            new_path = path
-        else:
-            # Join path with forward slashes
-            if self.current_dir.endswith("/"):
-                new_path = self.current_dir + path
+        with self._namespace.read_locked():
+            path = path.replace("\\", "/")
+            
+            if path.startswith("/"):
+                new_path = path
             else:
-                new_path = self.current_dir + "/" + path
+                # Join path with forward slashes
+                if self.current_dir.endswith("/"):
+                    new_path = self.current_dir + path
+                else:
+                    new_path = self.current_dir + "/" + path
+                    
+            # Clean path from double slashes
+            while "//" in new_path:
+                new_path = new_path.replace("//", "/")
                 
-        # Clean path from double slashes
-        while "//" in new_path:
-            new_path = new_path.replace("//", "/")
-            
-        if self.get_node_at_path(new_path):
-            self.current_dir = new_path
-            self.save_filesystem()
-            return True, f"Changed directory to {new_path}"
-        return False, "Directory not found"
+            if self.get_node_at_path(new_path):
+                self._commit({'op': 'cd', 'path': new_path})
+                return True, f"Changed directory to {new_path}"
+            return False, "Directory not found"
         
     def get_directory_contents(self, path=None):
-        """Get contents of a directory"""
-        if path:
-            # Normalize path with forward slashes
-            path = path.replace("\\", "/")
+        """Get contents of a directory (a copy, safe to iterate while other threads change it)"""
+        with self._locked(path):
+            if path:
+                # Normalize path with forward slashes
+                path = path.replace("\\", "/")
+                
+            node = self.get_node_at_path(path) if path else self.get_node_at_path()
+            if not node or node["type"] != "directory":
+                return None
+                
+            return dict(node["content"])
             
-        node = self.get_node_at_path(path) if path else self.get_node_at_path()
-        if not node or node["type"] != "directory":
-            return None
+    def list_directory(self, path=None, sort='name', reverse=False, cursor=None, limit=100):
+        """
+        One page of a directory listing, sorted by 'name', 'size' or
+        'modified'. Returns (entries, cursor) with entries a list of
+        (name, node) pairs; pass cursor back to get the next page (it is None
+        after the last one). The cursor is the sort key of the last entry,
+        not a position, so paging stays consistent while entries are added
+        or removed. Returns (None, None) if path is not a directory.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort order: '{sort}'")
+        sort_key = SORT_KEYS[sort]
+        if isinstance(cursor, list):
+            cursor = tuple(cursor)  # Cursors that went through JSON
+        with self._locked(path):
+            if path:
+                # Normalize path with forward slashes
+                path = path.replace("\\", "/")
+                
+            node = self.get_node_at_path(path) if path else self.get_node_at_path()
+            if not node or node["type"] != "directory":
+                return None, None
+                
+            content = node["content"]
+            if sort == 'name' and self.name_index is not None:
+                # Straight from the sorted names: O(log n + limit)
+                names = self.name_index.page(node, cursor, limit + 1, reverse)
+                page = [(name, content[name]) for name in names]
+            else:
+                page = self._sorted_page(content, sort_key, reverse, cursor, limit)
+                
+        if len(page) <= limit:
+            return page, None
+        page = page[:limit]
+        return page, sort_key(*page[-1])
+        
+    def _sorted_page(self, content, sort_key, reverse, cursor, limit):
+        """The limit + 1 entries after cursor in sort order, without sorting the whole directory"""
+        items = content.items()
+        if cursor is not None:
+            if reverse:
+                items = (item for item in items if sort_key(*item) < cursor)
+            else:
+                items = (item for item in items if sort_key(*item) > cursor)
+        pick = heapq.nlargest if reverse else heapq.nsmallest
+        return pick(limit + 1, items, key=lambda item: sort_key(*item))
+        
+    def iter_directory(self, path=None, sort='name', reverse=False, page_size=1000):
+        """
+        Iterate (name, node) over a directory in sort order, one page at a
+        time, without holding the directory lock between pages
+        """
+        cursor = None
+        while True:
+            entries, cursor = self.list_directory(path, sort, reverse, cursor, page_size)
+            if entries is None:
+                return
+            yield from entries
+            if cursor is None:
+                return
+                
+    def complete(self, text, limit=100):
+        """
+        Paths that complete text (relative to the current directory unless
+        it starts with '/'), in name order, with '/' after directories
+        """
+        text = text.replace("\\", "/")
+        dir_part, _, prefix = text.rpartition("/")
+        if "/" in text:
+            dir_part += "/"
+        path = self._resolve_path(dir_part) if dir_part else self.current_dir
+        with self._locked(path):
+            node = self.get_node_at_path(path)
+            if not node or node["type"] != "directory":
+                return []
+            content = node["content"]
+            if self.name_index is not None:
+                names = self.name_index.prefix(node, prefix, limit)
+            else:
+                names = sorted(name for name in content if name.startswith(prefix))[:limit]
+            return [dir_part + name + ("/" if content[name]["type"] == "directory" else "") for name in names]
             
-        return node["content"]
+    def _match_names(self, node, glob):
+        """Names in a directory node matching a compiled glob, in name order"""
+        literal, regex = glob
+        content = node["content"]
+        if regex is None:
+            return [literal] if literal in content else []
+        if self.name_index is not None:
+            # Only names starting with the literal part are looked at
+            names = self.name_index.prefix(node, literal) if literal else self.name_index.sorted_names(node)
+        else:
+            names = sorted(name for name in content if name.startswith(literal))
+        return [name for name in names if regex.match(name)]
         
-    def get_file_content(self, file_name, parent_path=None):
-        """Get content of a file"""
-        if parent_path:
-            # Normalize path with forward slashes
-            parent_path = parent_path.replace("\\", "/")
+    def find(self, root=None, name_glob=None, type=None, min_size=None, modified_after=None):
+        """
+        Generate (path, node) for every entry below the directory root (the
+        current one by default) that matches all the given filters: a
+        shell-style pattern for the name, type 'file' or 'directory', a
+        minimum size in bytes and a modification time (datetime or
+        "YYYY-MM-DD[ HH:MM:SS]" string) the entry must be newer than.
+        Results come in name order, each directory before its subtree. A
+        name pattern starting with literal text ('report*', 'a.txt') is
+        looked up in the tree-wide name index. Otherwise directories are
+        visited one at a time without recursion, and subtrees that cannot
+        hold a match are skipped using the cached directory sizes and file
+        counts.
+        """
+        if type in ('f', 'd'):
+            type = 'file' if type == 'f' else 'directory'
+        if isinstance(modified_after, datetime):
+            modified_after = modified_after.strftime("%Y-%m-%d %H:%M:%S")
+        glob = compile_glob(name_glob) if name_glob else None
+        
+        def wanted(child):
+            return (
+                (type is None or child["type"] == type)
+                and (min_size is None or child.get("size", 0) >= min_size)
+                and (modified_after is None or child.get("modified", "") > modified_after)
+            )
             
-        parent = self.get_node_at_path(parent_path) if parent_path else self.get_node_at_path()
-        if not parent or file_name not in parent["content"]:
-            return None
+        start = self._resolve_path(root) if root else self.current_dir
+        if glob is not None and glob[0] and self.tree_names is not None:
+            yield from self._find_indexed(start, glob, wanted)
+            return
+        # (path, node, matches, descend) in reverse order of output, so each
+        # directory's subtree comes right after the directory itself
+        stack = [(start, None, False, True)]
+        while stack:
+            path, node, matches, descend = stack.pop()
+            if matches:
+                yield path, node
+            if not descend:
+                continue
+            # Lock one directory at a time, and never while the caller holds the generator
+            with self._locked(path):
+                node = self.get_node_at_path(path)
+                if not node or node["type"] != "directory":
+                    continue  # Removed since it was queued
+                content = node["content"]
+                if glob is not None:
+                    names = self._match_names(node, glob)
+                else:
+                    names = self.name_index.sorted_names(node) if self.name_index is not None else sorted(content)
+                if self.name_index is not None:
+                    subdirs = self.name_index.subdirectories(node)
+                else:
+                    subdirs = sorted(name for name, child in content.items() if child["type"] == "directory")
+                found = {name for name in names if wanted(content[name])}
+                below = set()
+                for name in subdirs:
+                    child = content[name]
+                    if type == 'file' and not child.get("file_count", 1):
+                        continue  # No files anywhere below
+                    if min_size is not None and child.get("size", 0) < min_size:
+                        continue  # Nothing below can be bigger than the whole subtree
+                    below.add(name)
+                prefix = path.rstrip("/") + "/"
+                for name in sorted(found | below, reverse=True):
+                    stack.append((prefix + name, content[name], name in found, name in below))
+                    
+    def _find_indexed(self, start, glob, wanted):
+        """find() for a name pattern with a literal prefix: candidates come from the tree-wide name index"""
+        literal, regex = glob
+        found = []
+        # Tree changes (and so index updates) happen under the commit lock
+        with self._namespace.read_locked(), self._commit_lock:
+            node = self.get_node_at_path(start)
+            if not node or node["type"] != "directory":
+                return
+            if not self.tree_names.built:
+                if not self.inodes.complete:
+                    self._index_all()
+                self.tree_names.build(
+                    (inode, node) for inode, node in self.inodes.nodes.items() if inode != InodeTable.ROOT_ID
+                )
+            if regex is None:
+                candidates = [self.tree_names.inodes.get(literal, ())]
+            else:
+                candidates = [inodes for name, inodes in self.tree_names.prefix(literal) if regex.match(name)]
+            prefix = start.rstrip("/") + "/"
+            for inodes in candidates:
+                for inode in inodes:
+                    path = self.inodes.path(inode)
+                    if path is not None and path.startswith(prefix):
+                        child = self.inodes.get(inode)
+                        if wanted(child):
+                            found.append((path, child))
+        # Sorting by path components gives the same order as walking the tree
+        found.sort(key=lambda item: item[0].split("/"))
+        yield from found
+                    
+    def glob(self, pattern):
+        """
+        Paths matching a shell-style pattern such as '*.log' or
+        'logs/2024-*/err?.txt', in name order. Wildcards match within one
+        path component; relative patterns give relative paths.
+        """
+        pattern = pattern.replace("\\", "/")
+        absolute = pattern.startswith("/")
+        parts = [part for part in pattern.split("/") if part]
+        paths = ["/" if absolute else ""]  # Matches so far, as the caller will see them
+        for depth, part in enumerate(parts):
+            last = depth == len(parts) - 1
+            glob = compile_glob(part)
+            matched = []
+            for prefix in paths:
+                path = self._resolve_path(prefix) if prefix else self.current_dir
+                with self._locked(path):
+                    node = self.get_node_at_path(path)
+                    if not node or node["type"] != "directory":
+                        continue
+                    for name in self._match_names(node, glob):
+                        if last or node["content"][name]["type"] == "directory":
+                            matched.append(prefix + name if last else prefix + name + "/")
+            paths = matched
+        return paths if parts else []
+        
+    def get_file_content(self, file_name, parent_path=None):
+        """
+        Get content of a file as bytes. They are copied while the directory
+        is locked, so a later write or delete cannot change them.
+        """
+        with self._locked(parent_path):
+            if parent_path:
+                # Normalize path with forward slashes
+                parent_path = parent_path.replace("\\", "/")
+                
+            parent = self.get_node_at_path(parent_path) if parent_path else self.get_node_at_path()
+            if not parent or file_name not in parent["content"]:
+                return None
+                
+            item = parent["content"][file_name]
+            if item["type"] != "file":
+                return None
+                
+            if "content" in item:
+                # File from before the disk image: text kept in the metadata
+                return item["content"].encode('utf-8')
+            return bytes(self.storage.read_data(item["allocation"], item["size"]))
+        
+    def write_file(self, file_name, data, parent_path=None):
+        """Replace the content of a file; data must fit in its allocated blocks"""
+        with self._locked(parent_path, write=True):
+            if parent_path:
+                # Normalize path with forward slashes
+                parent_path = parent_path.replace("\\", "/")
+                
+            parent = self.get_node_at_path(parent_path) if parent_path else self.get_node_at_path()
+            if not parent or file_name not in parent["content"]:
+                return False, "File not found"
+                
+            item = parent["content"][file_name]
+            if item["type"] != "file":
+                return False, "Not a file"
+                
+            allocation = item.get("allocation")
+            if not allocation or len(data) > allocation_blocks(allocation) * self.storage.block_size:
+                return False, "Not enough space in file allocation"
+            if not self._make_exclusive(item):
+                return False, "Not enough space to copy shared blocks"
+                
+            self.storage.write_data(item["allocation"], data)
+            self._commit_file_size(item["inode"], len(data))
+            return True, "File written"
+        
+    def _make_exclusive(self, node):
+        """
+        Before the first write to a copied file, give it its own blocks
+        (copy-on-write). Returns False if there is no space for the copy.
+        """
+        if not self.storage.is_shared(node["allocation"]):
+            return True
+        allocation = self.storage.unshare_allocation(node["inode"])
+        if allocation is None:
+            return False
+        self._commit({
+            'op': 'relocate',
+            'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'fat': [[node["inode"], list(allocation)]]
+        })
+        return True
+        
+    def resize_file(self, path, size):
+        """
+        Truncate or extend a file to size bytes; new bytes read as zeros.
+        Growing takes the free blocks after the file when it can, so the
+        existing data is not copied (see StorageManager.resize_allocation).
+        """
+        return self._resize(path, size)
+        
+    def append(self, path, data):
+        """Add bytes to the end of a file, growing its allocation as needed"""
+        return self._resize(path, None, data)
+        
+    def _resize(self, path, size, data=None):
+        """Set a file's size (to size, or by writing data at its end) and journal it with its allocation"""
+        path = self._resolve_path(path)
+        parent_path = path.rsplit("/", 1)[0] or "/"
+        with self._locked(parent_path, write=True):
+            node = self.get_node_at_path(path)
+            if node is None:
+                return False, "File not found"
+            if node["type"] != "file":
+                return False, "Not a file"
+            if "content" in node:
+                FileHandle(self, node, 'r+').close()  # Move text kept in the metadata into the blocks
             
-        item = parent["content"][file_name]
-        if item["type"] != "file":
-            return None
+            old_size = node["size"]
+            if data is not None:
+                size = old_size + len(data)
+            if size < 0:
+                return False, "Invalid size"
+            if not self._make_exclusive(node):
+                return False, "Not enough space to copy shared blocks"
+            num_blocks = (size + self.storage.block_size - 1) // self.storage.block_size
+            allocation = self.storage.resize_allocation(node["inode"], num_blocks)
+            if allocation is None:
+                return False, "Not enough space"
             
-        return item["content"]
+            if data is not None:
+                self.storage.write_data(allocation, data, old_size)
+            elif size > old_size:
+                self.storage.clear_data(allocation, old_size, size - old_size)
+            self._commit({
+                'op': 'resize',
+                'parent': parent_path,
+                'name': node["name"],
+                'size': size,
+                'allocation': allocation,
+                'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'fat': [[node["inode"], allocation]]
+            })
+            return True, "File resized"
+        
+    def _grow_allocation(self, node, size):
+        """
+        Make a file's allocation hold at least size bytes without changing
+        its size (FileHandle writes past the end). Returns False if there
+        is no space.
+        """
+        num_blocks = (size + self.storage.block_size - 1) // self.storage.block_size
+        if num_blocks <= allocation_blocks(node["allocation"]):
+            return True
+        allocation = self.storage.resize_allocation(node["inode"], num_blocks)
+        if allocation is None:
+            return False
+        self._commit({
+            'op': 'relocate',
+            'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'fat': [[node["inode"], allocation]]
+        })
+        return True
+        
+    def _commit_file_size(self, inode, size):
+        """
+        Journal the new size of a file whose blocks were just written. The
+        file is found by inode ID, wherever it is now; if it was deleted
+        meanwhile (its FAT entry goes first) the size is dropped.
+        """
+        with self._commit_lock:  # No rename or delete between finding the path and journaling it
+            path = self.get_path_by_inode(inode)
+            if path is None or inode not in self.storage.file_allocation_table:
+                return
+            parent_path, file_name = path.rsplit("/", 1)
+            self._commit({
+                'op': 'write',
+                'parent': parent_path or "/",
+                'name': file_name,
+                'size': size,
+                'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+        
+    def _resolve_path(self, path):
+        """Absolute, normalized form of a path relative to the current directory"""
+        path = path.replace("\\", "/")
+        if not path.startswith("/"):
+            path = self.current_dir.rstrip("/") + "/" + path
+        while "//" in path:
+            path = path.replace("//", "/")
+        if len(path) > 1:
+            path = path.rstrip("/")
+        return path
+        
+    def open(self, path, mode='r', size=None):
+        """
+        Open a file for streaming access and return a FileHandle.
+        Modes are 'r', 'r+', 'w', 'w+', 'a' and 'a+' ('b' is accepted and
+        ignored, data is always bytes). Opening a missing file with 'w'
+        creates it with room for size bytes.
+        """
+        if mode.replace('b', '') not in ('r', 'r+', 'w', 'w+', 'a', 'a+'):
+            raise ValueError(f"Invalid mode: '{mode}'")
+        path = self._resolve_path(path)
+        parent_path, file_name = path.rsplit("/", 1)
+        parent_path = parent_path or "/"
+        
+        with self._locked(parent_path, write=mode.replace('b', '') != 'r'):
+            node = self.get_node_at_path(path)
+            if node is None and 'w' in mode and size is not None:
+                success, message = self.create_file(file_name, size, parent_path)
+                if not success:
+                    raise OSError(message)
+                node = self.get_node_at_path(path)
+            if node is None:
+                raise FileNotFoundError(f"No such file: '{path}'")
+            if node["type"] != "file":
+                raise IsADirectoryError(f"Is a directory: '{path}'")
+            return FileHandle(self, node, mode.replace('b', ''))
         
     def rename_item(self, old_name, new_name, parent_path=None):
         """Rename a file or directory"""
-        if not self.is_valid_name(new_name):
-            return False, "Invalid name"
-        
-        if parent_path:
-            # Normalize path with forward slashes
-            parent_path = parent_path.replace("\\", "/")
+        with self._locked(parent_path, write=True):
+            if not self.is_valid_name(new_name):
+                return False, "Invalid name"
             
-        parent = self.get_node_at_path(parent_path) if parent_path else self.get_node_at_path()
-        if not parent or old_name not in parent["content"]:
-            return False, "Item not found"
-            
-        if new_name in parent["content"]:
-            return False, "Name already exists"
-            
-        # Move the item to new name
-        parent["content"][new_name] = parent["content"][old_name]
-        parent["content"][new_name]["name"] = new_name
-        parent["content"][new_name]["modified"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Update storage allocation if it's a file
-        if parent["content"][new_name]["type"] == "file":
-            # Construct paths with forward slashes
             if parent_path:
-                parent_path_norm = parent_path.replace("\\", "/")
-                old_path = parent_path_norm + ("/" if not parent_path_norm.endswith("/") else "") + old_name
-                new_path = parent_path_norm + ("/" if not parent_path_norm.endswith("/") else "") + new_name
-            else:
-                current_dir_norm = self.current_dir.replace("\\", "/")
-                old_path = current_dir_norm + ("/" if not current_dir_norm.endswith("/") else "") + old_name
-                new_path = current_dir_norm + ("/" if not current_dir_norm.endswith("/") else "") + new_name
+                # Normalize path with forward slashes
+                parent_path = parent_path.replace("\\", "/")
+                
+            parent = self.get_node_at_path(parent_path) if parent_path else self.get_node_at_path()
+            if not parent or old_name not in parent["content"]:
+                return False, "Item not found"
+                
+            if new_name in parent["content"]:
+                return False, "Name already exists"
                 
-            if old_path in self.storage.file_allocation_table:
-                allocation = self.storage.file_allocation_table.pop(old_path)
-                self.storage.file_allocation_table[new_path] = allocation
+            # Move the item to new name; the FAT is keyed by inode, so nothing below it changes
+            self._commit({
+                'op': 'rename',
+                'parent': parent_path or self.current_dir,
+                'old': old_name,
+                'new': new_name,
+                'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+            return True, "Item renamed"
         
-        del parent["content"][old_name]
-        parent["modified"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.save_filesystem()
-        return True, "Item renamed"
+    def _link_target(self, src_path, dest_path):
+        """
+        Resolve the source and destination of a copy or move. If dest_path is
+        an existing directory the item keeps its name inside it, otherwise
+        the last part of dest_path is the new name. Returns
+        (src_parent, name, dest_parent, new_name, node) or an error message.
+        """
+        src_path = self._resolve_path(src_path)
+        dest_path = self._resolve_path(dest_path)
+        if src_path == "/":
+            return "Cannot copy or move the root directory"
+        node = self.get_node_at_path(src_path)
+        if node is None:
+            return "Item not found"
+        src_parent, name = src_path.rsplit("/", 1)
+        
+        dest = self.get_node_at_path(dest_path)
+        if dest is not None and dest["type"] == "directory":
+            dest_parent, new_name = dest_path, name
+        else:
+            dest_parent, new_name = dest_path.rsplit("/", 1)
+        src_parent = src_parent or "/"
+        dest_parent = dest_parent or "/"
+        
+        dest = self.get_node_at_path(dest_parent)
+        if dest is None or dest["type"] != "directory":
+            return "Destination directory not found"
+        if not self.is_valid_name(new_name):
+            return "Invalid name"
+        if new_name in dest["content"]:
+            return "Name already exists"
+        if dest_parent == src_path or dest_parent.startswith(src_path + "/"):
+            return "Cannot copy or move a directory into itself"
+        return src_parent, name, dest_parent, new_name, node
+        
+    def move_item(self, src_path, dest_path):
+        """Move a file or directory; only metadata changes, no blocks are touched"""
+        with self._mutating(), self._namespace.write_locked():
+            target = self._link_target(src_path, dest_path)
+            if isinstance(target, str):
+                return False, target
+            src_parent, name, dest_parent, new_name, node = target
+            item_path = src_parent.rstrip("/") + "/" + name
+            current = self._resolve_path(self.current_dir)
+            if current == item_path or current.startswith(item_path + "/"):
+                return False, "Cannot move the current directory"
+                
+            self._commit({
+                'op': 'move',
+                'parent': src_parent,
+                'name': name,
+                'dest': dest_parent,
+                'new': new_name,
+                'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+            return True, "Item moved"
+        
+    def copy_item(self, src_path, dest_path):
+        """
+        Copy a file or directory tree. Copies share the original's blocks
+        copy-on-write, so this only copies metadata; a copy gets blocks of
+        its own when it is first written.
+        """
+        with self._mutating(), self._namespace.write_locked():
+            target = self._link_target(src_path, dest_path)
+            if isinstance(target, str):
+                return False, target
+            src_parent, name, dest_parent, new_name, node = target
+            
+            inode_map = []
+            shared = []
+            stack = [node]
+            while stack:
+                item = stack.pop()
+                inode = self.inodes.new_id()
+                inode_map.append([item["inode"], inode])
+                if item["type"] == "directory":
+                    stack.extend(item["content"].values())
+                elif item.get("allocation"):
+                    shared.append([inode, list(item["allocation"])])
+            self.storage.share_allocations(shared)
+            
+            self._commit({
+                'op': 'copy',
+                'parent': src_parent,
+                'name': name,
+                'dest': dest_parent,
+                'new': new_name,
+                'inodes': inode_map,
+                'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'fat': shared
+            })
+            return True, "Item copied"
         
     def is_valid_name(self, name):
         """Check if name is valid for files/directories"""
@@ -291,48 +1399,70 @@ class FileSystem:
         """Get disk usage information"""
         return self.storage.get_disk_usage()
         
+    def get_metrics(self):
+        """Storage metrics, with internal slack from the bytes of file data stored"""
+        return self.storage.get_metrics(file_bytes=self._stored_bytes())
+        
+    def export_metrics(self, path, format='json'):
+        """Write the storage metrics as JSON or as a Prometheus text file"""
+        self.storage.export_metrics(path, format, file_bytes=self._stored_bytes())
+        
+    def _stored_bytes(self):
+        """
+        The root's aggregate file size with copy-on-write copies counted
+        once: files sharing an allocation also share their size (the first
+        write gives a file its own blocks), so each extent holds it once.
+        """
+        shared = {}  # {first run start_block: (files using it, size)}
+        with self.storage.lock:
+            refs = self.storage.extent_refs
+            for inode, allocation in self.storage.file_allocation_table.items():
+                start = next((start for start, length in allocation_runs(allocation) if length > 0), None)
+                if refs.get(start, 0) > 1 and start not in shared:
+                    node = self.get_node_by_inode(inode)
+                    if node is not None:
+                        shared[start] = (refs[start], node["size"])
+        return self.root["size"] - sum((count - 1) * size for count, size in shared.values())
+        
     def delete_directory(self, dir_name, parent_path=None):
         """Delete a directory and all its contents recursively"""
-        parent = self.get_node_at_path(parent_path) if parent_path else self.get_node_at_path()
-        if not parent or dir_name not in parent["content"]:
-            return False, "Directory not found"
-            
-        if parent["content"][dir_name]["type"] != "directory":
-            return False, "Not a directory"
+        with self._mutating(), self._namespace.write_locked():
+            parent = self.get_node_at_path(parent_path) if parent_path else self.get_node_at_path()
+            if not parent or dir_name not in parent["content"]:
+                return False, "Directory not found"
+                
+            if parent["content"][dir_name]["type"] != "directory":
+                return False, "Not a directory"
+                
+            if parent_path:
+                # Normalize path with forward slashes
+                parent_path = parent_path.replace("\\", "/")
+            item_path = self._resolve_path(parent_path or self.current_dir).rstrip("/") + "/" + dir_name
+            current = self._resolve_path(self.current_dir)
+            if current == item_path or current.startswith(item_path + "/"):
+                return False, "Cannot delete the current directory"
+                
+            # Free the blocks of every file below the directory in one pass
+            freed_inodes = self.storage.deallocate_files(self._file_inodes(parent["content"][dir_name]))
             
-        # Get the full path to the directory
-        if parent_path:
-            parent_path = parent_path.replace("\\", "/")
-            dir_path = parent_path
-            if not dir_path.endswith("/"):
-                dir_path += "/"
-            dir_path += dir_name
-        else:
-            dir_path = self.current_dir
-            if not dir_path.endswith("/"):
-                dir_path += "/"
-            dir_path += dir_name
-        
-        # Recursively delete all files in the directory
-        self._delete_directory_contents(parent["content"][dir_name], dir_path)
+            # Delete the directory itself
+            self._commit({
+                'op': 'rmdir',
+                'parent': parent_path or self.current_dir,
+                'name': dir_name,
+                'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'fat': [[inode, None] for inode in freed_inodes]
+            })
+            return True, "Directory deleted"
         
-        # Delete the directory itself
-        del parent["content"][dir_name]
-        parent["modified"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.save_filesystem()
-        return True, "Directory deleted"
-        
-    def _delete_directory_contents(self, dir_node, dir_path):
-        """Recursively delete all contents of a directory"""
-        for name, item in list(dir_node["content"].items()):
-            item_path = dir_path + "/" + name
-            # Clean path from double slashes
-            while "//" in item_path:
-                item_path = item_path.replace("//", "/")
-                
-            if item["type"] == "file":
-                # Deallocate file storage
-                self.storage.deallocate_file(item_path)
-            elif item["type"] == "directory":
-                # Recursively delete subdirectory contents
-                self._delete_directory_contents(item, item_path)
\ No newline at end of file
+    def _file_inodes(self, dir_node):
+        """Inode IDs of every file below a directory"""
+        inodes = []
+        stack = [dir_node]
+        while stack:
+            for item in stack.pop()["content"].values():
+                if item["type"] == "file":
+                    inodes.append(item["inode"])
+                else:
+                    stack.append(item)
+        return inodes
\ No newline at end of file
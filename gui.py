@@ -3,6 +3,9 @@ from tkinter import ttk, scrolledtext, messagebox, simpledialog
 from tkinter.font import Font
 import os
 from filesystem import FileSystem
+from commands import CommandInterpreter
+from allocation_view import AllocationView
+from operation_queue import OperationQueue
 
 class FileSystemGUI:
     def __init__(self, root):
@@ -11,10 +14,72 @@ class FileSystemGUI:
         self.root.geometry("1200x600")
         
         self.fs = FileSystem()
+        # Filesystem calls run on a worker thread; results come back through root.after
+        self.ops = OperationQueue(root, on_error=self.show_error, on_busy=self.set_busy, on_progress=self.show_progress)
+        # Terminal commands run on the worker too, so their output is handed to the Tk thread
+        self.commands = CommandInterpreter(
+            self.fs,
+            lambda text, color="white": self.ops.call_soon(self.write_to_terminal, text, color),
+            on_change=lambda: self.ops.call_soon(self.refresh_view),
+            on_clear=lambda: self.ops.call_soon(self.clear_terminal)
+        )
         
         self.setup_ui()
         self.refresh_view()
         
+        # Fold the journal into the metadata files when the window closes
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+    def on_close(self):
+        """Checkpoint the filesystem and close the window"""
+        self.ops.shutdown()  # Let queued operations finish first
+        self.fs.close()
+        self.root.destroy()
+        
+    def show_error(self, error):
+        messagebox.showerror("Error", str(error))
+        
+    def set_busy(self, busy):
+        """Show the progress bar while operations are queued or running"""
+        if busy:
+            # Only for operations that take long enough to notice
+            self._busy_timer = self.root.after(200, self._show_busy)
+        else:
+            if self._busy_timer:
+                self.root.after_cancel(self._busy_timer)
+                self._busy_timer = None
+            self.progress.stop()
+            self.progress.pack_forget()
+            self.progress_var.set("")
+            
+    def _show_busy(self):
+        self._busy_timer = None
+        self.progress.pack(side=tk.RIGHT, padx=5)
+        if self.progress['mode'] == 'indeterminate':
+            self.progress.start(15)
+            
+    def show_progress(self, text, fraction=None):
+        """Progress reported by a running operation"""
+        self.progress_var.set(text)
+        if fraction is None:
+            self.progress.configure(mode='indeterminate')
+        else:
+            self.progress.stop()
+            self.progress.configure(mode='determinate', value=fraction * 100)
+            
+    def run_change(self, function, label=None, on_failure=None):
+        """Run a (success, message) operation in the background, then refresh or show the error"""
+        self.ops.submit(lambda progress: function(), lambda result: self.change_done(result, on_failure), label=label)
+        
+    def change_done(self, result, on_failure=None):
+        success, message = result
+        if success:
+            self.refresh_view()
+        else:
+            messagebox.showerror("Error", message)
+            if on_failure:
+                on_failure()
+                
     def setup_ui(self):
         # Main PanedWindow for split view
         self.main_pane = tk.PanedWindow(self.root, orient=tk.HORIZONTAL)
@@ -50,9 +115,9 @@ class FileSystemGUI:
         self.setup_allocation_info()
         
     def setup_allocation_info(self):
-        # Allocation visualization
-        self.canvas = tk.Canvas(self.allocation_tab, bg="white")
-        self.canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        # Allocation visualization (draws only the visible part of the disk)
+        self.allocation_view = AllocationView(self.allocation_tab, self.fs.storage)
+        self.allocation_view.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
         # Disk usage info
         self.disk_info_label = tk.Label(self.allocation_tab, anchor=tk.W)
@@ -76,9 +141,15 @@ class FileSystemGUI:
         
     def update_allocation_view(self):
         """Update the allocation visualization"""
-        self.canvas.delete("all")
-        usage = self.fs.storage.get_disk_usage()
+        selected = self.tree.selection()
+        item_name = self.tree.item(selected[0], "text") if selected else None
+        
+        def load(progress):
+            usage = self.fs.storage.get_disk_usage()
+            return usage, item_name and self.fs.show_allocation_info(item_name)
+        self.ops.submit(load, lambda result: self.show_allocation(item_name, *result), key='allocation')
         
+    def show_allocation(self, item_name, usage, allocation_info):
         # Display disk usage info
         disk_info = (
             f"Total: {usage['total_blocks']} blocks ({usage['total_bytes']/1024:.1f} KB) | "
@@ -87,48 +158,22 @@ class FileSystemGUI:
         )
         self.disk_info_label.config(text=disk_info)
         
-        # Draw block visualization
-        canvas_width = self.canvas.winfo_width()
-        if canvas_width < 10:  # Handle initial small size
-            canvas_width = 500
-            
-        block_width = max(5, canvas_width // usage['total_blocks'])
-        
-        for i in range(usage['total_blocks']):
-            color = "red" if self.fs.storage.bitmap[i] else "green"
-            self.canvas.create_rectangle(
-                i * block_width, 20,
-                (i+1) * block_width, 50,
-                fill=color,
-                outline="black",
-                tags="block"
-            )
-            
         # Show selected file allocation
-        selected = self.tree.selection()
-        if selected:
-            item_name = self.tree.item(selected[0], "text")
-            allocation_info = self.fs.show_allocation_info(item_name)
-            
+        highlight = []
+        if item_name:
             if allocation_info:
+                extents = allocation_info['extents']
                 info_text = (
                     f"File: {allocation_info['file_name']}\n"
                     f"Size: {allocation_info['size_bytes']} bytes\n"
                     f"Blocks: {allocation_info['num_blocks']} "
-                    f"(#{allocation_info['start_block']}-#{allocation_info['start_block']+allocation_info['num_blocks']-1})\n"
+                    + ", ".join(f"(#{start}-#{start+length-1})" for start, length in extents) + "\n"
                     f"Location: bytes {allocation_info['start_byte']}-{allocation_info['end_byte']}"
                 )
-                
-                # Highlight allocated blocks
-                for i in range(allocation_info['start_block'], 
-                              allocation_info['start_block'] + allocation_info['num_blocks']):
-                    self.canvas.create_rectangle(
-                        i * block_width, 20,
-                        (i+1) * block_width, 50,
-                        outline="yellow",
-                        width=2,
-                        tags="highlight"
-                    )
+                if len(extents) > 1:
+                    info_text += f"\nExtents: {len(extents)}"
+                    
+                highlight = extents
             else:
                 info_text = f"No allocation info for {item_name}"
                 
@@ -136,9 +181,8 @@ class FileSystemGUI:
             self.allocation_text.delete(1.0, tk.END)
             self.allocation_text.insert(tk.END, info_text)
             self.allocation_text.config(state='disabled')
-        
-        # Bind canvas resize
-        self.canvas.bind("<Configure>", lambda e: self.update_allocation_view())
+            
+        self.allocation_view.refresh(highlight)
     
     def setup_file_explorer(self):
         # Top frame with path and buttons
@@ -160,10 +204,11 @@ class FileSystemGUI:
         self.tree_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
         self.tree = ttk.Treeview(self.tree_frame, columns=("Type", "Size", "Modified"))
-        self.tree.heading("#0", text="Name")
+        # Clicking Name, Size or Modified sorts by it; clicking again reverses
+        self.tree.heading("#0", text="Name", command=lambda: self.sort_view('name'))
         self.tree.heading("Type", text="Type")
-        self.tree.heading("Size", text="Size")
-        self.tree.heading("Modified", text="Modified")
+        self.tree.heading("Size", text="Size", command=lambda: self.sort_view('size'))
+        self.tree.heading("Modified", text="Modified", command=lambda: self.sort_view('modified'))
         
         self.tree.column("#0", width=250)
         self.tree.column("Type", width=100)
@@ -175,9 +220,17 @@ class FileSystemGUI:
         self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
         
         # Scrollbar
-        scrollbar = ttk.Scrollbar(self.tree, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree_scrollbar = ttk.Scrollbar(self.tree, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.on_tree_scroll)
+        self.tree_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # Rows are loaded a page at a time as the user scrolls
+        self.sort_by = 'name'
+        self.sort_reverse = False
+        self._listing = None  # (directory, sort, reverse) of the rows shown
+        self._listing_id = 0  # Counts refreshes; pages loaded for an earlier one are dropped
+        self._cursor = None  # Where the next page starts; None when every row is loaded
+        self._loading_page = False
         
         # Button frame
         button_frame = tk.Frame(self.left_frame)
@@ -196,10 +249,15 @@ class FileSystemGUI:
         for text, command in buttons:
             tk.Button(button_frame, text=text, command=command).pack(side=tk.LEFT, padx=2)
         
-        # Status bar
+        # Status bar, with progress of long background operations on the right
+        status_frame = tk.Frame(self.left_frame, bd=1, relief=tk.SUNKEN)
+        status_frame.pack(fill=tk.X)
         self.status_var = tk.StringVar()
-        status_bar = tk.Label(self.left_frame, textvariable=self.status_var, bd=1, relief=tk.SUNKEN, anchor=tk.W)
-        status_bar.pack(fill=tk.X)
+        self.progress_var = tk.StringVar()
+        self.progress = ttk.Progressbar(status_frame, mode='indeterminate', length=120)
+        self._busy_timer = None
+        tk.Label(status_frame, textvariable=self.status_var, anchor=tk.W).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        tk.Label(status_frame, textvariable=self.progress_var, anchor=tk.E).pack(side=tk.RIGHT)
     
     def on_tree_select(self, event):
         """Update allocation view when tree selection changes"""
@@ -208,12 +266,10 @@ class FileSystemGUI:
     def on_path_enter(self, event=None):
         """Handle path entry or Go button"""
         path = self.path_var.get()
-        success, message = self.fs.change_directory(path)
-        if success:
-            self.refresh_view()
-        else:
-            messagebox.showerror("Error", message)
-            self.path_var.set(self.fs.current_dir)
+        self.run_change(
+            lambda: self.fs.change_directory(path),
+            on_failure=lambda: self.path_var.set(self.fs.current_dir)
+        )
     
     def go_up(self):
         """Go to parent directory"""
@@ -221,11 +277,7 @@ class FileSystemGUI:
             return
             
         parent_dir = os.path.dirname(self.fs.current_dir)
-        success, message = self.fs.change_directory(parent_dir)
-        if success:
-            self.refresh_view()
-        else:
-            messagebox.showerror("Error", message)
+        self.run_change(lambda: self.fs.change_directory(parent_dir))
     
     def setup_terminal(self):
         # Terminal frame
@@ -259,11 +311,12 @@ class FileSystemGUI:
         )
         self.terminal_input.pack(fill=tk.X, expand=True, padx=5)
         self.terminal_input.bind("<Return>", self.execute_command)
+        self.terminal_input.bind("<Tab>", self.complete_command)
         
         # Terminal help label
         help_label = tk.Label(
             terminal_frame, 
-            text="Commands: ls, cd, mkdir, touch, rm, cp, mv, cat, df, clear, help",
+            text="Commands: ls, find, cd, mkdir, touch, rm, cp, mv, cat, df, defrag, clear, help",
             anchor=tk.W
         )
         help_label.pack(fill=tk.X)
@@ -291,173 +344,118 @@ class FileSystemGUI:
         if not command:
             return
             
-        parts = command.split()
-        cmd = parts[0]
-        args = parts[1:]
-        
-        if cmd == "help":
-            self.write_to_terminal(
-                "Available commands:\n"
-                "  ls [path]      - List directory contents\n"
-                "  cd [path]      - Change directory\n"
-                "  mkdir <dir>    - Create directory\n"
-                "  touch <file>   - Create file\n"
-                "  rm <path>      - Remove file/directory\n"
-                "  cp <src> <dest> - Copy file\n"
-                "  mv <src> <dest> - Move file\n"
-                "  cat <file>     - Show file content\n"
-                "  df             - Show disk usage\n"
-                "  clear          - Clear terminal\n"
-                "  help           - Show this help\n"
-            )
-        elif cmd == "clear":
-            self.terminal_output.configure(state='normal')
-            self.terminal_output.delete(1.0, tk.END)
-            self.terminal_output.configure(state='disabled')        
-        elif cmd == "ls":
-            # Get path from arguments or use current directory
-            path = args[0] if args else self.fs.current_dir
-            
-            # Normalize the path for consistency
-            path = path.replace("\\", "/")
-            
-            # Handle relative paths properly
-            if not path.startswith("/"):
-                # If path is relative, join it with current directory
-                if self.fs.current_dir.endswith("/"):
-                    path = self.fs.current_dir + path
-                else:
-                    path = self.fs.current_dir + "/" + path
-                    
-            # Clean path from double slashes
-            while "//" in path:
-                path = path.replace("//", "/")
-                
-            contents = self.fs.get_directory_contents(path)
-            if contents is None:
-                self.write_to_terminal(f"ls: cannot access '{path}': No such file or directory\n", "red")
-            else:
-                self.write_to_terminal(f"Contents of {path}:\n")
-                for name, item in contents.items():
-                    self.write_to_terminal(f"{name}/\n" if item['type'] == 'directory' else f"{name}\n")        
-        elif cmd == "cd":
-            path = args[0] if args else "/"
+        self.ops.submit(lambda progress: self.commands.execute(command))
+        
+    def complete_command(self, event):
+        """Complete the command name or path before the cursor"""
+        line = self.terminal_input.get()[:self.terminal_input.index(tk.INSERT)]
+        self.ops.submit(
+            lambda progress: self.commands.complete(line),
+            lambda result: self.show_completions(line, *result),
+            key='complete'
+        )
+        return "break"  # Keep focus in the entry
+        
+    def show_completions(self, line, start, candidates):
+        if self.terminal_input.get()[:self.terminal_input.index(tk.INSERT)] != line or not candidates:
+            return  # Typed on meanwhile, or nothing matches
+        common = os.path.commonprefix(candidates)
+        if len(common) > len(line) - start:
+            self.terminal_input.delete(start, len(line))
+            self.terminal_input.insert(start, common)
+        elif len(candidates) > 1:
+            self.write_to_terminal("  ".join(candidates) + "\n")
             
-            # Special case for ".." to go up one directory
-            if path == "..":
-                if self.fs.current_dir == "/":
-                    # Already at root, do nothing
-                    self.write_to_terminal("Already at root directory\n")
-                    return
-                # Get parent directory by removing the last segment
-                path_parts = self.fs.current_dir.rstrip('/').split('/')
-                if len(path_parts) > 1:
-                    parent_dir = '/'.join(path_parts[:-1])
-                    if not parent_dir:
-                        parent_dir = "/"
-                else:
-                    parent_dir = "/"
-                success, message = self.fs.change_directory(parent_dir)
-            else:
-                success, message = self.fs.change_directory(path)
-                
-            if success:
-                self.write_to_terminal(f"Changed directory to {self.fs.current_dir}\n")
-                self.refresh_view()
-            else:
-                self.write_to_terminal(f"cd: {message}\n", "red")
-        elif cmd == "mkdir":
-            if not args:
-                self.write_to_terminal("mkdir: missing operand\n", "red")
-            else:
-                success, message = self.fs.create_directory(args[0])
-                if success:
-                    self.write_to_terminal(f"Directory '{args[0]}' created\n")
-                    self.refresh_view()
-                else:
-                    self.write_to_terminal(f"mkdir: {message}\n", "red")
-        elif cmd == "touch":
-            if not args:
-                self.write_to_terminal("touch: missing operand\n", "red")
-            else:
-                size = 1024  # Default size
-                if len(args) > 1 and args[1].isdigit():
-                    size = int(args[1])
-                success, message = self.fs.create_file(args[0], size)
-                if success:
-                    self.write_to_terminal(f"File '{args[0]}' created ({size} bytes)\n")
-                    self.refresh_view()
-                else:
-                    self.write_to_terminal(f"touch: {message}\n", "red")
-        elif cmd == "rm":
-            if not args:
-                self.write_to_terminal("rm: missing operand\n", "red")
-            else:
-                success, message = self.fs.delete_file(args[0])
-                if success:
-                    self.write_to_terminal(f"Removed '{args[0]}'\n")
-                    self.refresh_view()
-                else:
-                    self.write_to_terminal(f"rm: {message}\n", "red")
-        elif cmd == "cp":
-            if len(args) < 2:
-                self.write_to_terminal("cp: missing file operand\n", "red")
-            else:
-                # Implement copy logic here
-                self.write_to_terminal(f"Copying '{args[0]}' to '{args[1]}'\n")
-                # Placeholder - actual implementation would use fs.copy_file()
-        elif cmd == "mv":
-            if len(args) < 2:
-                self.write_to_terminal("mv: missing file operand\n", "red")
-            else:
-                # Implement move logic here
-                self.write_to_terminal(f"Moving '{args[0]}' to '{args[1]}'\n")
-                # Placeholder - actual implementation would use fs.move_file()
-        elif cmd == "cat":
-            if not args:
-                self.write_to_terminal("cat: missing file operand\n", "red")
-            else:
-                content = self.fs.get_file_content(args[0])
-                if content is None:
-                    self.write_to_terminal(f"cat: {args[0]}: No such file or directory\n", "red")
-                else:
-                    self.write_to_terminal(f"{content}\n")
-        elif cmd == "df":
-            disk_info = self.fs.get_disk_info()
-            usage = (disk_info['used_bytes'] / disk_info['total_bytes']) * 100 if disk_info['total_bytes'] > 0 else 0
-            self.write_to_terminal(
-                f"Filesystem      Size  Used  Avail Use%\n"
-                f"VirtualDisk   {self.fs.format_size(disk_info['total_bytes'])} "
-                f"{self.fs.format_size(disk_info['used_bytes'])} "
-                f"{self.fs.format_size(disk_info['free_bytes'])} "
-                f"{int(usage)}%\n"
-            )
-        else:
-            self.write_to_terminal(f"{cmd}: command not found\n", "red")
+    def clear_terminal(self):
+        self.terminal_output.configure(state='normal')
+        self.terminal_output.delete(1.0, tk.END)
+        self.terminal_output.configure(state='disabled')
+        
+    PAGE_SIZE = 200  # Treeview rows loaded at a time
     
+    def _rows(self, entries):
+        """Treeview values for (name, node) pairs (worker thread)"""
+        return [
+            (name, item['type'], self.fs.format_size(item.get('size', 0)) if item['type'] == 'file' else '', item['modified'])
+            for name, item in entries
+        ]
+        
     def refresh_view(self):
-        """Refresh the tree view with current directory contents"""
+        """Refresh the tree view with the first page of the current directory"""
+        sort, reverse = self.sort_by, self.sort_reverse
+        
+        def load(progress):
+            # Worker thread: read everything the view needs; a newer refresh makes this one stale
+            current_dir = self.fs.current_dir
+            entries, cursor = self.fs.list_directory(current_dir, sort, reverse, limit=self.PAGE_SIZE)
+            if entries is None:
+                return current_dir, None, None, None
+            return current_dir, self._rows(entries), cursor, self.fs.get_disk_info()
+        self.ops.submit(load, lambda result: self.show_directory(*result, sort, reverse), key='refresh')
+        
+    def sort_view(self, column):
+        """Sort the rows by a column, or reverse the order if it is already sorted by it"""
+        if self.sort_by == column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_by, self.sort_reverse = column, False
+        self.refresh_view()
+        
+    def show_directory(self, current_dir, rows, cursor, disk_info, sort='name', reverse=False):
         self.tree.delete(*self.tree.get_children())
-        self.path_var.set(self.fs.current_dir)
+        self.path_var.set(current_dir)
+        self._listing = None
+        self._listing_id += 1
+        self._cursor = None
         
-        contents = self.fs.get_directory_contents()
-        if contents is None:
+        if rows is None:
             messagebox.showerror("Error", "Invalid directory")
             return
             
-        for name, item in contents.items():
-            size = self.fs.format_size(item.get('size', 0)) if item['type'] == 'file' else ''
+        self._listing = (current_dir, sort, reverse)
+        self._cursor = cursor
+        self._loading_page = False
+        for name, item_type, size, modified in rows:
             self.tree.insert("", "end", text=name, 
-                            values=(item['type'], size, item['modified']))
+                            values=(item_type, size, modified))
         
-        disk_info = self.fs.get_disk_info()
         self.status_var.set(
-            f"Current directory: {self.fs.current_dir} | "
+            f"Current directory: {current_dir} | "
             f"Used space: {self.fs.format_size(disk_info['used_bytes'])}/"
             f"{self.fs.format_size(disk_info['total_bytes'])}"
         )
         self.update_allocation_view()
     
+    def on_tree_scroll(self, first, last):
+        """Update the scrollbar and load the next page when the end of the rows comes into view"""
+        self.tree_scrollbar.set(first, last)
+        if float(last) > 0.9:
+            self.load_more_rows()
+            
+    def load_more_rows(self):
+        if self._cursor is None or self._loading_page:
+            return
+        self._loading_page = True
+        listing_id, cursor = self._listing_id, self._cursor
+        current_dir, sort, reverse = self._listing
+        
+        def load(progress):
+            entries, next_cursor = self.fs.list_directory(current_dir, sort, reverse, cursor, self.PAGE_SIZE)
+            return self._rows(entries or []), next_cursor
+        self.ops.submit(load, lambda result: self.show_more_rows(listing_id, *result), on_error=self.page_failed)
+        
+    def page_failed(self, error):
+        self._loading_page = False
+        self.show_error(error)
+        
+    def show_more_rows(self, listing_id, rows, cursor):
+        if listing_id != self._listing_id:
+            return  # The view was refreshed meanwhile
+        self._loading_page = False
+        self._cursor = cursor
+        for name, item_type, size, modified in rows:
+            self.tree.insert("", "end", text=name, values=(item_type, size, modified))
+            
     def on_double_click(self, event):
         """Handle double click on tree item"""
         item = self.tree.identify_row(event.y)
@@ -469,11 +467,7 @@ class FileSystemGUI:
         
         if item_type == 'directory':
             new_path = os.path.join(self.fs.current_dir, item_name)
-            success, message = self.fs.change_directory(new_path)
-            if success:
-                self.refresh_view()
-            else:
-                messagebox.showerror("Error", message)
+            self.run_change(lambda: self.fs.change_directory(new_path))
     
     def create_directory(self):
         """Create a new directory"""
@@ -481,11 +475,7 @@ class FileSystemGUI:
         if not dir_name:
             return
             
-        success, message = self.fs.create_directory(dir_name)
-        if success:
-            self.refresh_view()
-        else:
-            messagebox.showerror("Error", message)
+        self.run_change(lambda: self.fs.create_directory(dir_name))
             
     def create_file(self):
         """Create a new file"""
@@ -497,10 +487,7 @@ class FileSystemGUI:
         if not file_size:
             return
             
-        success, message = self.fs.create_file(file_name, file_size)
-        if success:            self.refresh_view()
-        else:
-            messagebox.showerror("Error", message)
+        self.run_change(lambda: self.fs.create_file(file_name, file_size), label=f"Creating '{file_name}'...")
             
     def delete_item(self):
         """Delete selected item"""
@@ -535,14 +522,18 @@ class FileSystemGUI:
             
         if confirm:
             if item_type == 'directory':
-                success, message = self.fs.delete_directory(item_name)
+                self.ops.submit(
+                    lambda progress: self._delete_directory(item_name, progress), self.change_done
+                )
             else:
-                success, message = self.fs.delete_file(item_name)
+                self.run_change(lambda: self.fs.delete_file(item_name), label=f"Deleting '{item_name}'...")
                 
-            if success:
-                self.refresh_view()
-            else:
-                messagebox.showerror("Error", message)
+    def _delete_directory(self, dir_name, progress):
+        """Worker thread: recursive delete, reporting how much it is removing"""
+        node = self.fs.get_node_at_path(os.path.join(self.fs.current_dir, dir_name))
+        file_count = node.get('file_count', 0) if node else 0
+        progress(f"Deleting '{dir_name}' ({file_count} files)...")
+        return self.fs.delete_directory(dir_name)
                 
     def rename_item(self):
         """Rename selected item"""
@@ -556,11 +547,7 @@ class FileSystemGUI:
         if not new_name or new_name == old_name:
             return
             
-        success, message = self.fs.rename_item(old_name, new_name)
-        if success:
-            self.refresh_view()
-        else:
-            messagebox.showerror("Error", message)
+        self.run_change(lambda: self.fs.rename_item(old_name, new_name))
             
     def view_content(self):
         """View content of selected file"""
@@ -576,7 +563,14 @@ class FileSystemGUI:
             messagebox.showwarning("Warning", "Can only view content of files")
             return
             
-        content = self.fs.get_file_content(item_name)
+        def load(progress):
+            content = self.fs.get_file_content(item_name)
+            if content is None:
+                return None
+            return content.decode('utf-8', errors='replace').rstrip('\x00')
+        self.ops.submit(load, lambda text: self.show_content(item_name, text), label=f"Reading '{item_name}'...")
+        
+    def show_content(self, item_name, content):
         if content is None:
             messagebox.showerror("Error", "Could not read file content")
             return
@@ -609,27 +603,40 @@ class FileSystemGUI:
         item_name = self.tree.item(selected[0], "text")
         item_type = self.tree.item(selected[0], "values")[0]
         
-        node = self.fs.get_node_at_path(os.path.join(self.fs.current_dir, item_name))
-        if not node:
+        path = os.path.join(self.fs.current_dir, item_name)
+        
+        def load(progress):
+            node = self.fs.get_node_at_path(path)
+            if not node:
+                return None
+                
+            # Directories keep their total size up to date, so this never walks the subtree
+            size = node.get('size', 0)
+            message = (
+                f"Name: {item_name}\n"
+                f"Type: {'Directory' if item_type == 'directory' else 'File'}\n"
+                f"Size: {self.fs.format_size(size)}\n"
+            )
+            if item_type == 'directory':
+                message += f"Files: {node.get('file_count', 0)}\n"
+            message += (
+                f"Created: {node['created']}\n"
+                f"Modified: {node['modified']}"
+            )
+            return message
+        self.ops.submit(load, self.show_info)
+        
+    def show_info(self, message):
+        if message is None:
             messagebox.showerror("Error", "Item not found")
             return
-            
-        size = node.get('size', 0)
-        if item_type == 'directory':
-            size = self.fs.storage.calculate_size(node)
-            
-        message = (
-            f"Name: {item_name}\n"
-            f"Type: {'Directory' if item_type == 'directory' else 'File'}\n"
-            f"Size: {self.fs.format_size(size)}\n"
-            f"Created: {node['created']}\n"
-            f"Modified: {node['modified']}"
-        )
         messagebox.showinfo("Properties", message)
         
     def show_disk_info(self):
         """Show disk usage information"""
-        disk_info = self.fs.storage.get_disk_usage()
+        self.ops.submit(lambda progress: self.fs.storage.get_disk_usage(), self.show_disk_usage)
+        
+    def show_disk_usage(self, disk_info):
         usage = (disk_info['used_bytes'] / disk_info['total_bytes']) * 100 if disk_info['total_bytes'] > 0 else 0
         
         message = (
@@ -650,21 +657,15 @@ class FileSystemGUI:
         
         if item_type == 'directory':
             new_path = os.path.join(self.fs.current_dir, item_name)
-            success, message = self.fs.change_directory(new_path)
-            if success:
-                self.refresh_view()
-            else:
-                messagebox.showerror("Error", message)
+            self.run_change(lambda: self.fs.change_directory(new_path))
                 
     def on_path_enter(self, event=None):
         """Handle path entry or Go button"""
         path = self.path_var.get()
-        success, message = self.fs.change_directory(path)
-        if success:
-            self.refresh_view()
-        else:
-            messagebox.showerror("Error", message)
-            self.path_var.set(self.fs.current_dir)
+        self.run_change(
+            lambda: self.fs.change_directory(path),
+            on_failure=lambda: self.path_var.set(self.fs.current_dir)
+        )
             
     def go_up(self):
         """Go to parent directory"""
@@ -672,12 +673,8 @@ class FileSystemGUI:
             return
             
         parent_dir = os.path.dirname(self.fs.current_dir)
-        success, message = self.fs.change_directory(parent_dir)
-        if success:
-            self.refresh_view()
-        else:
-            messagebox.showerror("Error", message)
-
+        self.run_change(lambda: self.fs.change_directory(parent_dir))
+            
 if __name__ == "__main__":
     root = tk.Tk()
     app = FileSystemGUI(root)
@@ -0,0 +1,77 @@
+import threading
+
+class InodeTable:
+    """
+    Stable integer IDs for tree nodes. Every node stores its ID under
+    "inode" and the FAT is keyed by it, so renaming or moving an item never
+    touches the allocation data. IDs are never reused. Each node's parent
+    is recorded too, so a node can be found again by path after moves.
+    """
+    ROOT_ID = 1
+    
+    def __init__(self):
+        self.nodes = {}  # {inode: node} for every node indexed so far
+        self.parents = {}  # {inode: parent inode}
+        self.next_id = self.ROOT_ID + 1
+        self.complete = False  # True once the whole tree has been indexed
+        self._id_lock = threading.Lock()
+        
+    def new_id(self):
+        """Reserve the next unused ID"""
+        with self._id_lock:
+            inode = self.next_id
+            self.next_id += 1
+            return inode
+        
+    def add(self, node, parent=None):
+        """Index a node under its ID (again after a move, with its new parent)"""
+        inode = node["inode"]
+        self.nodes[inode] = node
+        if parent is not None and "inode" in parent:  # Nodes of an unmigrated tree have no ID
+            self.parents[inode] = parent["inode"]
+        if inode >= self.next_id:
+            self.next_id = inode + 1
+            
+    def add_tree(self, node, parent=None):
+        """Index a node and everything below it"""
+        stack = [(node, parent)]
+        while stack:
+            node, parent = stack.pop()
+            self.add(node, parent)
+            if node["type"] == "directory":
+                stack.extend((child, node) for child in node["content"].values())
+                
+    def remove(self, inode):
+        self.nodes.pop(inode, None)
+        self.parents.pop(inode, None)
+        
+    def remove_tree(self, node):
+        """Drop a node and everything below it from the index"""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            self.nodes.pop(node.get("inode"), None)  # Nodes of an unmigrated tree have no ID
+            self.parents.pop(node.get("inode"), None)
+            if node["type"] == "directory":
+                stack.extend(node["content"].values())
+                
+    def get(self, inode):
+        return self.nodes.get(inode)
+        
+    def path(self, inode):
+        """Absolute path of a node from the recorded parents, or None if it is not indexed"""
+        names = []
+        while inode != self.ROOT_ID:
+            node = self.nodes.get(inode)
+            if node is None or inode not in self.parents:
+                return None
+            names.append(node["name"])
+            inode = self.parents[inode]
+        return "/" + "/".join(reversed(names))
+        
+    def index_tree(self, root):
+        """Index the whole tree (decodes any lazy directories)"""
+        self.nodes.clear()
+        self.parents.clear()
+        self.add_tree(root)
+        self.complete = True
\ No newline at end of file
@@ -0,0 +1,86 @@
+import os
+import json
+import zlib
+
+class Journal:
+    """
+    Append-only operation journal (write-ahead log) for the filesystem.
+    Every mutation is written as one line "<crc32> <json record>". A record
+    counts as committed once its whole line is on disk; a torn or corrupt
+    line at the end (crash during append) is ignored on replay.
+    """
+    def __init__(self, journal_file='filesystem.journal', durable=True):
+        self.journal_file = journal_file
+        self.durable = durable  # fsync every record
+        self.next_seq = 1
+        self.pending = 0  # Records written since the last checkpoint
+        self._file = None
+        
+    def read(self):
+        """Return all committed records in order"""
+        records = []
+        try:
+            with open(self.journal_file, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Torn write at the tail
+                    try:
+                        crc, payload = line.rstrip(b'\n').split(b' ', 1)
+                        if int(crc, 16) != zlib.crc32(payload):
+                            break
+                        records.append(json.loads(payload.decode('utf-8')))
+                    except ValueError:
+                        break
+        except FileNotFoundError:
+            pass
+        return records
+        
+    def open(self, checkpoint_seq, records=()):
+        """Start appending after the checkpoint and the replayed records"""
+        last_seq = records[-1]['seq'] if records else checkpoint_seq
+        self.next_seq = max(checkpoint_seq, last_seq) + 1
+        self.pending = len(records)
+        # Rewrite only the committed prefix so a torn tail is not appended to
+        self._rewrite(records)
+        
+    def append(self, record):
+        """Write a record and return its sequence number"""
+        record['seq'] = self.next_seq
+        self._file.write(self._encode(record))
+        self._file.flush()
+        if self.durable:
+            os.fsync(self._file.fileno())
+        self.next_seq += 1
+        self.pending += 1
+        return record['seq']
+        
+    @property
+    def last_seq(self):
+        return self.next_seq - 1
+        
+    def reset(self):
+        """Drop all records after a checkpoint has made them redundant"""
+        self._rewrite([])
+        self.pending = 0
+        
+    def _encode(self, record):
+        """One journal line: crc32 of the compact JSON payload, then the payload"""
+        payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+        return b'%08x ' % zlib.crc32(payload) + payload + b'\n'
+        
+    def _rewrite(self, records):
+        if self._file:
+            self._file.close()
+        tmp_file = self.journal_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            for record in records:
+                f.write(self._encode(record))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.journal_file)
+        self._file = open(self.journal_file, 'ab')
+        
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
\ No newline at end of file
@@ -0,0 +1,107 @@
+import threading
+import weakref
+import functools
+from contextlib import contextmanager
+
+class RWLock:
+    """
+    Reader/writer lock: any number of readers or one writer. Waiting
+    writers block new readers so they are not starved. Both sides are
+    reentrant, and the writer may also take the read side; a reader asking
+    for the write side raises RuntimeError instead of deadlocking.
+    """
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = {}  # {thread ident: read holds}
+        self._writer = None  # Thread ident of the writer
+        self._writer_depth = 0
+        self._writers_waiting = 0
+        
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me and me not in self._readers:
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+            
+    def release_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._readers[me] > 1:
+                self._readers[me] -= 1
+            else:
+                del self._readers[me]
+                if not self._readers:
+                    self._cond.notify_all()
+                    
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError("Cannot upgrade a read lock to a write lock")
+            self._writers_waiting += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = me
+            self._writer_depth = 1
+            
+    def release_write(self):
+        with self._cond:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._cond.notify_all()
+                
+    def held(self):
+        """True if the calling thread holds either side"""
+        me = threading.get_ident()
+        with self._cond:
+            return self._writer == me or me in self._readers
+            
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+            
+    @contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+            
+            
+class DirectoryLocks:
+    """
+    One RWLock per directory, keyed by inode ID so renames and moves keep
+    the lock. Locks are created on first use and dropped again once no
+    thread holds them.
+    """
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._locks = weakref.WeakValueDictionary()  # {inode: RWLock}
+        
+    def get(self, inode):
+        with self._mutex:
+            lock = self._locks.get(inode)
+            if lock is None:
+                lock = self._locks[inode] = RWLock()
+            return lock
+            
+            
+def synchronized(method):
+    """Run a method while holding its instance's self.lock"""
+    @functools.wraps(method)
+    def call(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return call
\ No newline at end of file
@@ -1,9 +1,46 @@
-from gui import FileSystemGUI
-import tkinter as tk
-import os 
-import json
+import sys
+import argparse
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="File system simulator with contiguous allocation")
+    parser.add_argument("script", nargs="?", help="file of terminal commands to run without the GUI ('-' reads stdin)")
+    parser.add_argument("-c", dest="commands", help="run commands separated by ';' without the GUI, e.g. \"mkdir a; touch a/x 4096\"")
+    parser.add_argument("-i", "--cli", action="store_true", help="interactive terminal without the GUI")
+    parser.add_argument("-v", "--verbose", action="store_true", help="echo each script command before running it")
+    parser.add_argument("--serve", nargs="?", type=int, const=8765, metavar="PORT", help="serve the filesystem to local clients (default port 8765)")
+    return parser.parse_args(argv)
+    
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = FileSystemGUI(root)
-    root.mainloop()
\ No newline at end of file
+    args = parse_args(sys.argv[1:])
+    if args.serve is not None:
+        # Headless: serve the filesystem to local clients (see server.py / client.py)
+        from filesystem import FileSystem
+        from server import serve
+        serve(FileSystem(), port=args.serve)
+    elif args.commands is not None or args.script or args.cli:
+        # Headless terminal; tkinter is never imported on this path
+        from filesystem import FileSystem
+        import cli
+        fs = FileSystem()
+        failed = 0
+        try:
+            if args.commands is not None:
+                failed += cli.run_script(fs, cli.split_commands(args.commands), args.verbose)
+            if args.script:
+                if args.script == "-":
+                    text = sys.stdin.read()
+                else:
+                    with open(args.script, encoding="utf-8") as f:
+                        text = f.read()
+                failed += cli.run_script(fs, cli.split_commands(text), args.verbose)
+            if args.cli:
+                cli.repl(fs)
+        finally:
+            fs.close()
+        sys.exit(1 if failed else 0)
+    else:
+        from gui import FileSystemGUI
+        import tkinter as tk
+        root = tk.Tk()
+        app = FileSystemGUI(root)
+        root.mainloop()
\ No newline at end of file
@@ -0,0 +1,105 @@
+import os
+import json
+
+class OperationStats:
+    """
+    Running totals for one allocator operation: calls, failures, latency
+    (sum, max and a fixed-bucket histogram) and bitmap blocks scanned.
+    Recording a call is a few additions, so it is always on.
+    """
+    LATENCY_BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)  # Upper bounds in seconds
+    
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.blocks_scanned = 0
+        self.latency_counts = [0] * (len(self.LATENCY_BUCKETS) + 1)  # Last slot is +Inf
+        
+    def record(self, seconds, blocks_scanned, failed=False):
+        self.calls += 1
+        if failed:
+            self.failures += 1
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        self.blocks_scanned += blocks_scanned
+        for i, bound in enumerate(self.LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.latency_counts[i] += 1
+                return
+        self.latency_counts[-1] += 1
+        
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'total_seconds': self.total_seconds,
+            'max_seconds': self.max_seconds,
+            'mean_seconds': self.total_seconds / self.calls if self.calls else 0.0,
+            'blocks_scanned': self.blocks_scanned,
+            'latency_buckets': {
+                str(bound): count for bound, count in zip(self.LATENCY_BUCKETS + ('+Inf',), self.latency_counts)
+            }
+        }
+        
+        
+def to_prometheus(metrics, prefix='sfm'):
+    """Format a get_metrics() dict in the Prometheus text exposition format"""
+    lines = []
+    
+    def gauge(name, value, help_text):
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        lines.append(f"{prefix}_{name} {value}")
+        
+    gauge('block_size_bytes', metrics['block_size'], "Bytes per block")
+    gauge('blocks_total', metrics['total_blocks'], "Blocks on the disk")
+    gauge('blocks_used', metrics['used_blocks'], "Blocks marked used in the bitmap")
+    gauge('free_extents', metrics['free_extent_count'], "Number of free runs")
+    gauge('largest_free_extent_blocks', metrics['largest_free_extent'], "Length of the largest free run")
+    gauge('external_fragmentation_ratio', metrics['external_fragmentation'], "1 - largest free run / free blocks")
+    if metrics.get('internal_slack_bytes') is not None:
+        gauge('internal_slack_bytes', metrics['internal_slack_bytes'], "Allocated bytes not used by file data")
+    cache = metrics.get('block_cache')
+    if cache:
+        gauge('block_cache_blocks', cache['cached_blocks'], "Blocks held in the block cache")
+        gauge('block_cache_dirty_blocks', cache['dirty_blocks'], "Cached blocks not yet written back")
+        for key in ('hits', 'misses', 'evictions', 'writebacks', 'readahead_blocks'):
+            lines.append(f"# TYPE {prefix}_block_cache_{key}_total counter")
+            lines.append(f"{prefix}_block_cache_{key}_total {cache[key]}")
+        
+    lines.append(f"# HELP {prefix}_free_extents_by_size Free runs per power-of-two size class (label: smallest length in the class)")
+    lines.append(f"# TYPE {prefix}_free_extents_by_size gauge")
+    for min_length, count in metrics['free_extent_histogram'].items():
+        lines.append(f'{prefix}_free_extents_by_size{{min_blocks="{min_length}"}} {count}')
+        
+    for op, stats in metrics['operations'].items():
+        name = f"{prefix}_{op}_seconds"
+        lines.append(f"# HELP {name} Latency of {op} calls")
+        lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, count in stats['latency_buckets'].items():
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum {stats['total_seconds']}")
+        lines.append(f"{name}_count {stats['calls']}")
+        for key in ('failures', 'blocks_scanned'):
+            lines.append(f"# TYPE {prefix}_{op}_{key}_total counter")
+            lines.append(f"{prefix}_{op}_{key}_total {stats[key]}")
+    return "\n".join(lines) + "\n"
+    
+    
+def write_metrics(path, metrics, format='json'):
+    """Write metrics as JSON or a Prometheus text file (swapped in atomically)"""
+    if format == 'json':
+        text = json.dumps(metrics, indent=2)
+    elif format == 'prometheus':
+        text = to_prometheus(metrics)
+    else:
+        raise ValueError(f"Unknown metrics format: '{format}'")
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w') as f:
+        f.write(text)
+    os.replace(tmp_file, path)
\ No newline at end of file
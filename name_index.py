@@ -0,0 +1,162 @@
+from bisect import bisect_left, bisect_right, insort
+
+class NameIndex:
+    """
+    Sorted child names of each directory, keyed by inode ID, so sorted
+    listings, prefix matches and "next N after name X" take O(log n + k)
+    instead of sorting the whole directory. The names of subdirectories are
+    kept apart as well, so a search can descend without looking at every
+    file. A directory's entries are built the first time they are asked
+    for and then kept up to date by FileSystem._apply as children are
+    added, removed and renamed.
+    """
+    def __init__(self):
+        self.names = {}  # {directory inode: sorted child names}
+        self.subdirs = {}  # {directory inode: names of child directories}
+        
+    def sorted_names(self, directory):
+        """Child names of a directory node in sorted order (do not modify the list)"""
+        inode = directory.get("inode")
+        if inode is None:
+            return sorted(directory["content"])  # Tree from before inodes, not migrated yet
+        names = self.names.get(inode)
+        if names is None or len(names) != len(directory["content"]):
+            # First use, or out of step after a rollback: rebuild
+            content = directory["content"]
+            names = self.names[inode] = sorted(content)
+            self.subdirs[inode] = {name for name in names if content[name]["type"] == "directory"}
+        return names
+        
+    def subdirectories(self, directory):
+        """Names of the child directories of a directory node, in sorted order"""
+        inode = directory.get("inode")
+        if inode is None:
+            return sorted(name for name, child in directory["content"].items() if child["type"] == "directory")
+        self.sorted_names(directory)
+        return sorted(self.subdirs[inode])
+        
+    def add(self, directory, name, node):
+        inode = directory.get("inode")
+        names = self.names.get(inode)
+        if names is not None:
+            insort(names, name)
+            if node["type"] == "directory":
+                self.subdirs[inode].add(name)
+                
+    def remove(self, directory, name):
+        inode = directory.get("inode")
+        names = self.names.get(inode)
+        if names is not None:
+            i = bisect_left(names, name)
+            if i < len(names) and names[i] == name:
+                del names[i]
+            self.subdirs[inode].discard(name)
+            
+    def drop_tree(self, node):
+        """Forget the lists of a removed directory and the directories below it"""
+        if not self.names or node["type"] != "directory":
+            return
+        stack = [node]
+        while stack:
+            directory = stack.pop()
+            self.names.pop(directory.get("inode"), None)
+            self.subdirs.pop(directory.get("inode"), None)
+            stack.extend(child for child in directory["content"].values() if child["type"] == "directory")
+            
+    def clear(self):
+        self.names.clear()
+        self.subdirs.clear()
+        
+    def page(self, directory, after=None, limit=100, reverse=False):
+        """Up to limit names after (or, reversed, before) the name after, in order"""
+        names = self.sorted_names(directory)
+        if reverse:
+            end = len(names) if after is None else bisect_left(names, after)
+            return names[max(end - limit, 0):end][::-1]
+        start = 0 if after is None else bisect_right(names, after)
+        return names[start:start + limit]
+        
+    def prefix(self, directory, prefix, limit=None):
+        """Names starting with prefix, in order"""
+        names = self.sorted_names(directory)
+        start = bisect_left(names, prefix)
+        end = len(names) if limit is None else min(start + limit, len(names))
+        matches = []
+        for i in range(start, end):
+            if not names[i].startswith(prefix):
+                break
+            matches.append(names[i])
+        return matches
+        
+        
+class TreeNames:
+    """
+    Every name in the tree mapped to the inode IDs of the entries with
+    that name, with the distinct names kept sorted, so a search for a name
+    or a name prefix anywhere below a directory does not have to walk the
+    tree. Built the first time it is needed, then kept up to date by
+    FileSystem._apply; cleared when a batch rolls back.
+    """
+    def __init__(self):
+        self.inodes = None  # {name: set of inode IDs}, None until built
+        self.sorted = []  # Distinct names in order
+        
+    @property
+    def built(self):
+        return self.inodes is not None
+        
+    def build(self, nodes):
+        """Index every node of an iterable of (inode, node)"""
+        self.inodes = {}
+        for inode, node in nodes:
+            self.inodes.setdefault(node["name"], set()).add(inode)
+        self.sorted = sorted(self.inodes)
+        
+    def add(self, name, inode):
+        if self.inodes is None:
+            return
+        inodes = self.inodes.get(name)
+        if inodes is None:
+            inodes = self.inodes[name] = set()
+            insort(self.sorted, name)
+        inodes.add(inode)
+        
+    def remove(self, name, inode):
+        if self.inodes is None:
+            return
+        inodes = self.inodes.get(name)
+        if inodes is not None:
+            inodes.discard(inode)
+            if not inodes:
+                del self.inodes[name]
+                del self.sorted[bisect_left(self.sorted, name)]
+                
+    def add_tree(self, node):
+        """Index a node and everything below it"""
+        self._walk(node, self.add)
+        
+    def remove_tree(self, node):
+        """Forget a removed node and everything below it"""
+        self._walk(node, self.remove)
+        
+    def _walk(self, node, action):
+        if self.inodes is None:
+            return
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            action(node["name"], node["inode"])
+            if node["type"] == "directory":
+                stack.extend(node["content"].values())
+                
+    def clear(self):
+        self.inodes = None
+        self.sorted = []
+        
+    def prefix(self, prefix):
+        """(name, inode IDs) for every name starting with prefix, in name order"""
+        start = bisect_left(self.sorted, prefix)
+        for name in self.sorted[start:]:
+            if not name.startswith(prefix):
+                break
+            yield name, self.inodes[name]
\ No newline at end of file
@@ -0,0 +1,102 @@
+import sys
+import queue
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+class OperationQueue:
+    """
+    Runs filesystem operations for the GUI on a background thread, one at
+    a time in the order they were submitted, so the Tk thread never waits
+    for a slow operation, a journal fsync or a checkpoint. Results are
+    handed back to the Tk thread through a queue that root.after() drains.
+    
+    Submissions can share a key (e.g. 'refresh'): a newer one makes the
+    older ones stale, so they are skipped if they have not started yet and
+    their results are dropped if they have.
+    """
+    POLL_MS = 15  # How often the Tk thread checks for results while work is pending
+    
+    def __init__(self, root, on_error=None, on_busy=None, on_progress=None):
+        self.root = root
+        self.on_error = on_error  # on_error(exception) for operations without their own handler
+        self.on_busy = on_busy  # on_busy(True/False) when the queue starts or stops having work
+        self.on_progress = on_progress  # on_progress(text, fraction) with fraction None when unknown
+        self.executor = ThreadPoolExecutor(max_workers=1)  # One worker keeps operations in order
+        self.inbox = queue.Queue()  # (callback, args) for the Tk thread, filled by the worker
+        self.latest = {}  # {key: newest submission number}
+        self.pending = 0  # Submitted operations whose results have not been handled yet
+        self._numbers = itertools.count()
+        self._polling = False
+        
+    def submit(self, function, on_done=None, on_error=None, key=None, label=None):
+        """
+        Run function(progress) on the worker and call on_done(result) on the
+        Tk thread. progress(text, fraction=None) may be called from function
+        to report on a long operation; label is reported when it starts.
+        Must be called from the Tk thread.
+        """
+        number = next(self._numbers)
+        if key is not None:
+            self.latest[key] = number
+        self.pending += 1
+        if self.pending == 1 and self.on_busy:
+            self.on_busy(True)
+        self.executor.submit(self._run, function, on_done, on_error, key, number, label)
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_MS, self._poll)
+            
+    def call_soon(self, callback, *args):
+        """Run callback(*args) on the Tk thread; safe to call from the worker"""
+        self.inbox.put((callback, args))
+        
+    def _stale(self, key, number):
+        return key is not None and self.latest.get(key) != number
+        
+    def _run(self, function, on_done, on_error, key, number, label):
+        """Worker thread: run one operation unless it went stale while queued"""
+        if self._stale(key, number):
+            self.call_soon(self._finish, None, None, key, number)
+            return
+        if label:
+            self._report(label)
+        try:
+            result = function(self._report)
+        except Exception as error:
+            self.call_soon(self._finish, on_error or self.on_error, error, key, number)
+        else:
+            self.call_soon(self._finish, on_done, result, key, number)
+            
+    def _report(self, text, fraction=None):
+        if self.on_progress:
+            self.call_soon(self.on_progress, text, fraction)
+            
+    def _finish(self, callback, value, key, number):
+        """Tk thread: deliver one result"""
+        self.pending -= 1
+        try:
+            if callback and not self._stale(key, number):
+                callback(value)
+        finally:
+            if not self.pending and self.on_busy:
+                self.on_busy(False)
+                
+    def _poll(self):
+        """Tk thread: run the callbacks the worker queued, and keep polling while work is pending"""
+        while True:
+            try:
+                callback, args = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception:
+                self.root.report_callback_exception(*sys.exc_info())
+        if self.pending or not self.inbox.empty():
+            self.root.after(self.POLL_MS, self._poll)
+        else:
+            self._polling = False
+            
+    def shutdown(self):
+        """Wait for submitted operations to finish (their results are not delivered)"""
+        self.executor.shutdown(wait=True)
\ No newline at end of file
@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+
+class PathCache:
+    """
+    Bounded LRU cache of normalized absolute path -> tree node, used by
+    FileSystem.get_node_at_path. Only successful lookups are cached, so
+    creating entries never makes the cache stale; removing or renaming an
+    entry must invalidate its path (and for directories everything below).
+    A lookup that raced with an invalidation must not be cached, so put()
+    takes the generation read before the lookup started.
+    """
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0  # Bumped by every invalidation
+        self.hits = 0
+        self.misses = 0
+        
+    @staticmethod
+    def normalize(path):
+        """Collapse duplicate and trailing slashes of an absolute path"""
+        parts = [part for part in path.split('/') if part]
+        return '/' + '/'.join(parts)
+        
+    def get(self, path):
+        with self.lock:
+            node = self.entries.get(path)
+            if node is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(path)
+            self.hits += 1
+            return node
+            
+    def put(self, path, node, generation=None):
+        if self.capacity <= 0:
+            return
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return  # Something was invalidated during the lookup
+            self.entries[path] = node
+            self.entries.move_to_end(path)
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                
+    def invalidate(self, path):
+        """Drop one path"""
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(path, None)
+            
+    def invalidate_tree(self, path):
+        """Drop a path and every cached path below it"""
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(path, None)
+            prefix = path.rstrip('/') + '/'
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+                
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
\ No newline at end of file
@@ -0,0 +1,36 @@
+import json
+import base64
+
+# Wire format shared by server.py and client.py: one JSON object per line.
+#   request:  {"id": 7, "op": "create_file", "args": ["a.txt", 100], "kwargs": {"parent_path": "/"}}
+#   response: {"id": 7, "ok": true, "result": [true, "File created"]}
+#             {"id": 7, "ok": false, "error": "ValueError: ..."}
+# Responses carry the request id, so a client can send many requests
+# before reading any reply (pipelining). Bytes travel as {"$bytes": base64}.
+MAX_LINE = 64 * 1024 * 1024  # Longest accepted message in bytes
+
+def to_wire(value):
+    """Make a result JSON-safe: bytes-like values become {"$bytes": base64}"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$bytes": base64.b64encode(value).decode('ascii')}
+    if isinstance(value, dict):
+        return {key: to_wire(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_wire(item) for item in value]
+    return value
+    
+def from_wire(value):
+    """Inverse of to_wire"""
+    if isinstance(value, dict):
+        if len(value) == 1 and "$bytes" in value:
+            return base64.b64decode(value["$bytes"])
+        return {key: from_wire(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [from_wire(item) for item in value]
+    return value
+    
+def encode_message(message):
+    return json.dumps(message, separators=(',', ':')).encode('utf-8') + b'\n'
+    
+def decode_message(line):
+    return json.loads(line.decode('utf-8'))
\ No newline at end of file
@@ -0,0 +1,161 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from protocol import MAX_LINE, to_wire, from_wire, encode_message, decode_message
+
+def _summary(node):
+    """Directory entry without its subtree, for listings sent to clients"""
+    return {key: value for key, value in node.items() if key != "content"}
+    
+# Operations clients may call, with a converter for results that should not be sent as-is
+OPERATIONS = {
+    'create_directory': None,
+    'create_file': None,
+    'delete_file': None,
+    'delete_directory': None,
+    'rename_item': None,
+    'move_item': None,
+    'copy_item': None,
+    'write_file': None,
+    'resize_file': None,
+    'append': None,
+    'get_file_content': None,
+    'get_directory_contents': lambda contents: (
+        {name: _summary(node) for name, node in contents.items()} if contents is not None else None
+    ),
+    'list_directory': lambda page: (
+        [[name, _summary(node)] for name, node in page[0]] if page[0] is not None else None, page[1]
+    ),
+    'glob': None,
+    'get_directory_size': None,
+    'show_allocation_info': None,
+    'get_disk_info': None,
+    'get_metrics': None,
+    'compact': None,
+    'checkpoint': None,
+}
+
+class FileSystemServer:
+    """
+    asyncio front-end that serves one FileSystem to many local clients
+    over TCP (see protocol.py for the wire format). Each connection's
+    requests run in the order they arrive, but the client does not have to
+    wait for a reply before sending the next one. The operations
+    themselves, including journal writes and checkpoints, run in a thread
+    pool so the event loop never blocks on disk; requests from different
+    connections run concurrently under the FileSystem's own locks.
+    
+    All clients share the one FileSystem, so there is no per-client
+    working directory: change_directory is not exposed, and relative paths
+    and omitted parent paths always resolve against '/'.
+    """
+    def __init__(self, fs, host='127.0.0.1', port=8765, workers=4):
+        self.fs = fs
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self._server = None
+        self._connections = {}  # {handler task: (reader, writer)} of connected clients
+        
+    async def start(self):
+        if self.fs.current_dir != "/":
+            self.fs.change_directory("/")  # Left elsewhere by the GUI or CLI
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port, limit=MAX_LINE)
+        self.port = self._server.sockets[0].getsockname()[1]  # Resolves port 0
+        
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+            
+    async def close(self):
+        """Stop accepting clients and fold the journal into the snapshots"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        # Stop reading from clients, but answer the requests already received
+        for reader, writer in self._connections.values():
+            writer.transport.pause_reading()
+            reader.feed_eof()
+        if self._connections:
+            await asyncio.wait(list(self._connections))
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.fs.close)
+        self.executor.shutdown()
+        
+    def _call(self, op, args, kwargs):
+        """Run one operation (in a worker thread)"""
+        result = getattr(self.fs, op)(*args, **kwargs)
+        if OPERATIONS[op]:
+            # Convert here, in the worker thread, rather than on the event loop
+            result = OPERATIONS[op](result)
+        return result
+        
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = (reader, writer)
+        try:
+            await self._serve_connection(reader, writer)
+        finally:
+            del self._connections[task]
+            
+    async def _serve_connection(self, reader, writer):
+        requests = asyncio.Queue()
+        worker = asyncio.create_task(self._run_requests(requests, writer))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    break  # Message too long; drop the client
+                if not line:
+                    break
+                await requests.put(line)
+        except ConnectionError:
+            pass
+        await requests.put(None)
+        await worker
+        writer.close()
+        
+    async def _run_requests(self, requests, writer):
+        """Execute one connection's requests in order, writing each reply when it is ready"""
+        loop = asyncio.get_running_loop()
+        while True:
+            line = await requests.get()
+            if line is None:
+                return
+            request_id = None
+            try:
+                request = decode_message(line)
+                request_id = request.get('id')
+                op = request['op']
+                if op not in OPERATIONS:
+                    raise ValueError(f"Unknown operation: '{op}'")
+                args = from_wire(request.get('args', []))
+                kwargs = from_wire(request.get('kwargs', {}))
+                result = await loop.run_in_executor(self.executor, self._call, op, args, kwargs)
+                reply = {'id': request_id, 'ok': True, 'result': to_wire(result)}
+            except Exception as error:
+                reply = {'id': request_id, 'ok': False, 'error': f"{type(error).__name__}: {error}"}
+            try:
+                writer.write(encode_message(reply))
+                if requests.empty():
+                    await writer.drain()  # Flush once the pipelined burst is answered
+            except ConnectionError:
+                return
+                
+                
+def serve(fs, host='127.0.0.1', port=8765, workers=4):
+    """Run a FileSystemServer until interrupted (Ctrl+C), then checkpoint"""
+    async def main():
+        server = FileSystemServer(fs, host, port, workers)
+        await server.start()
+        print(f"Serving filesystem on {server.host}:{server.port}")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+            
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
\ No newline at end of file
@@ -1,101 +1,787 @@
+import os
 import json
+import time
+import bisect
+import threading
 from datetime import datetime
+from bitmap import Bitmap
+from disk_image import DiskImage
+from block_cache import make_block_cache
+from extent_index import FreeExtentIndex, allocation_runs, make_allocation, allocation_blocks
+from allocation_policies import make_policy
+from metrics import OperationStats, write_metrics
+from locking import synchronized
+import binary_format
 
 class StorageManager:
-    def __init__(self, storage_file='storage.json', disk_size=1024*1024):  # 1MB default
+    COMPACT_FILL_CANDIDATES = 256  # Files from the end of the disk tried for each hole
+    
+    def __init__(self, storage_file='storage.json', disk_size=1024*1024, allocation_policy=None, metadata_format=None, image_file=None, allocation_mode='contiguous', max_extents=8, cache_size=256*1024, cache_policy='lru'):  # 1MB default
+        self.lock = threading.RLock()  # Allocator lock: bitmap, FAT, extent index, policy and undo log
         self.storage_file = storage_file
+        self.binary_file = os.path.splitext(storage_file)[0] + '.bin'
+        # 'json' or 'binary'; by default use binary only if a binary file already exists
+        self.metadata_format = metadata_format or ('binary' if os.path.exists(self.binary_file) else 'json')
         self.disk_size = disk_size
         self.block_size = 512  # Bytes per block
         self.total_blocks = disk_size // self.block_size
-        self.bitmap = [0] * self.total_blocks  # 0=free, 1=used
-        self.file_allocation_table = {}  # {file_path: (start_block, num_blocks)}
+        self.bitmap = Bitmap(self.total_blocks)  # Packed bits, 0=free, 1=used
+        self.file_allocation_table = {}  # {inode ID: (start_block, num_blocks), or a list of runs in extent mode}
+        self.extent_refs = {}  # {run start_block: FAT entries using it}; copies share extents until written
+        # 'contiguous' keeps every file in one run; 'extents' lets a file grow into up to max_extents runs
+        self.allocation_mode = allocation_mode
+        self.max_extents = max_extents
+        self.free_extents = FreeExtentIndex()  # Free runs, kept in sync with bitmap
+        self.allocation_policy = None
+        self.autosave = True  # Save after every mutation unless the owner journals changes
+        self.checkpoint_seq = 0  # Last journal record included in the saved file
+        self.undo_log = None  # Inverse changes recorded while a batch is open
+        self._files_by_start = None  # Sorted (start_block, num_blocks, file_id) per run for compaction; dropped when the FAT changes
+        self.op_stats = {'allocate_blocks': OperationStats(), 'free_blocks': OperationStats(), 'free_ranges': OperationStats()}
+        # Block data lives in a disk image next to the metadata file
+        self.image_file = image_file or os.path.splitext(storage_file)[0] + '.img'
+        self.disk_image = DiskImage(self.image_file, disk_size)
+        # Blocks known to hold only zeros, which clear_data skips; not saved, so after a restart
+        # only the never-written end of the image is known, and other blocks are zeroed once again
+        self.zeroed = Bitmap(self.total_blocks)
+        first_zero = -(-self.disk_image.zero_from // self.block_size)
+        self.zeroed.set_range(first_zero, self.total_blocks - first_zero, 1)
+        # Write-back block cache in front of the image ('lru' or 'clock'); cache_size=0 reads the map directly
+        self.cache = make_block_cache(cache_policy, self.disk_image, self.block_size, cache_size) if cache_size else None
         self.load_storage()
         
+        # An explicit policy overrides the one saved with the disk
+        if allocation_policy and allocation_policy != self.allocation_policy.name:
+            self.set_allocation_policy(allocation_policy)
+        
     def load_storage(self):
         """Load storage data from file"""
         try:
-            with open(self.storage_file, 'r') as f:
-                data = json.load(f)
+            if self.metadata_format == 'binary' and os.path.exists(self.binary_file):
+                data = binary_format.read_storage(self.binary_file)
                 self.bitmap = data['bitmap']
-                self.file_allocation_table = data['file_allocation_table']
+            else:
+                # JSON file, also the import path when switching to binary
+                with open(self.storage_file, 'r') as f:
+                    data = json.load(f)
+                self.bitmap = Bitmap.from_json(data['bitmap'])
+            # JSON object keys are strings; older files used paths instead of inode IDs
+            self.file_allocation_table = {
+                int(key) if isinstance(key, str) and key.isdigit() else key: allocation
+                for key, allocation in data['file_allocation_table'].items()
+            }
+            policy_name = data.get('allocation_policy', 'first-fit')
+            self.checkpoint_seq = data.get('checkpoint_seq', 0)
+            self.allocation_policy = make_policy(policy_name)
+            self._files_by_start = None
+            self.rebuild_indexes()
         except (FileNotFoundError, json.JSONDecodeError):
             self._initialize_storage()
+            return
+            
+        if self.metadata_format == 'binary' and not os.path.exists(self.binary_file):
+            self.save_storage()  # Migrate storage.json to the binary format
             
     def _initialize_storage(self):
         """Initialize a new storage"""
-        self.bitmap = [0] * self.total_blocks
+        self.bitmap = Bitmap(self.total_blocks)
         self.file_allocation_table = {}
+        self._files_by_start = None
+        self.checkpoint_seq = 0
+        self.allocation_policy = make_policy('first-fit')
+        self.rebuild_indexes()
         self.save_storage()
         
+    @synchronized
     def save_storage(self):
         """Save storage data to file"""
+        if self.metadata_format == 'binary':
+            binary_format.write_storage(
+                self.binary_file, self.bitmap, self.file_allocation_table,
+                self.allocation_policy.name, self.checkpoint_seq
+            )
+        else:
+            self.export_json(self.storage_file)
+            
+    def export_json(self, json_file):
+        """Write storage data in the storage.json format"""
         data = {
-            'bitmap': self.bitmap,
-            'file_allocation_table': self.file_allocation_table
+            'bitmap': self.bitmap.to_json(),
+            'file_allocation_table': self.file_allocation_table,
+            'allocation_policy': self.allocation_policy.name,
+            'checkpoint_seq': self.checkpoint_seq
         }
-        with open(self.storage_file, 'w') as f:
+        # Write a temp file and swap it in so a crash never leaves a torn file
+        tmp_file = json_file + '.tmp'
+        with open(tmp_file, 'w') as f:
             json.dump(data, f, indent=2)
+        os.replace(tmp_file, json_file)
+        
+    def _persist(self):
+        """Save after a mutation when autosave is on"""
+        if self.autosave:
+            self.save_storage()
+            
+    @synchronized
+    def rebuild_indexes(self):
+        """Rebuild the free-extent index and policy state from the bitmap, and the extent reference counts"""
+        self.free_extents.track_sizes(False)
+        self.free_extents.build(self.bitmap)
+        self.allocation_policy.attach(self)
+        self.extent_refs = {}
+        for allocation in self.file_allocation_table.values():
+            self._add_ref(allocation)
+            
+    def _add_ref(self, allocation):
+        for start_block, num_blocks in allocation_runs(allocation):
+            if num_blocks > 0:
+                self.extent_refs[start_block] = self.extent_refs.get(start_block, 0) + 1
+                
+    def _drop_ref(self, allocation):
+        """Forget one user of an allocation; returns the runs nothing uses any more"""
+        unused = []
+        for start_block, num_blocks in allocation_runs(allocation):
+            if num_blocks <= 0:
+                continue
+            count = self.extent_refs.pop(start_block, 0)
+            if count > 1:
+                self.extent_refs[start_block] = count - 1
+            else:
+                unused.append((start_block, num_blocks))
+        return unused
+        
+    @synchronized
+    def is_shared(self, allocation):
+        """True if more than one file uses this allocation (copy-on-write)"""
+        return any(
+            num_blocks > 0 and self.extent_refs.get(start_block, 0) > 1
+            for start_block, num_blocks in allocation_runs(allocation)
+        )
+        
+    @synchronized
+    def restore_allocations(self, entries):
+        """
+        Set (or with allocation None remove) the FAT entries of one journal
+        record, [(file_id, allocation)], and their bitmap bits directly,
+        without the allocator. Used when replaying the journal; call
+        rebuild_indexes() afterwards.
+        
+        Every entry gets its new mapping before any bits change: a run shared
+        by several files may move into a range overlapping its old place, and
+        freeing the old run entry by entry would clear blocks that an earlier
+        entry of the same record had just claimed.
+        """
+        self._files_by_start = None
+        freed = []
+        for file_id, allocation in entries:
+            old_allocation = self.file_allocation_table.pop(file_id, None)
+            if old_allocation:
+                freed.extend(self._drop_ref(old_allocation))
+            if allocation:
+                self.file_allocation_table[file_id] = allocation
+                self._add_ref(allocation)
+        for start_block, num_blocks in freed:
+            self.bitmap.set_range(start_block, num_blocks, 0)
+        for file_id in {file_id for file_id, allocation in entries}:
+            allocation = self.file_allocation_table.get(file_id)
+            if allocation:
+                for start_block, num_blocks in allocation_runs(allocation):
+                    self.bitmap.set_range(start_block, num_blocks, 1)
+                
+    @synchronized
+    def reset_allocations(self, allocations):
+        """Replace the FAT with {file_id: allocation} and rebuild the bitmap to match"""
+        self.bitmap = Bitmap(self.total_blocks)
+        self.file_allocation_table = {}
+        self._files_by_start = None
+        for file_id, allocation in allocations.items():
+            self.file_allocation_table[file_id] = allocation
+            for start_block, num_blocks in allocation_runs(allocation):
+                self.bitmap.set_range(start_block, num_blocks, 1)
+        self.rebuild_indexes()
             
+    def begin_undo(self):
+        """Start recording inverse changes so they can be rolled back"""
+        self.undo_log = []
+        
+    def end_undo(self):
+        """Stop recording and keep the changes"""
+        self.undo_log = None
+        
+    @synchronized
+    def rollback(self):
+        """Undo every change since begin_undo()"""
+        for action, key, value in reversed(self.undo_log):
+            if action == 'bits':
+                self.bitmap.set_range(key[0], key[1], value)
+            elif value is None:
+                self.file_allocation_table.pop(key, None)
+            else:
+                self.file_allocation_table[key] = value
+        self.undo_log = None
+        self._files_by_start = None
+        self.rebuild_indexes()
+        
+    def _record_undo(self, action, key, value):
+        """Remember how to revert a bitmap range ('bits') or FAT entry ('fat')"""
+        if self.undo_log is not None:
+            self.undo_log.append((action, key, value))
+            
+    @synchronized
+    def set_allocation_policy(self, name):
+        """Switch the allocation policy (first-fit, next-fit, best-fit, worst-fit, buddy)"""
+        self.allocation_policy = make_policy(name)
+        self.rebuild_indexes()
+        self.save_storage()
+        
+    @synchronized
     def allocate_blocks(self, num_blocks):
         """
-        Allocate contiguous blocks using first-fit strategy
+        Allocate contiguous blocks using the disk's allocation policy
         Returns (start_block, num_blocks) if successful, None otherwise
         """
-        start_block = None
-        consecutive_free = 0
-        
-        for i, block in enumerate(self.bitmap):
-            if block == 0:
-                if start_block is None:
-                    start_block = i
-                consecutive_free += 1
-                if consecutive_free >= num_blocks:
-                    # Mark blocks as used
-                    for j in range(start_block, start_block + num_blocks):
-                        self.bitmap[j] = 1
-                    self.save_storage()
-                    return (start_block, num_blocks)
-            else:
-                start_block = None
-                consecutive_free = 0
-                
-        return None  # Not enough contiguous space
+        started = time.perf_counter()
+        if num_blocks <= 0:
+            start_block = self.free_extents.first_free()
+        else:
+            start_block = self.allocation_policy.choose(num_blocks)
+        if start_block is None:
+            self.op_stats['allocate_blocks'].record(time.perf_counter() - started, 0, failed=True)
+            return None  # Not enough contiguous space
+            
+        # Mark blocks as used
+        self.free_extents.reserve(start_block, num_blocks)
+        if num_blocks > 0:
+            self.allocation_policy.on_allocate(start_block, num_blocks)
+        self.bitmap.set_range(start_block, num_blocks, 1)
+        self._record_undo('bits', (start_block, num_blocks), 0)
+        self._persist()
+        # The extent index finds the run, so only the allocated blocks are touched
+        self.op_stats['allocate_blocks'].record(time.perf_counter() - started, max(num_blocks, 0))
+        return (start_block, num_blocks)
         
+    @synchronized
     def free_blocks(self, start_block, num_blocks):
         """Mark blocks as free"""
-        for i in range(start_block, start_block + num_blocks):
-            if i < len(self.bitmap):
-                self.bitmap[i] = 0
-        self.save_storage()
+        started = time.perf_counter()
+        scanned = self._free_ranges([(start_block, num_blocks)])
+        self._persist()
+        self.op_stats['free_blocks'].record(time.perf_counter() - started, scanned)
         
-    def allocate_file(self, file_path, size):
+    @synchronized
+    def free_ranges(self, ranges):
+        """
+        Free many (start_block, num_blocks) ranges at once. Adjacent freed
+        blocks are coalesced, so the bitmap and extent index are updated once
+        per contiguous run, and storage is persisted once for the whole set.
+        """
+        started = time.perf_counter()
+        scanned = self._free_ranges(ranges)
+        self._persist()
+        self.op_stats['free_ranges'].record(time.perf_counter() - started, scanned)
+        
+    def _free_ranges(self, ranges):
+        """Free the used blocks inside ranges; returns the number of bitmap blocks scanned"""
+        # Merge overlapping ranges only: adjacent allocations stay separate for the policy
+        merged = []
+        for start_block, end_block in sorted((start, start + length) for start, length in ranges if length > 0):
+            end_block = min(end_block, len(self.bitmap))
+            if merged and start_block < merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end_block)
+            else:
+                merged.append([start_block, end_block])
+                
+        # Only give back blocks that were actually in use
+        pieces = []
+        runs = []
+        scanned = 0
+        for start_block, end_block in merged:
+            scanned += max(end_block - start_block, 0)
+            for run_start, run_length in self.bitmap.one_runs(start_block, end_block):
+                pieces.append((run_start, run_length))
+                if runs and runs[-1][0] + runs[-1][1] == run_start:
+                    runs[-1][1] += run_length
+                else:
+                    runs.append([run_start, run_length])
+                    
+        for run_start, run_length in runs:
+            self.bitmap.set_range(run_start, run_length, 0)
+            self._record_undo('bits', (run_start, run_length), 1)
+            self.free_extents.release(run_start, run_length)
+        # The policy sees each allocation on its own (the buddy allocator frees by allocation)
+        for run_start, run_length in pieces:
+            self.allocation_policy.on_release(run_start, run_length)
+        return scanned
+        
+    @synchronized
+    def allocate_file(self, file_id, size):
         """Allocate space for a file"""
         num_blocks = (size + self.block_size - 1) // self.block_size  # Ceiling division
         allocation = self.allocate_blocks(num_blocks)
-        
+        if allocation is None and self.allocation_mode == 'extents':
+            allocation = self._allocate_extents(num_blocks, self.max_extents)
+            
         if allocation:
-            self.file_allocation_table[file_path] = allocation
-            self.save_storage()
+            self._record_undo('fat', file_id, self.file_allocation_table.get(file_id))
+            self.file_allocation_table[file_id] = allocation
+            self._add_ref(allocation)
+            self._files_by_start = None
+            self._persist()
             return allocation
         return None
         
-    def deallocate_file(self, file_path):
+    @synchronized
+    def share_allocations(self, entries):
+        """
+        Point new files at existing allocations without copying any blocks
+        (copy-on-write). entries is a list of (file_id, allocation); the
+        blocks are freed only when the last file using them lets go.
+        """
+        for file_id, allocation in entries:
+            allocation = make_allocation(allocation_runs(allocation))
+            self._record_undo('fat', file_id, self.file_allocation_table.get(file_id))
+            self.file_allocation_table[file_id] = allocation
+            self._add_ref(allocation)
+        self._files_by_start = None
+        self._persist()
+        
+    @synchronized
+    def unshare_allocation(self, file_id):
+        """
+        Give a file its own copy of a shared allocation before it is
+        written. Returns the new allocation, or None if there is no space.
+        """
+        old_allocation = self.file_allocation_table[file_id]
+        num_blocks = allocation_blocks(old_allocation)
+        allocation = self.allocate_blocks(num_blocks)
+        if allocation is None and self.allocation_mode == 'extents':
+            allocation = self._allocate_extents(num_blocks, self.max_extents)
+        if allocation is None:
+            return None
+        self._copy_runs(allocation_runs(old_allocation), allocation_runs(allocation))
+        self._record_undo('fat', file_id, old_allocation)
+        self.file_allocation_table[file_id] = allocation
+        self._drop_ref(old_allocation)
+        self._add_ref(allocation)
+        self._files_by_start = None
+        self._persist()
+        return allocation
+        
+    @synchronized
+    def deallocate_file(self, file_id):
         """Deallocate space for a file"""
-        if file_path in self.file_allocation_table:
-            start_block, num_blocks = self.file_allocation_table[file_path]
-            self.free_blocks(start_block, num_blocks)
-            del self.file_allocation_table[file_path]
-            self.save_storage()
+        if file_id in self.file_allocation_table:
+            for start_block, num_blocks in self._drop_ref(self.file_allocation_table[file_id]):
+                self.free_blocks(start_block, num_blocks)
+            self._record_undo('fat', file_id, self.file_allocation_table.pop(file_id))
+            self._files_by_start = None
+            self._persist()
             return True
         return False
         
-    def get_file_allocation(self, file_path):
+    @synchronized
+    def deallocate_files(self, file_ids):
+        """
+        Deallocate many files with a single free_ranges() call and one save.
+        Returns the IDs that had an allocation.
+        """
+        freed = []
+        ranges = []
+        for file_id in file_ids:
+            allocation = self.file_allocation_table.pop(file_id, None)
+            if allocation is None:
+                continue
+            self._record_undo('fat', file_id, allocation)
+            ranges.extend(self._drop_ref(allocation))  # Runs whose last user this was
+            freed.append(file_id)
+        if freed:
+            self._files_by_start = None
+        self.free_ranges(ranges)
+        return freed
+        
+    @synchronized
+    def resize_allocation(self, file_id, num_blocks):
+        """
+        Grow or shrink a file's allocation to num_blocks, keeping its data.
+        Growing takes the free blocks right after the file's last run when
+        there are any. For the rest, extent mode adds new runs, but if the
+        file would have more than max_extents runs it is first gathered
+        into one contiguous run (a local defrag); contiguous mode moves the
+        file to a new run. Shrinking frees the tail. The allocation must not
+        be shared. Returns the new allocation, or None if there is no space.
+        """
+        old_allocation = self.file_allocation_table[file_id]
+        runs = allocation_runs(old_allocation)
+        current = allocation_blocks(old_allocation)
+        if num_blocks == current:
+            return old_allocation
+        if self.is_shared(old_allocation):
+            raise ValueError("Cannot resize a shared allocation")
+            
+        if num_blocks < current:
+            kept = []
+            trimmed = []
+            remaining = num_blocks
+            for start_block, length in runs:
+                keep = min(length, remaining)
+                remaining -= keep
+                if keep:
+                    kept.append((start_block, keep))
+                if keep < length:
+                    trimmed.append((start_block + keep, length - keep))
+            self._free_ranges(trimmed)
+            self.allocation_policy.on_resize()
+            return self._set_runs(file_id, kept or [(runs[0][0], 0)])
+            
+        # Extend the last run in place as far as the free blocks after it go
+        needed = num_blocks - current
+        last_start, last_length = runs[-1]
+        end_block = last_start + last_length
+        claimed = None
+        if self.free_extents.find_run(end_block) == end_block:
+            extra = min(needed, self.free_extents.lengths[end_block])
+            if extra == needed or self.allocation_mode == 'extents':
+                claimed = (end_block, extra)
+                self._claim(end_block, extra)
+                self.allocation_policy.on_resize()
+                runs[-1] = (last_start, last_length + extra)
+                needed -= extra
+        if needed == 0:
+            return self._set_runs(file_id, runs)
+            
+        if self.allocation_mode == 'extents':
+            live_runs = [run for run in runs if run[1] > 0]
+            added = self._allocate_extents(needed, self.max_extents - len(live_runs))
+            if added is not None:
+                return self._set_runs(file_id, live_runs + allocation_runs(added))
+                
+        # Move the whole file to one run big enough for the new size
+        allocation = self.allocate_blocks(num_blocks)
+        if allocation is None:
+            if claimed:
+                self._free_ranges([claimed])
+                self.allocation_policy.on_resize()
+            return None
+        self._copy_runs(runs, [allocation])
+        self._free_ranges(runs)
+        return self._set_runs(file_id, [allocation])
+        
+    def _set_runs(self, file_id, runs):
+        """Point a file at new runs (merging adjacent ones) and save; returns the allocation"""
+        merged = []
+        for start_block, length in runs:
+            if merged and merged[-1][0] + merged[-1][1] == start_block:
+                merged[-1] = (merged[-1][0], merged[-1][1] + length)
+            else:
+                merged.append((start_block, length))
+        allocation = make_allocation(merged)
+        old_allocation = self.file_allocation_table[file_id]
+        self._record_undo('fat', file_id, old_allocation)
+        self._drop_ref(old_allocation)
+        self.file_allocation_table[file_id] = allocation
+        self._add_ref(allocation)
+        self._files_by_start = None
+        self._persist()
+        return allocation
+        
+    def _claim(self, start_block, num_blocks):
+        """Mark a specific free range as used (growing a file in place)"""
+        self.free_extents.reserve(start_block, num_blocks)
+        self.bitmap.set_range(start_block, num_blocks, 1)
+        self._record_undo('bits', (start_block, num_blocks), 0)
+        
+    def _allocate_extents(self, num_blocks, max_runs):
+        """
+        Allocate num_blocks as at most max_runs runs: one run placed by the
+        policy if any free run is big enough, otherwise the largest free runs.
+        Returns the allocation, or None (nothing stays allocated).
+        """
+        if num_blocks > len(self.bitmap) - self.bitmap.count():
+            return None
+        runs = []
+        while num_blocks > 0 and len(runs) < max_runs:
+            allocation = self.allocate_blocks(num_blocks)
+            if allocation is None:
+                allocation = self.allocate_blocks(min(num_blocks, self.free_extents.largest_run()))
+                if allocation is None or allocation[1] == 0:
+                    break
+            runs.append(allocation)
+            num_blocks -= allocation[1]
+        if num_blocks > 0:
+            self._free_ranges(runs)
+            return None
+        return make_allocation(runs)
+        
+    def _copy_runs(self, source_runs, dest_runs):
+        """Copy the blocks of source_runs, in order, into dest_runs"""
+        dest = [list(run) for run in dest_runs if run[1] > 0]
+        i = 0
+        for start_block, length in source_runs:
+            while length > 0:
+                dest_start, dest_length = dest[i]
+                count = min(length, dest_length)
+                self._move_bytes(dest_start * self.block_size, start_block * self.block_size, count * self.block_size)
+                start_block += count
+                length -= count
+                dest[i] = [dest_start + count, dest_length - count]
+                if dest[i][1] == 0:
+                    i += 1
+                    
+    @synchronized
+    def compact(self, time_budget=None, max_blocks=None):
+        """
+        Move files toward the start of the disk so the free space coalesces
+        into one run at the end. Each hole is filled with the last file on
+        the disk that fits in it; only if none fits does the file right
+        after the hole slide down. Stops once time_budget seconds or
+        max_blocks moved blocks are used up, so it can run in short slices
+        between other operations; call it again to continue.
+        
+        Each run of a file in extent mode moves on its own. Returns a
+        report: 'moves' [(file_id, old_allocation, new_allocation)] in the
+        order they were made, 'blocks_moved', 'files_moved',
+        'largest_free_before' and 'largest_free_after' (in blocks) and
+        'done' (True once no free space is left between files).
+        """
+        started = time.perf_counter()
+        report = {
+            'moves': [],
+            'blocks_moved': 0,
+            'files_moved': 0,
+            'largest_free_before': self.free_extents.largest_run(),
+            'done': False
+        }
+        if self._files_by_start is None:
+            self._files_by_start = sorted(
+                (start_block, num_blocks, file_id)
+                for file_id, allocation in self.file_allocation_table.items()
+                for start_block, num_blocks in allocation_runs(allocation)
+                if num_blocks > 0
+            )
+        files = self._files_by_start
+        moved_ids = set()
+        
+        cursor = 0
+        while True:
+            run = self.free_extents.next_run(cursor)
+            if run is None or run[0] + run[1] >= len(self.bitmap):
+                report['done'] = True  # Only the free run at the end is left
+                break
+            if time_budget is not None and time.perf_counter() - started >= time_budget:
+                break
+            if max_blocks is not None and report['blocks_moved'] >= max_blocks:
+                break
+                
+            hole_start, hole_length = run
+            hole_end = hole_start + hole_length
+            # Moving the last file that fits frees space at the end of the disk
+            index = None
+            for i in range(len(files) - 1, max(len(files) - 1 - self.COMPACT_FILL_CANDIDATES, -1), -1):
+                if files[i][0] < hole_end:
+                    break
+                if files[i][1] <= hole_length:
+                    index = i
+                    break
+            if index is None:
+                index = bisect.bisect_left(files, (hole_end,))
+                if index == len(files) or files[index][0] != hole_end:
+                    cursor = hole_end  # Used blocks owned by no file; leave them in place
+                    continue
+                    
+            # Copies share an extent; its entries are adjacent and move together
+            old_start, num_blocks = files[index][:2]
+            first = bisect.bisect_left(files, (old_start,))
+            last = bisect.bisect_left(files, (old_start + 1,))
+            file_ids = [file_id for start, length, file_id in files[first:last]]
+            del files[first:last]
+            old_allocations = [self.file_allocation_table[file_id] for file_id in file_ids]
+            self._relocate(file_ids, old_start, hole_start)
+            for file_id, old_allocation in zip(file_ids, old_allocations):
+                bisect.insort(files, (hole_start, num_blocks, file_id))
+                report['moves'].append((file_id, old_allocation, self.file_allocation_table[file_id]))
+                moved_ids.add(file_id)
+            report['blocks_moved'] += num_blocks
+            
+        report['files_moved'] = len(moved_ids)
+        if report['moves']:
+            self.allocation_policy.rebuild()
+            self._persist()
+        report['largest_free_after'] = self.free_extents.largest_run()
+        return report
+        
+    def _relocate(self, file_ids, old_start, start_block):
+        """
+        Move the run starting at old_start, blocks and data, to start_block
+        and point every file using it there. The target range must be free
+        apart from blocks of the run itself. Data moves cannot be rolled
+        back, so this does not write to the undo log.
+        """
+        runs = allocation_runs(self.file_allocation_table[file_ids[0]])
+        num_blocks = next(length for start, length in runs if start == old_start)
+        self.extent_refs[start_block] = self.extent_refs.pop(old_start)
+        self.free_extents.release(old_start, num_blocks)
+        self.free_extents.reserve(start_block, num_blocks)
+        self.bitmap.set_range(old_start, num_blocks, 0)
+        self.bitmap.set_range(start_block, num_blocks, 1)
+        self._move_bytes(start_block * self.block_size, old_start * self.block_size, num_blocks * self.block_size)
+        for file_id in file_ids:
+            self.file_allocation_table[file_id] = make_allocation([
+                (start_block, length) if start == old_start else (start, length)
+                for start, length in allocation_runs(self.file_allocation_table[file_id])
+            ])
+            
+    def _byte_ranges(self, allocation, offset, length):
+        """Yield (image_offset, length) pieces of a byte range of an allocation, in file order"""
+        for start_block, num_blocks in allocation_runs(allocation):
+            run_bytes = num_blocks * self.block_size
+            if length <= 0:
+                return
+            if offset < run_bytes:
+                count = min(length, run_bytes - offset)
+                yield start_block * self.block_size + offset, count
+                length -= count
+                offset = 0
+            else:
+                offset -= run_bytes
+                
+    def read_data(self, allocation, size):
+        """View of the first size bytes stored in an allocation (zero-copy for one run)"""
+        return self.read_range(allocation, 0, size)
+        
+    def read_range(self, allocation, offset, length):
+        """
+        View of length bytes at a byte offset of an allocation, cut short at
+        its end. Without the block cache this is zero-copy when the range
+        lies in one run; otherwise the bytes are gathered into a new buffer.
+        """
+        pieces = list(self._byte_ranges(allocation, offset, length))
+        if len(pieces) == 1:
+            return self._read_bytes(*pieces[0])
+        data = bytearray()
+        for image_offset, count in pieces:
+            data += self._read_bytes(image_offset, count)
+        return memoryview(data)
+        
+    def readahead(self, allocation, offset, length):
+        """Load a byte range of an allocation into the block cache ahead of a sequential reader"""
+        if self.cache is not None:
+            for image_offset, count in self._byte_ranges(allocation, offset, length):
+                self.cache.prefetch(image_offset, count)
+        
+    def write_data(self, allocation, data, offset=0):
+        """Write bytes into an allocation's blocks, starting at a byte offset"""
+        if offset + len(data) > allocation_blocks(allocation) * self.block_size:
+            raise ValueError("Data does not fit in the allocated blocks")
+        data = memoryview(data).cast('B')
+        written = 0
+        for image_offset, count in self._byte_ranges(allocation, offset, len(data)):
+            self._write_bytes(image_offset, data[written:written + count])
+            written += count
+            
+    def clear_data(self, allocation, offset=0, length=None):
+        """
+        Zero the blocks of an allocation (or length bytes from a byte
+        offset). Blocks known to be zero already are not written, so a
+        large new file on never-used space costs no I/O.
+        """
+        if length is None:
+            length = allocation_blocks(allocation) * self.block_size - offset
+        for image_offset, count in self._byte_ranges(allocation, offset, length):
+            end = image_offset + count
+            first_block, end_block = image_offset // self.block_size, -(-end // self.block_size)
+            with self.lock:
+                dirty_runs = list(self.zeroed.zero_runs(first_block, end_block))
+            for start_block, num_blocks in dirty_runs:
+                start = max(start_block * self.block_size, image_offset)
+                stop = min((start_block + num_blocks) * self.block_size, end)
+                if self.cache is not None:
+                    self.cache.drop(start, stop - start)
+                self.disk_image.zero(start, stop - start)
+            # Only whole blocks are known to be zero afterwards
+            whole_first, whole_end = -(-image_offset // self.block_size), end // self.block_size
+            with self.lock:
+                self.zeroed.set_range(whole_first, whole_end - whole_first, 1)
+                
+    def _written(self, offset, length):
+        """Forget that the blocks of a byte range are zero"""
+        first_block = offset // self.block_size
+        end_block = -(-(offset + length) // self.block_size)
+        with self.lock:
+            self.zeroed.set_range(first_block, end_block - first_block, 0)
+            
+    def _read_bytes(self, offset, length):
+        """Read from the disk image, through the block cache when there is one"""
+        if self.cache is not None:
+            return self.cache.read(offset, length)
+        return self.disk_image.read(offset, length)
+        
+    def _write_bytes(self, offset, data):
+        self._written(offset, len(data))
+        if self.cache is not None:
+            self.cache.write(offset, data)
+        else:
+            self.disk_image.write(offset, data)
+            
+    def _move_bytes(self, dest, src, length):
+        self._written(dest, length)
+        if self.cache is not None:
+            self.cache.write_back(src, length)
+            self.cache.drop(dest, length)
+        self.disk_image.move(dest, src, length)
+        
+    @synchronized
+    def sync(self):
+        """Write dirty cached blocks to the image and flush it to disk"""
+        if self.cache is not None:
+            self.cache.sync()
+        self.disk_image.flush()
+        
+    def close(self):
+        """Flush and close the disk image"""
+        self.sync()
+        self.disk_image.close()
+        
+    def get_file_allocation(self, file_id):
         """Get allocation info for a file"""
-        return self.file_allocation_table.get(file_path)
+        return self.file_allocation_table.get(file_id)
+        
+    @synchronized
+    def get_metrics(self, file_bytes=None):
+        """
+        Fragmentation and allocator metrics. Everything comes from the
+        extent index, a bitmap popcount and running counters, so it is
+        cheap to call often. Pass file_bytes (the total size of all files)
+        to get internal slack: allocated bytes not holding file data.
+        """
+        used_blocks = self.bitmap.count()
+        free_blocks = len(self.bitmap) - used_blocks
+        largest = self.free_extents.largest_run()
+        histogram = {
+            1 << size_class: len(bucket)
+            for size_class, bucket in sorted(self.free_extents.buckets.items())
+        }
+        return {
+            'block_size': self.block_size,
+            'total_blocks': len(self.bitmap),
+            'used_blocks': used_blocks,
+            'free_blocks': free_blocks,
+            'free_extent_count': len(self.free_extents.starts),
+            'free_extent_histogram': histogram,  # {smallest run length in the size class: runs}
+            'largest_free_extent': largest,
+            'external_fragmentation': 1 - largest / free_blocks if free_blocks else 0.0,
+            'internal_slack_bytes': max(0, used_blocks * self.block_size - file_bytes) if file_bytes is not None else None,
+            'block_cache': self.cache.stats() if self.cache is not None else None,
+            'operations': {name: stats.to_dict() for name, stats in self.op_stats.items()}
+        }
+        
+    def export_metrics(self, path, format='json', file_bytes=None):
+        """Write get_metrics() to a JSON or Prometheus text file"""
+        write_metrics(path, self.get_metrics(file_bytes), format)
         
+    @synchronized
     def get_disk_usage(self):
         """Calculate disk usage statistics"""
-        used_blocks = sum(self.bitmap)
+        used_blocks = self.bitmap.count()
         free_blocks = len(self.bitmap) - used_blocks
         return {
             'total_blocks': len(self.bitmap),
@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+from filesystem import FileSystem
+from extent_index import allocation_runs
+
+def check_consistency(fs):
+    """
+    Cross-check the tree, FAT, bitmap, extent reference counts, free-extent
+    index and directory aggregates. Returns a list of problems (empty when
+    everything agrees).
+    """
+    problems = []
+    storage = fs.storage
+    with fs._namespace.write_locked(), storage.lock:
+        files = {}
+        stack = [fs.root]
+        while stack:
+            node = stack.pop()
+            if node["type"] == "directory":
+                stack.extend(node["content"].values())
+            else:
+                files[node["inode"]] = allocation_runs(node["allocation"])
+        fat = {file_id: allocation_runs(allocation) for file_id, allocation in storage.file_allocation_table.items()}
+        if fat != files:
+            differing = set(fat) ^ set(files) | {file_id for file_id in set(fat) & set(files) if fat[file_id] != files[file_id]}
+            problems.append(f"FAT and tree disagree on {len(differing)} files")
+        runs = {}
+        for file_runs in files.values():
+            for start_block, num_blocks in file_runs:
+                if num_blocks > 0:
+                    runs[start_block] = runs.get(start_block, 0) + 1
+        # Copies share runs, so each distinct run is counted once
+        used = [False] * len(storage.bitmap)
+        for start_block, num_blocks in {run for file_runs in files.values() for run in file_runs}:
+            for block in range(start_block, start_block + num_blocks):
+                if used[block]:
+                    problems.append(f"Block {block} belongs to more than one run")
+                used[block] = True
+        if used != [bool(bit) for bit in storage.bitmap.tolist()]:
+            problems.append("Bitmap does not match the FAT")
+        if runs != storage.extent_refs:
+            problems.append("Extent reference counts do not match the FAT")
+        if storage.free_extents.free_block_count() != used.count(False):
+            problems.append("Free-extent index does not match the bitmap")
+        problems.extend(f"Aggregate out of date: {mismatch}" for mismatch in fs.check_aggregates())
+    return problems
+    
+def hammer(fs, threads=8, operations=300, directories=4):
+    """
+    Run create_file/delete_file (mixed with reads) from many threads at
+    once over a few shared directories. Returns the exceptions the workers
+    raised.
+    """
+    for d in range(directories):
+        fs.create_directory(f"d{d}", "/")
+    errors = []
+    
+    def worker(seed):
+        rng = random.Random(seed)
+        try:
+            for i in range(operations):
+                parent = f"/d{rng.randrange(directories)}"
+                name = f"f{rng.randrange(operations // 4)}"  # Threads collide on names on purpose
+                action = rng.random()
+                if action < 0.5:
+                    fs.create_file(name, rng.randrange(1, 4096), parent, data=os.urandom(rng.randrange(1, 64)))
+                elif action < 0.8:
+                    fs.delete_file(name, parent)
+                else:
+                    fs.get_file_content(name, parent)
+                    fs.get_directory_contents(parent)
+        except Exception as error:
+            errors.append(error)
+            
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return errors
+    
+def read_scaling(fs, thread_counts=(1, 2, 4, 8), seconds=0.5):
+    """Total get_file_content calls per second with 1, 2, 4, ... reader threads"""
+    fs.create_directory("hot", "/")
+    for i in range(64):
+        fs.create_file(f"h{i}", 2048, "/hot")
+    results = {}
+    for count in thread_counts:
+        done = [0] * count
+        deadline = time.perf_counter() + seconds
+        
+        def reader(slot):
+            rng = random.Random(slot)
+            while time.perf_counter() < deadline:
+                fs.get_file_content(f"h{rng.randrange(64)}", "/hot")
+                done[slot] += 1
+                
+        readers = [threading.Thread(target=reader, args=(slot,)) for slot in range(count)]
+        for thread in readers:
+            thread.start()
+        for thread in readers:
+            thread.join()
+        results[count] = sum(done) / seconds
+    return results
+    
+if __name__ == "__main__":
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    os.chdir(tempfile.mkdtemp(prefix="fs-stress-"))
+    fs = FileSystem(checkpoint_interval=200)
+    fs.journal.durable = False
+    errors = hammer(fs, threads, operations)
+    problems = check_consistency(fs)
+    for error in errors:
+        print(f"worker error: {error!r}")
+    for problem in problems:
+        print(problem)
+        
+    # The journal must replay to the same state
+    fs.close()
+    reopened = FileSystem()
+    problems += check_consistency(reopened)
+    print(f"{threads} threads x {operations} operations: "
+          f"{len(errors)} worker errors, {len(problems)} consistency problems")
+    for count, rate in read_scaling(reopened).items():
+        print(f"  {count} reader threads: {rate:10.0f} reads/s")
+    reopened.close()
+    sys.exit(1 if errors or problems else 0)
\ No newline at end of file
@@ -0,0 +1,21 @@
+import os
+import sys
+import pytest
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filesystem import FileSystem
+
+@pytest.fixture
+def fs(tmp_path, monkeypatch):
+    """A new file system whose metadata, journal and disk image live in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    fs = FileSystem()
+    yield fs
+    fs.journal.close()
+    fs.storage.close()
+    
+def reopen():
+    """Load the file system from disk as after a crash: without closing or checkpointing the old one"""
+    return FileSystem()
\ No newline at end of file
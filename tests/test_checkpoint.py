@@ -0,0 +1,96 @@
+import threading
+from conftest import reopen
+from filesystem import FileSystem
+from extent_index import allocation_runs
+
+def check_consistent(fs):
+    """Every file's allocation matches its FAT entry, no FAT entry is orphaned and no two files overlap"""
+    files = {}
+    stack = [fs.root]
+    while stack:
+        node = stack.pop()
+        if node["type"] == "directory":
+            stack.extend(node["content"].values())
+        else:
+            files[node["inode"]] = node
+    fat = fs.storage.file_allocation_table
+    assert set(fat) == set(files)
+    used = set()
+    for inode, node in files.items():
+        assert list(fat[inode]) == list(node["allocation"])
+        blocks = {block for start, length in allocation_runs(node["allocation"]) for block in range(start, start + length)}
+        assert not used & blocks
+        used |= blocks
+        
+def pause_after(fs, method_name):
+    """Make a storage method block after it runs until the returned event is set"""
+    paused, resume = threading.Event(), threading.Event()
+    method = getattr(fs.storage, method_name)
+    
+    def call(*args):
+        result = method(*args)
+        paused.set()
+        resume.wait(5)
+        return result
+    setattr(fs.storage, method_name, call)
+    return paused, resume
+    
+def checkpoint_during(fs, operation, method_name):
+    """Run operation, start a checkpoint while it is stopped after method_name, then let both finish"""
+    paused, resume = pause_after(fs, method_name)
+    worker = threading.Thread(target=operation)
+    worker.start()
+    assert paused.wait(5)
+    checkpoint = threading.Thread(target=fs.checkpoint)
+    checkpoint.start()
+    checkpoint.join(0.2)
+    blocked = checkpoint.is_alive()
+    resume.set()
+    worker.join(5)
+    checkpoint.join(5)
+    delattr(fs.storage, method_name)
+    return blocked
+    
+def test_checkpoint_waits_for_delete(fs):
+    fs.create_file("a", 4096)
+    fs.checkpoint()
+    assert checkpoint_during(fs, lambda: fs.delete_file("a"), "deallocate_file")
+    fs.create_file("b", 4096)  # Reuses the blocks of a
+    
+    replayed = reopen()
+    assert sorted(replayed.root["content"]) == ["b"]
+    check_consistent(replayed)
+    
+def test_checkpoint_waits_for_create(fs):
+    fs.checkpoint()
+    assert checkpoint_during(fs, lambda: fs.create_file("a", 4096), "allocate_file")
+    
+    replayed = reopen()
+    assert sorted(replayed.root["content"]) == ["a"]
+    check_consistent(replayed)
+    
+def test_automatic_checkpoints_under_concurrent_operations(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fs = FileSystem(checkpoint_interval=3)
+    errors = []
+    
+    def work(n):
+        try:
+            for i in range(60):
+                fs.create_file(f"f{n}_{i % 4}", 1024)
+                fs.copy_item(f"/f{n}_{i % 4}", f"/c{n}_{i}")
+                with fs.open(f"/c{n}_{i}", "r+") as handle:
+                    handle.write(b"x" * 2048)
+                fs.delete_file(f"f{n}_{(i + 1) % 4}")
+        except Exception as error:
+            errors.append(error)
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+        
+    assert errors == [] and not any(thread.is_alive() for thread in threads)
+    check_consistent(reopen())
+    fs.journal.close()
+    fs.storage.close()
\ No newline at end of file
@@ -0,0 +1,57 @@
+import pytest
+from conftest import reopen
+
+def test_write_after_delete_raises(fs):
+    fs.create_file("old", 4096)
+    handle = fs.open("/old", "r+")
+    fs.delete_file("old")
+    # Takes the freed blocks
+    fs.create_file("victim", 4096)
+    fs.write_file("victim", b"keep")
+    
+    with pytest.raises(OSError):
+        handle.write(b"overwritten")
+    with pytest.raises(OSError):
+        handle.read()
+    assert fs.get_file_content("victim")[:4] == b"keep"
+    
+def test_write_after_delete_and_create_with_same_name(fs):
+    fs.create_file("x", 4096)
+    handle = fs.open("/x", "r+")
+    fs.delete_file("x")
+    fs.create_file("x", 4096)
+    fs.write_file("x", b"new file")
+    
+    with pytest.raises(OSError):
+        handle.write(b"old handle")
+    assert fs.get_file_content("x") == b"new file"
+    
+def test_size_follows_rename(fs):
+    fs.create_directory("d")
+    fs.create_file("f", 4096, "/d")
+    with fs.open("/d/f", "w") as handle:
+        handle.write(b"hello")
+        fs.rename_item("f", "g", "/d")
+        fs.create_file("f", 4096, "/d")  # Same name as the open file had
+        fs.rename_item("d", "e")
+        
+    assert fs.get_node_at_path("/e/g")["size"] == 5
+    assert fs.get_node_at_path("/e/f")["size"] == 4096
+    assert fs.get_file_content("g", "/e") == b"hello"
+    assert fs.check_aggregates() == []
+    
+    replayed = reopen()
+    assert replayed.get_node_at_path("/e/g")["size"] == 5
+    assert replayed.get_node_at_path("/e/f")["size"] == 4096
+    
+def test_size_follows_move(fs):
+    fs.create_directory("a")
+    fs.create_directory("b")
+    fs.create_file("f", 4096, "/a")
+    with fs.open("/a/f", "w") as handle:
+        handle.write(b"moved")
+        fs.move_item("/a/f", "/b")
+        
+    assert fs.get_node_at_path("/b/f")["size"] == 5
+    assert fs.get_directory_size("/b") == (5, 1)
+    assert fs.get_directory_size("/a") == (0, 0)
\ No newline at end of file
@@ -0,0 +1,24 @@
+import json
+
+def test_slack_counts_copies_once(fs):
+    fs.create_file("a", 4096)
+    fs.copy_item("/a", "/b")
+    fs.copy_item("/a", "/c")
+    assert fs.get_metrics()['internal_slack_bytes'] == 0
+    
+    fs.create_file("d", 100)
+    fs.copy_item("/d", "/e")
+    block_size = fs.storage.block_size
+    assert fs.get_metrics()['internal_slack_bytes'] == block_size - 100
+    
+    # The first write gives the copy its own block
+    fs.write_file("e", b"xy")
+    assert fs.get_metrics()['internal_slack_bytes'] == 2 * block_size - 102
+    
+def test_exported_slack_is_never_negative(fs, tmp_path):
+    fs.create_file("a", 4096)
+    for i in range(5):
+        fs.copy_item("/a", f"/copy{i}")
+    fs.export_metrics(str(tmp_path / "metrics.json"))
+    with open(tmp_path / "metrics.json") as f:
+        assert json.load(f)['internal_slack_bytes'] >= 0
\ No newline at end of file